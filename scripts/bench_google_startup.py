@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Cold-start benchmark: eager Google client construction vs. the Google part of init_services"""
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+DUMMY_CREDENTIALS = os.path.join(os.path.dirname(__file__), '..', 'tests', 'dummy_google_credentials.json')
+
+def service_account_json() -> str:
+    """Base64 service account JSON from the environment, or the test dummy with a throwaway key"""
+    value = os.getenv('GOOGLE_SERVICE_ACCOUNT_JSON_BASE64') or os.getenv('GOOGLE_SERVICE_ACCOUNT_JSON')
+    if value:
+        return value
+    import rsa  # installed with google-auth
+
+    with open(DUMMY_CREDENTIALS, 'r') as f:
+        info = json.load(f)
+    # The dummy's key is not parseable - credentials need a real (if useless) one
+    info['private_key'] = rsa.newkeys(1024)[1].save_pkcs1().decode()
+    return base64.b64encode(json.dumps(info).encode()).decode()
+
+def eager_startup(encoded: str, static_discovery: bool) -> None:
+    """The previous get_google_services: temp file round trip, both clients built up front"""
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import build
+    from google_clients import GOOGLE_SCOPES
+
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+        f.write(base64.b64decode(encoded).decode('utf-8'))
+        temp_path = f.name
+    creds = service_account.Credentials.from_service_account_file(temp_path, scopes=GOOGLE_SCOPES)
+    os.unlink(temp_path)
+    build('drive', 'v3', credentials=creds, static_discovery=static_discovery, cache_discovery=False)
+    build('calendar', 'v3', credentials=creds, static_discovery=static_discovery, cache_discovery=False)
+
+def init_services_startup(bot) -> None:
+    """What init_services does with Google before serving traffic
+
+    Credentials from the decoded info, then the Drive client - start_drive_mirror()
+    and reconcile_project_counter() build it with their first request. Only the
+    Calendar client waits for its first use.
+    """
+    bot.get_google_services()
+    # The Drive client as the first request resolves it (the eager variant builds no resources either)
+    bot.google_clients.service('drive')
+
+def measure(mode: str) -> dict:
+    """Run one startup variant in this (fresh) process"""
+    encoded = service_account_json()
+    # Library imports cost the same either way - only time the construction
+    import google_clients  # noqa: F401
+    bot = None
+    if mode == 'init-services':
+        # The bot reads the credentials from the environment at import
+        os.environ['GOOGLE_SERVICE_ACCOUNT_JSON_BASE64'] = encoded
+        import telegram_agent_google as bot
+    tracemalloc.start()
+    start = time.perf_counter()
+    if bot is not None:
+        init_services_startup(bot)
+    else:
+        eager_startup(encoded, static_discovery=(mode == 'eager-static'))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    return {'seconds': elapsed, 'peak_kib': peak / 1024}
+
+def run_benchmark(rounds: int, dynamic: bool) -> None:
+    modes = ['eager-static', 'init-services'] + (['eager-dynamic'] if dynamic else [])
+    print("📊 Google Client Startup Benchmark")
+    print("=" * 40)
+
+    for mode in modes:
+        results = []
+        for _ in range(rounds):
+            # A fresh interpreter per round - imports and caches start cold
+            output = subprocess.run([sys.executable, __file__, '--measure', mode],
+                                    capture_output=True, text=True, check=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+        seconds = sorted(r['seconds'] for r in results)[len(results) // 2]
+        peak = max(r['peak_kib'] for r in results)
+        print(f"{mode:<15} median {seconds * 1000:7.1f} ms   peak {peak:8.0f} KiB")
+
+    print("\n'init-services' builds the Drive client like startup does, Calendar is built on its first request.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--dynamic', action='store_true', help='also fetch discovery documents over the network')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure)))
+    else:
+        run_benchmark(args.rounds, args.dynamic)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Concurrency stress benchmark for the project counter"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from project_counter import ProjectCounter, ProjectNumberLeaser
+
+def allocate_numbers(args):
+    """Worker: allocate `count` numbers from the shared counter file"""
+    counter_file, count, lease_size = args
+    counter = ProjectCounter(counter_file)
+    if lease_size > 1:
+        leaser = ProjectNumberLeaser(counter, lease_size)
+        numbers = [leaser.next_number() for _ in range(count)]
+        leaser.release()
+        return numbers
+    return [counter.next_number() for _ in range(count)]
+
+def run_benchmark(processes: int, per_process: int, lease_size: int = 0) -> bool:
+    """Hammer one counter file from several processes and check the result"""
+    print("📊 Project Counter Stress Benchmark")
+    print("=" * 40)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        counter_file = os.path.join(temp_dir, 'project_counter.json')
+
+        start = time.perf_counter()
+        with Pool(processes) as pool:
+            results = pool.map(allocate_numbers, [(counter_file, per_process, lease_size)] * processes)
+        elapsed = time.perf_counter() - start
+
+        numbers = [number for result in results for number in result]
+        total = processes * per_process
+        duplicates = len(numbers) - len(set(numbers))
+        # Numbers returned from leases are in the free list, not lost
+        data = ProjectCounter(counter_file).read()
+        counters = sorted(int(number.split('-')[1]) for number in numbers + data.get("free", []))
+        contiguous = counters == list(range(1, data["counter"] + 1))
+        leftovers = [name for name in os.listdir(temp_dir) if name.endswith('.tmp')]
+
+        print(f"Processes:       {processes}")
+        print(f"Lease size:      {lease_size if lease_size > 1 else 'off'}")
+        print(f"Numbers:         {total}")
+        print(f"Time:            {elapsed:.2f}s")
+        print(f"Rate:            {total / elapsed:.0f} numbers/s")
+        print(f"Duplicates:      {duplicates}")
+        print(f"Contiguous:      {'✅' if contiguous else '❌'}")
+        print(f"Temp leftovers:  {len(leftovers)}")
+
+        ok = duplicates == 0 and contiguous and not leftovers
+        print("\n✅ No duplicates under contention" if ok else "\n❌ Counter is not safe under contention")
+        return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--per-process', type=int, default=250)
+    parser.add_argument('--lease-size', type=int, default=0, help='numbers leased per worker (0 = off)')
+    args = parser.parse_args()
+
+    sys.exit(0 if run_benchmark(args.processes, args.per_process, args.lease_size) else 1)
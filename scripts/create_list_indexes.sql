@@ -0,0 +1,37 @@
+-- Indexes behind the paginated list API (/api/tasks, /api/projects in src/list_api.py)
+-- Run after create_tasks_table.sql and create_projects_table.sql.
+
+-- Sortable priority: 'hoch' < 'mittel' < 'niedrig', computed once per write instead of per read
+ALTER TABLE tasks ADD COLUMN IF NOT EXISTS priority_rank SMALLINT
+    GENERATED ALWAYS AS (CASE priority WHEN 'hoch' THEN 1 WHEN 'mittel' THEN 2 WHEN 'niedrig' THEN 3 ELSE 4 END) STORED;
+
+-- Task lists: open/done, then priority, newest first - optionally for one project
+CREATE INDEX IF NOT EXISTS idx_tasks_list ON tasks(is_done, priority_rank, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_tasks_project_list ON tasks(project_id, is_done, priority_rank, created_at DESC, id DESC);
+
+-- Project lists: newest first, optionally by status
+CREATE INDEX IF NOT EXISTS idx_projects_list ON projects(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_projects_status_list ON projects(status, created_at DESC, id DESC);
+
+-- Superseded by the composite indexes above
+DROP INDEX IF EXISTS idx_tasks_is_done;
+
+-- The view without ORDER BY (callers order by the indexed columns), with priority_rank for them
+CREATE OR REPLACE VIEW tasks_with_projects AS
+SELECT
+    t.id,
+    t.created_at,
+    t.content,
+    t.is_done,
+    t.priority,
+    t.due_date,
+    t.project_id,
+    p.name as project_name,
+    p.project_number,
+    t.behörde,
+    t.gemeinde,
+    t.tags,
+    t.created_by,
+    t.priority_rank
+FROM tasks t
+LEFT JOIN projects p ON t.project_id = p.id;
@@ -0,0 +1,22 @@
+-- Project counter reconciliation for MGA Bot
+-- Run after create_projects_table.sql. As text '25-1000' sorts before '25-999',
+-- so the highest number of a year is taken over the numeric suffix, from an index.
+
+-- NNN of 'YY-NNN' (up to four digits), NULL for anything else - e.g. HHMMSS fallback numbers
+CREATE OR REPLACE FUNCTION project_number_value(value TEXT)
+RETURNS INT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT (regexp_match(value, '^\d{2}-(\d{3,4})(\D|$)'))[1]::INT
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_projects_number_value ON projects
+    (left(project_number, 2), project_number_value(project_number));
+
+-- Highest NNN of a year (two digits, e.g. 25), 0 if there is none - one index lookup
+CREATE OR REPLACE FUNCTION highest_project_number(for_year INT)
+RETURNS INT
+LANGUAGE sql STABLE AS $$
+    SELECT coalesce(max(project_number_value(project_number)), 0)
+    FROM projects
+    WHERE left(project_number, 2) = lpad(for_year::TEXT, 2, '0')
+$$;
@@ -0,0 +1,64 @@
+-- Server-side project search for MGA Bot
+-- Run after create_projects_table.sql. The B-tree indexes there cannot serve
+-- ilike '%x%', this adds trigram indexes and one search function.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Lowercase with umlauts folded, so 'Müller' and 'mueller' match
+CREATE OR REPLACE FUNCTION project_search_text(value TEXT)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT replace(replace(replace(replace(lower(coalesce(value, '')),
+        'ä', 'ae'), 'ö', 'oe'), 'ü', 'ue'), 'ß', 'ss')
+$$;
+
+-- Trigram indexes for the name and number matching below
+CREATE INDEX IF NOT EXISTS idx_projects_name_trgm ON projects
+    USING gin (project_search_text(name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_projects_number_trgm ON projects
+    USING gin (project_number gin_trgm_ops);
+
+-- Ranked candidates for a project number ("25-003", also "25-3") or name ("EFH Müller")
+-- Exact numbers score 1, names by trigram word similarity; newest first among equals
+CREATE OR REPLACE FUNCTION search_projects(q TEXT, max_results INT DEFAULT 5)
+RETURNS TABLE (
+    id UUID,
+    name TEXT,
+    project_number TEXT,
+    drive_folder_id TEXT,
+    drive_folder_link TEXT,
+    status TEXT,
+    created_at TIMESTAMP WITH TIME ZONE,
+    score REAL
+)
+LANGUAGE sql STABLE
+SET pg_trgm.word_similarity_threshold = 0.4
+AS $$
+    WITH query AS (
+        SELECT
+            project_search_text(trim(q)) AS text,
+            (SELECT parts[1] || '-' || lpad(parts[2], greatest(3, length(parts[2])), '0')
+             FROM regexp_match(trim(q), '^(\d{2})\s*[-/.]\s*0*(\d{1,6})$') AS parts) AS number
+    )
+    SELECT
+        p.id,
+        p.name,
+        p.project_number,
+        p.drive_folder_id,
+        p.drive_folder_link,
+        p.status,
+        p.created_at,
+        CASE
+            WHEN p.project_number IN (trim(q), query.number) THEN 1.0
+            ELSE greatest(word_similarity(query.text, project_search_text(p.name)),
+                          word_similarity(query.text, p.project_number))
+        END::REAL AS score
+    FROM projects p, query
+    WHERE p.project_number IN (trim(q), query.number)
+       OR query.text <% project_search_text(p.name)
+       OR query.text <% p.project_number
+    ORDER BY score DESC, p.created_at DESC
+    LIMIT max_results
+$$;
+
+-- Test the function
+SELECT * FROM search_projects('00-0');
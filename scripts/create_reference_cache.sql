@@ -0,0 +1,31 @@
+-- Version column and realtime feed for the projects cache (src/reference_cache.py)
+-- Run after create_projects_table.sql.
+
+-- Every write bumps updated_at - max(updated_at) plus count(*) is the cache version
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW();
+
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS projects_set_updated_at ON projects;
+CREATE TRIGGER projects_set_updated_at
+    BEFORE UPDATE ON projects
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+-- The version query reads one index entry, delta loads are an index range scan
+CREATE INDEX IF NOT EXISTS idx_projects_updated_at ON projects(updated_at);
+
+-- Realtime change events for the cache; without them it polls the version
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_publication WHERE pubname = 'supabase_realtime')
+       AND NOT EXISTS (SELECT 1 FROM pg_publication_tables
+                       WHERE pubname = 'supabase_realtime' AND schemaname = 'public' AND tablename = 'projects') THEN
+        ALTER PUBLICATION supabase_realtime ADD TABLE projects;
+    END IF;
+END;
+$$;
@@ -29,7 +29,7 @@ ALTER TABLE time_entries ENABLE ROW LEVEL SECURITY;
 CREATE POLICY "Enable all operations for time entries" ON time_entries
     FOR ALL USING (true);
 
--- Create a view for convenient reporting
+-- Create a view for convenient reporting (callers sort - ORDER BY here would sort the whole table on every read)
 CREATE OR REPLACE VIEW time_entries_with_projects AS
 SELECT 
     te.id,
@@ -42,8 +42,7 @@ SELECT
     te.entry_date,
     te.created_by
 FROM time_entries te
-JOIN projects p ON te.project_id = p.id
-ORDER BY te.entry_date DESC, te.created_at DESC;
+JOIN projects p ON te.project_id = p.id;
 
 -- Test the structure
 INSERT INTO time_entries (project_id, duration_hours, activity_description, entry_date, created_by)
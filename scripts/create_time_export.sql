@@ -0,0 +1,4 @@
+-- Index for the time entry export (src/time_export.py)
+-- Pages are read per project ordered by (entry_date, id), each page continuing
+-- after the last row of the previous one - an index range scan per page.
+CREATE INDEX IF NOT EXISTS idx_time_entries_project_date_id ON time_entries(project_id, entry_date, id);
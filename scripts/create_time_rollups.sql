@@ -0,0 +1,200 @@
+-- Incrementally maintained hour rollups for MGA Bot
+-- Run after create_time_summary.sql. Triggers keep weekly and monthly totals
+-- in step with time_entries, the summary functions read them instead of
+-- scanning every entry in the range.
+
+-- Hours per week (starting Monday), project and person
+CREATE TABLE IF NOT EXISTS time_rollup_week (
+    week_start DATE NOT NULL,
+    project_id UUID NOT NULL,
+    created_by TEXT NOT NULL DEFAULT '',
+    hours NUMERIC NOT NULL DEFAULT 0,
+    entries BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (week_start, project_id, created_by)
+);
+
+-- Hours per month and project (billing)
+CREATE TABLE IF NOT EXISTS time_rollup_month (
+    month_start DATE NOT NULL,
+    project_id UUID NOT NULL,
+    hours NUMERIC NOT NULL DEFAULT 0,
+    entries BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (month_start, project_id)
+);
+CREATE INDEX IF NOT EXISTS idx_time_rollup_month_project ON time_rollup_month(project_id, month_start);
+
+-- No foreign keys: a project deletion cascades to its entries, whose delete
+-- triggers then bring the rollup rows to zero. Rows at zero are skipped when reading.
+
+-- Add signed deltas [{project_id, created_by, entry_date, hours, entries}] to both rollups
+CREATE OR REPLACE FUNCTION time_rollup_merge(deltas JSONB)
+RETURNS VOID
+LANGUAGE sql AS $$
+    INSERT INTO time_rollup_week AS r (week_start, project_id, created_by, hours, entries)
+    SELECT date_trunc('week', d.entry_date)::DATE, d.project_id, coalesce(d.created_by, ''), SUM(d.hours), SUM(d.entries)
+    FROM jsonb_to_recordset(deltas) AS d(project_id UUID, created_by TEXT, entry_date DATE, hours NUMERIC, entries INT)
+    GROUP BY 1, 2, 3
+    ON CONFLICT (week_start, project_id, created_by)
+    DO UPDATE SET hours = r.hours + EXCLUDED.hours, entries = r.entries + EXCLUDED.entries;
+
+    INSERT INTO time_rollup_month AS r (month_start, project_id, hours, entries)
+    SELECT date_trunc('month', d.entry_date)::DATE, d.project_id, SUM(d.hours), SUM(d.entries)
+    FROM jsonb_to_recordset(deltas) AS d(project_id UUID, created_by TEXT, entry_date DATE, hours NUMERIC, entries INT)
+    GROUP BY 1, 2
+    ON CONFLICT (month_start, project_id)
+    DO UPDATE SET hours = r.hours + EXCLUDED.hours, entries = r.entries + EXCLUDED.entries;
+$$;
+
+-- Statement-level: a batch of 50 inserted entries is one merge, not 50
+CREATE OR REPLACE FUNCTION time_entries_rollup()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    deltas JSONB;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT jsonb_agg(jsonb_build_object('project_id', n.project_id, 'created_by', n.created_by,
+                                            'entry_date', n.entry_date, 'hours', n.duration_hours, 'entries', 1))
+        INTO deltas FROM new_rows n;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT jsonb_agg(jsonb_build_object('project_id', o.project_id, 'created_by', o.created_by,
+                                            'entry_date', o.entry_date, 'hours', -o.duration_hours, 'entries', -1))
+        INTO deltas FROM old_rows o;
+    ELSE
+        SELECT jsonb_agg(d) INTO deltas FROM (
+            SELECT o.project_id, o.created_by, o.entry_date, -o.duration_hours AS hours, -1 AS entries FROM old_rows o
+            UNION ALL
+            SELECT n.project_id, n.created_by, n.entry_date, n.duration_hours, 1 FROM new_rows n
+        ) d;
+    END IF;
+    IF deltas IS NOT NULL THEN
+        PERFORM time_rollup_merge(deltas);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS time_entries_rollup_insert ON time_entries;
+DROP TRIGGER IF EXISTS time_entries_rollup_update ON time_entries;
+DROP TRIGGER IF EXISTS time_entries_rollup_delete ON time_entries;
+CREATE TRIGGER time_entries_rollup_insert AFTER INSERT ON time_entries
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION time_entries_rollup();
+CREATE TRIGGER time_entries_rollup_update AFTER UPDATE ON time_entries
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION time_entries_rollup();
+CREATE TRIGGER time_entries_rollup_delete AFTER DELETE ON time_entries
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION time_entries_rollup();
+
+-- Backfill from the existing entries; writes wait until the rollups are complete
+BEGIN;
+LOCK TABLE time_entries IN SHARE MODE;
+TRUNCATE time_rollup_week, time_rollup_month;
+INSERT INTO time_rollup_week (week_start, project_id, created_by, hours, entries)
+SELECT date_trunc('week', entry_date)::DATE, project_id, coalesce(created_by, ''), SUM(duration_hours), COUNT(*)
+FROM time_entries GROUP BY 1, 2, 3;
+INSERT INTO time_rollup_month (month_start, project_id, hours, entries)
+SELECT date_trunc('month', entry_date)::DATE, project_id, SUM(duration_hours), COUNT(*)
+FROM time_entries GROUP BY 1, 2;
+COMMIT;
+
+-- Whole weeks of [from_date, to_date] as [full_from, full_to), empty if there are none
+CREATE OR REPLACE FUNCTION rollup_full_from(from_date DATE, to_date DATE)
+RETURNS DATE
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE WHEN date_trunc('week', (from_date + 6)::TIMESTAMP) < date_trunc('week', (to_date + 1)::TIMESTAMP)
+                THEN date_trunc('week', (from_date + 6)::TIMESTAMP)::DATE ELSE to_date + 1 END
+$$;
+
+CREATE OR REPLACE FUNCTION rollup_full_to(from_date DATE, to_date DATE)
+RETURNS DATE
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE WHEN date_trunc('week', (from_date + 6)::TIMESTAMP) < date_trunc('week', (to_date + 1)::TIMESTAMP)
+                THEN date_trunc('week', (to_date + 1)::TIMESTAMP)::DATE ELSE to_date + 1 END
+$$;
+
+-- Totals per week, project and person in [from_date, to_date]: whole weeks
+-- from the rollup, the partial weeks at either end (at most 6 days each) from the entries
+CREATE OR REPLACE FUNCTION time_totals(from_date DATE, to_date DATE)
+RETURNS TABLE (week_start DATE, project_id UUID, created_by TEXT, hours NUMERIC, entries BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT r.week_start, r.project_id, r.created_by, r.hours, r.entries
+    FROM time_rollup_week r
+    WHERE r.week_start >= rollup_full_from(from_date, to_date)
+      AND r.week_start < rollup_full_to(from_date, to_date)
+      AND r.entries > 0
+    UNION ALL
+    SELECT date_trunc('week', te.entry_date)::DATE, te.project_id, coalesce(te.created_by, ''),
+           SUM(te.duration_hours), COUNT(*)
+    FROM time_entries te
+    WHERE (te.entry_date >= from_date AND te.entry_date < rollup_full_from(from_date, to_date))
+       OR (te.entry_date >= rollup_full_to(from_date, to_date) AND te.entry_date <= to_date)
+    GROUP BY 1, 2, 3
+$$;
+
+-- The summary functions from create_time_summary.sql, now on top of the rollups
+CREATE OR REPLACE FUNCTION hours_by_project(from_date DATE, to_date DATE, user_id TEXT DEFAULT NULL)
+RETURNS TABLE (project_id UUID, project_number TEXT, project_name TEXT, hours NUMERIC, entries BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT p.id, p.project_number, p.name, t.hours, t.entries
+    FROM (
+        SELECT tt.project_id, SUM(tt.hours) AS hours, SUM(tt.entries)::BIGINT AS entries
+        FROM time_totals(from_date, to_date) tt
+        WHERE time_entry_by_user(tt.created_by, user_id)
+        GROUP BY tt.project_id
+    ) t
+    JOIN projects p ON p.id = t.project_id
+    ORDER BY t.hours DESC
+$$;
+
+CREATE OR REPLACE FUNCTION hours_by_user(from_date DATE, to_date DATE, for_project UUID DEFAULT NULL)
+RETURNS TABLE (created_by TEXT, hours NUMERIC, entries BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT tt.created_by, SUM(tt.hours), SUM(tt.entries)::BIGINT
+    FROM time_totals(from_date, to_date) tt
+    WHERE for_project IS NULL OR tt.project_id = for_project
+    GROUP BY tt.created_by
+    ORDER BY SUM(tt.hours) DESC
+$$;
+
+CREATE OR REPLACE FUNCTION hours_by_week(from_date DATE, to_date DATE, user_id TEXT DEFAULT NULL,
+                                         for_project UUID DEFAULT NULL)
+RETURNS TABLE (week_start DATE, hours NUMERIC, entries BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT tt.week_start, SUM(tt.hours), SUM(tt.entries)::BIGINT
+    FROM time_totals(from_date, to_date) tt
+    WHERE time_entry_by_user(tt.created_by, user_id)
+      AND (for_project IS NULL OR tt.project_id = for_project)
+    GROUP BY tt.week_start
+    ORDER BY tt.week_start
+$$;
+
+-- Hours per month for one project (or all), straight from the monthly rollup
+CREATE OR REPLACE FUNCTION hours_by_month(from_month DATE, to_month DATE, for_project UUID DEFAULT NULL)
+RETURNS TABLE (month_start DATE, project_id UUID, hours NUMERIC, entries BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT r.month_start, r.project_id, r.hours, r.entries
+    FROM time_rollup_month r
+    WHERE r.month_start BETWEEN date_trunc('month', from_month)::DATE AND date_trunc('month', to_month)::DATE
+      AND (for_project IS NULL OR r.project_id = for_project)
+      AND r.entries > 0
+    ORDER BY r.month_start, r.project_id
+$$;
+
+-- Reporting view without ORDER BY - sorting the whole table on every read is the caller's job
+CREATE OR REPLACE VIEW time_entries_with_projects AS
+SELECT
+    te.id,
+    te.created_at,
+    te.project_id,
+    p.name as project_name,
+    p.project_number,
+    te.duration_hours,
+    te.activity_description,
+    te.entry_date,
+    te.created_by
+FROM time_entries te
+JOIN projects p ON te.project_id = p.id;
+
+-- Test: rollup totals match the entries
+SELECT
+    (SELECT COALESCE(SUM(hours), 0) FROM time_rollup_week) AS rollup_hours,
+    (SELECT COALESCE(SUM(duration_hours), 0) FROM time_entries) AS entry_hours;
@@ -0,0 +1,59 @@
+-- Aggregated hour reports for MGA Bot (SHOW_SUMMARY)
+-- Run after create_time_entries_table.sql. Only aggregated rows leave the database.
+
+-- Date range scans read everything they need from the index
+CREATE INDEX IF NOT EXISTS idx_time_entries_summary ON time_entries(entry_date)
+    INCLUDE (project_id, duration_hours, created_by);
+
+-- created_by is stored as 'Name (telegram_user_id)'
+CREATE OR REPLACE FUNCTION time_entry_by_user(created_by TEXT, user_id TEXT)
+RETURNS BOOLEAN
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT user_id IS NULL OR created_by LIKE '%(' || user_id || ')'
+$$;
+
+-- Hours per project in [from_date, to_date], optionally for one user
+CREATE OR REPLACE FUNCTION hours_by_project(from_date DATE, to_date DATE, user_id TEXT DEFAULT NULL)
+RETURNS TABLE (project_id UUID, project_number TEXT, project_name TEXT, hours NUMERIC, entries BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT p.id, p.project_number, p.name, t.hours, t.entries
+    FROM (
+        SELECT te.project_id, SUM(te.duration_hours) AS hours, COUNT(*) AS entries
+        FROM time_entries te
+        WHERE te.entry_date BETWEEN from_date AND to_date
+          AND time_entry_by_user(te.created_by, user_id)
+        GROUP BY te.project_id
+    ) t
+    JOIN projects p ON p.id = t.project_id
+    ORDER BY t.hours DESC
+$$;
+
+-- Hours per user in [from_date, to_date], optionally for one project
+CREATE OR REPLACE FUNCTION hours_by_user(from_date DATE, to_date DATE, for_project UUID DEFAULT NULL)
+RETURNS TABLE (created_by TEXT, hours NUMERIC, entries BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT te.created_by, SUM(te.duration_hours), COUNT(*)
+    FROM time_entries te
+    WHERE te.entry_date BETWEEN from_date AND to_date
+      AND (for_project IS NULL OR te.project_id = for_project)
+    GROUP BY te.created_by
+    ORDER BY SUM(te.duration_hours) DESC
+$$;
+
+-- Hours per ISO week (starting Monday) in [from_date, to_date], optionally for one user and/or project
+CREATE OR REPLACE FUNCTION hours_by_week(from_date DATE, to_date DATE, user_id TEXT DEFAULT NULL,
+                                         for_project UUID DEFAULT NULL)
+RETURNS TABLE (week_start DATE, hours NUMERIC, entries BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT date_trunc('week', te.entry_date)::DATE, SUM(te.duration_hours), COUNT(*)
+    FROM time_entries te
+    WHERE te.entry_date BETWEEN from_date AND to_date
+      AND time_entry_by_user(te.created_by, user_id)
+      AND (for_project IS NULL OR te.project_id = for_project)
+    GROUP BY 1
+    ORDER BY 1
+$$;
+
+-- Test the functions
+SELECT * FROM hours_by_project(CURRENT_DATE - 7, CURRENT_DATE);
+SELECT * FROM hours_by_week(CURRENT_DATE - 28, CURRENT_DATE);
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""Export a project's time entries to CSV/XLSX, e.g. `export_time_entries.py 25-003 Juni --format xlsx`"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from supabase import create_client
+
+from time_export import export_file_name, export_time_entries, iter_time_entry_pages
+from time_summary import resolve_time_range
+
+def find_project(client, identifier: str) -> dict:
+    """Best match from the search_projects RPC (scripts/create_project_search.sql)"""
+    rows = client.rpc('search_projects', {'q': identifier, 'max_results': 1}).execute().data
+    if not rows:
+        sys.exit(f"Project not found: {identifier}")
+    return rows[0]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('project', help='project number or name')
+    parser.add_argument('range', nargs='*', help="e.g. 'Juni', 'letzten Monat', '2025-06-01..2025-06-30' (default: this month)")
+    parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+    parser.add_argument('--output', help='output file (default: Stunden_<number>_<from>_<to>.<format>)')
+    parser.add_argument('--page-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    client = create_client(os.environ['SUPABASE_URL'], os.environ['SUPABASE_ANON_KEY'])
+    project = find_project(client, args.project)
+    start, end, label = resolve_time_range(' '.join(args.range) or 'this_month')
+    output = args.output or export_file_name(project, start, end, args.format)
+
+    pages = iter_time_entry_pages(client, project['id'], start, end, page_size=args.page_size)
+    rows, hours = export_time_entries(pages, output, args.format, project['name'])
+    print(f"📄 {output}: {rows} entries, {hours:.2f} h ({project['name']}, {label})")
@@ -0,0 +1,143 @@
+"""
+Per-chat conversation state for follow-up questions
+"""
+
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional
+
+# Short answers that confirm or decline the pending question
+CONFIRM_WORDS = {
+    'ja', 'jo', 'jap', 'jep', 'jawohl', 'ok', 'okay', 'gerne', 'gern', 'passt',
+    'klar', 'genau', 'bitte', 'mach', 'machen', 'yes', 'y', 'sicher', 'natürlich'
+}
+DECLINE_WORDS = {
+    'nein', 'ne', 'nee', 'nö', 'noe', 'später', 'abbrechen', 'no', 'n',
+    'stopp', 'stop'
+}
+MAX_CONFIRMATION_WORDS = 3
+
+
+@dataclass
+class ChatState:
+    """Compact state of the last exchange in one chat"""
+    last_intent: Optional[str] = None
+    project: Optional[Dict[str, Any]] = None
+    pending_question: Optional[str] = None
+    pending_action: Optional[str] = None
+    pending_params: Dict[str, Any] = field(default_factory=dict)
+    # Carried in the callback_data of the prompt's buttons - taps on older prompts don't match
+    pending_nonce: Optional[str] = None
+    updated_at: float = field(default_factory=time.monotonic)
+
+
+def new_prompt_nonce() -> str:
+    """Short random tag for one prompt's buttons"""
+    return secrets.token_hex(4)
+
+
+def parse_confirmation(text: str) -> Optional[bool]:
+    """Return True/False for a short yes/no answer, None for anything else"""
+    words = re.findall(r'[a-zäöüß]+', text.lower())
+    if not words or len(words) > MAX_CONFIRMATION_WORDS:
+        return None
+
+    # "ja bitte", "nein danke" - the first word decides
+    if words[0] in DECLINE_WORDS:
+        return False
+    if words[0] in CONFIRM_WORDS and not any(word in ('nein', 'nicht') for word in words):
+        return True
+    return None
+
+
+class ConversationStateStore:
+    """Bounded, TTL-evicted store of ChatState keyed by chat_id
+
+    Capacity eviction drops the least recently used chat (read or written),
+    the TTL counts from the last write.
+    """
+
+    def __init__(self, max_chats: int = 500, ttl_seconds: float = 900,
+                 max_context_chars: int = 240):
+        self.max_chats = max_chats
+        self.ttl_seconds = ttl_seconds
+        self.max_context_chars = max_context_chars
+        self._states: "OrderedDict[int, ChatState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _is_expired(self, state: ChatState, now: float) -> bool:
+        return now - state.updated_at > self.ttl_seconds
+
+    def get(self, chat_id: int) -> Optional[ChatState]:
+        """Return the live state for a chat or None if missing/expired"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._states.get(chat_id)
+            if state is None:
+                return None
+            if self._is_expired(state, now):
+                del self._states[chat_id]
+                return None
+            # A chat that is only being read is still active - evict it last
+            self._states.move_to_end(chat_id)
+            return state
+
+    def update(self, chat_id: int, **changes: Any) -> ChatState:
+        """Merge changes into the chat state and mark it as most recent"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._states.pop(chat_id, None)
+            if state is None or self._is_expired(state, now):
+                state = ChatState()
+            for key, value in changes.items():
+                setattr(state, key, value)
+            state.updated_at = now
+            self._states[chat_id] = state
+
+            # Evict expired entries first, then the least recently used
+            while self._states:
+                oldest_id, oldest = next(iter(self._states.items()))
+                if len(self._states) <= self.max_chats and not self._is_expired(oldest, now):
+                    break
+                del self._states[oldest_id]
+            return state
+
+    def clear_pending(self, chat_id: int) -> None:
+        """Forget the pending question but keep intent and project context"""
+        with self._lock:
+            state = self._states.get(chat_id)
+            if state is not None:
+                state.pending_question = None
+                state.pending_action = None
+                state.pending_params = {}
+                state.pending_nonce = None
+
+    def discard(self, chat_id: int) -> None:
+        with self._lock:
+            self._states.pop(chat_id, None)
+
+    def prompt_context(self, chat_id: int) -> str:
+        """Render the chat state as a short German context line for the LLM"""
+        state = self.get(chat_id)
+        if state is None:
+            return ""
+
+        parts = []
+        if state.last_intent:
+            parts.append(f"Letzter Intent: {state.last_intent}")
+        if state.project:
+            parts.append(f"Aktuelles Projekt: {state.project.get('name')}")
+        if state.pending_question:
+            parts.append(f"Offene Frage: {state.pending_question}")
+
+        context = "; ".join(parts)
+        if len(context) > self.max_context_chars:
+            context = context[:self.max_context_chars - 1] + "…"
+        return context
+
+    def __len__(self) -> int:
+        return len(self._states)
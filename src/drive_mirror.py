@@ -0,0 +1,233 @@
+"""
+Local mirror of the shared-drive project folder tree, kept fresh via the Drive Changes API
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Dict, Any, Callable, List, Optional
+
+from project_counter import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+FOLDER_FIELDS = 'id, name, mimeType, parents, modifiedTime, trashed'
+
+
+def run_request(request) -> Any:
+    return request.execute()
+
+
+class DriveMirror:
+    """In-memory index of project folders (root children) and their subfolders
+
+    Seeded once with a folder listing of the shared drive, then updated by
+    polling ``changes.list`` with a persisted page token. Lookups by name or
+    ID never touch the network.
+    """
+
+    def __init__(self, state_file: str, root_id: str):
+        self.state_file = state_file
+        self.root_id = root_id
+        self.page_token: Optional[str] = None
+        self._folders: Dict[str, Dict[str, Any]] = {}
+        self._children: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def ready(self) -> bool:
+        return self.page_token is not None
+
+    # --- lookups ---------------------------------------------------------
+
+    def find_child(self, parent_id: str, name: str) -> Optional[str]:
+        """Folder ID of `name` directly below `parent_id`"""
+        with self._lock:
+            return self._children.get(parent_id, {}).get(name)
+
+    def project_folder_id(self, project_name: str) -> Optional[str]:
+        return self.find_child(self.root_id, project_name)
+
+    def project_folder_names(self) -> List[str]:
+        with self._lock:
+            return list(self._children.get(self.root_id, {}))
+
+    def get(self, folder_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            folder = self._folders.get(folder_id)
+            return dict(folder) if folder else None
+
+    def __len__(self) -> int:
+        return len(self._folders)
+
+    # --- updates ---------------------------------------------------------
+
+    def _depth(self, parent_id: Optional[str]) -> Optional[int]:
+        """1 for project folders, 2 for their subfolders, None for anything else"""
+        if parent_id == self.root_id:
+            return 1
+        parent = self._folders.get(parent_id)
+        if parent and parent.get('parent') == self.root_id:
+            return 2
+        return None
+
+    def _remove(self, folder_id: str) -> None:
+        folder = self._folders.pop(folder_id, None)
+        if not folder:
+            return
+        siblings = self._children.get(folder['parent'], {})
+        if siblings.get(folder['name']) == folder_id:
+            del siblings[folder['name']]
+        # Subfolders of a removed project folder are no longer reachable
+        for child_id in list(self._children.pop(folder_id, {}).values()):
+            self._remove(child_id)
+
+    def apply(self, file: Dict[str, Any]) -> None:
+        """Insert, move, rename or drop one folder from a Drive file resource"""
+        with self._lock:
+            folder_id = file['id']
+            parent_id = (file.get('parents') or [None])[0]
+            if (file.get('mimeType') != FOLDER_MIME_TYPE or file.get('trashed')
+                    or self._depth(parent_id) is None):
+                self._remove(folder_id)
+                return
+
+            existing = self._folders.get(folder_id)
+            if existing and (existing['parent'] != parent_id or existing['name'] != file['name']):
+                siblings = self._children.get(existing['parent'], {})
+                if siblings.get(existing['name']) == folder_id:
+                    del siblings[existing['name']]
+
+            self._folders[folder_id] = {
+                'id': folder_id,
+                'name': file['name'],
+                'parent': parent_id,
+                'modified_time': file.get('modifiedTime')
+            }
+            self._children.setdefault(parent_id, {})[file['name']] = folder_id
+
+    def record_folder(self, folder_id: str, name: str, parent_id: str) -> None:
+        """Add a folder we just created ourselves, without waiting for the next poll"""
+        self.apply({'id': folder_id, 'name': name, 'parents': [parent_id], 'mimeType': FOLDER_MIME_TYPE})
+
+    def remove_folder(self, folder_id: str) -> None:
+        with self._lock:
+            self._remove(folder_id)
+
+    # --- persistence -----------------------------------------------------
+
+    def load(self) -> bool:
+        """Restore the snapshot and page token from disk"""
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+        except ValueError as e:
+            logger.error(f"❌ Unreadable Drive mirror state, reseeding: {e}")
+            return False
+
+        if state.get('root_id') != self.root_id:
+            return False
+        with self._lock:
+            self._folders.clear()
+            self._children.clear()
+            # Parents first, so every subfolder finds its project folder
+            folders = sorted(state.get('folders', []), key=lambda f: f['parent'] != self.root_id)
+            for folder in folders:
+                self.apply({'id': folder['id'], 'name': folder['name'], 'parents': [folder['parent']],
+                            'mimeType': FOLDER_MIME_TYPE, 'modifiedTime': folder.get('modified_time')})
+            self.page_token = state.get('page_token')
+        return self.ready
+
+    def save(self) -> None:
+        with self._lock:
+            state = {
+                'root_id': self.root_id,
+                'page_token': self.page_token,
+                'folders': list(self._folders.values())
+            }
+        directory = os.path.dirname(os.path.abspath(self.state_file))
+        os.makedirs(directory, exist_ok=True)
+        write_json_atomic(self.state_file, state)
+
+    # --- Drive API -------------------------------------------------------
+
+    def seed(self, drive, execute: Optional[Callable[[Any], Any]] = None) -> None:
+        """List all folders of the shared drive once and remember the change token
+
+        ``execute`` runs each request (e.g. through the API scheduler),
+        by default ``request.execute()``.
+        """
+        execute = execute or run_request
+        # Take the token first - changes during the listing are replayed by the next poll
+        token = execute(drive.changes().getStartPageToken(
+            driveId=self.root_id, supportsAllDrives=True
+        ))['startPageToken']
+
+        folders = []
+        page_token = None
+        while True:
+            response = execute(drive.files().list(
+                q=f"mimeType = '{FOLDER_MIME_TYPE}' and trashed = false",
+                corpora='drive',
+                driveId=self.root_id,
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True,
+                fields=f'nextPageToken, files({FOLDER_FIELDS})',
+                pageSize=1000,
+                pageToken=page_token
+            ))
+            folders.extend(response.get('files', []))
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+
+        with self._lock:
+            self._folders.clear()
+            self._children.clear()
+            # Project folders first, then their subfolders
+            for folder in sorted(folders, key=lambda f: (f.get('parents') or [None])[0] != self.root_id):
+                self.apply(folder)
+            self.page_token = token
+        self.save()
+        logger.info(f"🗂️ Drive mirror seeded: {len(self._folders)} folders")
+
+    def poll(self, drive, execute: Optional[Callable[[Any], Any]] = None) -> int:
+        """Apply all changes since the last page token, returns the number of changes"""
+        if not self.ready:
+            self.seed(drive, execute)
+            return 0
+
+        execute = execute or run_request
+
+        applied = 0
+        page_token = self.page_token
+        while page_token:
+            response = execute(drive.changes().list(
+                pageToken=page_token,
+                driveId=self.root_id,
+                includeItemsFromAllDrives=True,
+                supportsAllDrives=True,
+                fields=f'nextPageToken, newStartPageToken, changes(fileId, removed, file({FOLDER_FIELDS}))',
+                pageSize=1000
+            ))
+
+            for change in response.get('changes', []):
+                if change.get('removed') or not change.get('file'):
+                    self.remove_folder(change['fileId'])
+                else:
+                    self.apply(change['file'])
+                applied += 1
+
+            if response.get('newStartPageToken'):
+                with self._lock:
+                    self.page_token = response['newStartPageToken']
+                break
+            page_token = response.get('nextPageToken')
+
+        if applied:
+            self.save()
+        return applied
@@ -0,0 +1,97 @@
+"""
+Local index of filed Drive files by Telegram file_unique_id and SHA-256 content hash
+"""
+
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS drive_files (
+    drive_file_id TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    name TEXT NOT NULL,
+    parent_id TEXT NOT NULL,
+    size INTEGER,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS drive_files_sha256 ON drive_files (sha256);
+CREATE TABLE IF NOT EXISTS telegram_files (
+    file_unique_id TEXT PRIMARY KEY,
+    drive_file_id TEXT NOT NULL REFERENCES drive_files (drive_file_id) ON DELETE CASCADE
+);
+"""
+
+
+class FileDedupIndex:
+    """SQLite index answering "have we filed this content before?"
+
+    A known ``file_unique_id`` is recognised before downloading anything. A
+    new ``file_unique_id`` with known content (same photo re-sent from the
+    gallery) is only recognised by its hash after the upload.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # One short-lived connection per call - callers run on several threads
+        db = sqlite3.connect(self.path, timeout=10)
+        db.row_factory = sqlite3.Row
+        db.execute('PRAGMA foreign_keys=ON')
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def by_unique_id(self, file_unique_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as db:
+            row = db.execute(
+                'SELECT d.* FROM telegram_files t JOIN drive_files d USING (drive_file_id) '
+                'WHERE t.file_unique_id = ?', (file_unique_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def by_sha256(self, sha256: str, exclude_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Oldest filed copy of this content"""
+        with self._connect() as db:
+            row = db.execute(
+                'SELECT * FROM drive_files WHERE sha256 = ? AND drive_file_id != ? ORDER BY created_at LIMIT 1',
+                (sha256, exclude_id or '')
+            ).fetchone()
+        return dict(row) if row else None
+
+    def record(self, drive_file_id: str, sha256: str, name: str, parent_id: str,
+               size: Optional[int] = None, file_unique_id: Optional[str] = None) -> None:
+        with self._connect() as db:
+            db.execute(
+                'INSERT OR IGNORE INTO drive_files (drive_file_id, sha256, name, parent_id, size, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (drive_file_id, sha256, name, parent_id, size, time.time())
+            )
+            if file_unique_id:
+                self._link(db, file_unique_id, drive_file_id)
+
+    def link(self, file_unique_id: str, drive_file_id: str) -> None:
+        """Remember that a Telegram file is the same content as a filed Drive file"""
+        with self._connect() as db:
+            self._link(db, file_unique_id, drive_file_id)
+
+    @staticmethod
+    def _link(db: sqlite3.Connection, file_unique_id: str, drive_file_id: str) -> None:
+        db.execute('INSERT OR REPLACE INTO telegram_files (file_unique_id, drive_file_id) VALUES (?, ?)',
+                   (file_unique_id, drive_file_id))
+
+    def forget(self, drive_file_id: str) -> None:
+        """Drop a Drive file that no longer exists, with all Telegram IDs pointing at it"""
+        with self._connect() as db:
+            db.execute('DELETE FROM drive_files WHERE drive_file_id = ?', (drive_file_id,))
@@ -0,0 +1,325 @@
+"""
+Streaming ingestion of Telegram photos and documents into Drive project folders
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API_URL = 'https://api.telegram.org'
+DRIVE_UPLOAD_URL = 'https://www.googleapis.com/upload/drive/v3/files'
+
+# Drive requires every chunk but the last to be a multiple of 256 KiB
+UPLOAD_ALIGNMENT = 256 * 1024
+UPLOAD_CHUNK_SIZE = 4 * UPLOAD_ALIGNMENT
+UPLOAD_CHUNK_RETRIES = 3
+
+PLAN_EXTENSIONS = ('.pdf', '.dwg', '.dxf')
+
+
+class FileIngestError(Exception):
+    """Download from Telegram or upload to Drive failed"""
+
+
+@dataclass
+class IncomingFile:
+    """A photo or document attached to a Telegram message"""
+    file_id: str
+    file_unique_id: str
+    file_name: str
+    mime_type: str
+    file_size: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class IngestResult:
+    """Uploaded Drive file plus what was learned from the stream on the way"""
+    drive_file: Dict[str, Any]
+    sha256: str
+    size: int
+    # Spooled copy on disk if requested - the receiver owns (and deletes) it
+    local_copy: Optional[str] = None
+
+
+def incoming_file_from_message(message: Dict[str, Any]) -> Optional[IncomingFile]:
+    """Largest photo size or the document of a message, None for anything else"""
+    if message.get('photo'):
+        # Telegram sends several sizes, the last one is the original resolution
+        photo = message['photo'][-1]
+        sent = datetime.fromtimestamp(message.get('date', time.time())).strftime('%Y%m%d_%H%M%S')
+        return IncomingFile(
+            file_id=photo['file_id'],
+            file_unique_id=photo['file_unique_id'],
+            file_name=f"Foto_{sent}_{photo['file_unique_id']}.jpg",
+            mime_type='image/jpeg',
+            file_size=photo.get('file_size')
+        )
+
+    document = message.get('document')
+    if document:
+        return IncomingFile(
+            file_id=document['file_id'],
+            file_unique_id=document['file_unique_id'],
+            file_name=document.get('file_name') or f"Dokument_{document['file_unique_id']}",
+            mime_type=document.get('mime_type') or 'application/octet-stream',
+            file_size=document.get('file_size')
+        )
+    return None
+
+
+def target_subfolder(incoming: IncomingFile) -> str:
+    """Project subfolder a file is filed into"""
+    if incoming.mime_type.startswith('image/'):
+        return '04_Fotos'
+    if os.path.splitext(incoming.file_name.lower())[1] in PLAN_EXTENSIONS or incoming.mime_type == 'application/pdf':
+        return '02_Pläne'
+    return '01_Admin'
+
+
+def tee_stream(stream: Iterable[bytes], digest, sink=None) -> Iterator[bytes]:
+    """Pass a byte stream through, hashing it and optionally copying it to a file"""
+    for data in stream:
+        digest.update(data)
+        if sink is not None:
+            sink.write(data)
+        yield data
+
+
+def rechunk(stream: Iterable[bytes], chunk_size: int) -> Iterator[Tuple[bytes, bool]]:
+    """Regroup a byte stream into exact `chunk_size` blocks, flagging the last one
+
+    Only one block (plus the look-ahead block) is held in memory at a time.
+    """
+    buffer = bytearray()
+    pending = None
+    for data in stream:
+        if not data:
+            continue
+        buffer.extend(data)
+        while len(buffer) >= chunk_size:
+            if pending is not None:
+                yield pending, False
+            pending = bytes(buffer[:chunk_size])
+            del buffer[:chunk_size]
+
+    if buffer:
+        if pending is not None:
+            yield pending, False
+        yield bytes(buffer), True
+    elif pending is not None:
+        yield pending, True
+
+
+def persisted_bytes(response: requests.Response) -> int:
+    """Bytes Drive has kept according to the ``Range: bytes=0-N`` header of a 308"""
+    match = re.match(r'bytes=0-(\d+)$', response.headers.get('Range') or '')
+    return int(match.group(1)) + 1 if match else 0
+
+
+class FileIngestor:
+    """Streams Telegram files into resumable Drive uploads on a bounded worker pool
+
+    At most ``max_workers`` uploads run at once, each holding a single chunk in
+    memory. ``max_pending`` caps the queued jobs - ``submit`` refuses new work
+    beyond that instead of buffering it.
+    """
+
+    def __init__(self, bot_token: str, session_factory: Callable[[], requests.Session],
+                 max_workers: int = 3, max_pending: int = 10, chunk_size: int = UPLOAD_CHUNK_SIZE,
+                 throttle: Optional[Callable[[], None]] = None):
+        if chunk_size % (256 * 1024):
+            raise ValueError("chunk_size must be a multiple of 256 KiB")
+        self.bot_token = bot_token
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+        # Called before every Drive request, e.g. to take a token from the shared Drive quota
+        self.throttle = throttle
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='ingest')
+        self._slots = threading.BoundedSemaphore(max(1, max_workers) + max(0, max_pending))
+
+    def submit(self, incoming: IncomingFile, parent_id: str,
+               on_done: Callable[[IncomingFile, Optional[IngestResult], Optional[Exception]], None],
+               keep_copy: bool = False) -> bool:
+        """Queue an upload, returns False if the queue is full"""
+        if not self._slots.acquire(blocking=False):
+            return False
+
+        def run():
+            try:
+                result, error = self.ingest(incoming, parent_id, keep_copy), None
+            except Exception as e:
+                result, error = None, e
+                logger.error(f"❌ Ingestion of {incoming.file_name} failed: {e}")
+            finally:
+                self._slots.release()
+            try:
+                on_done(incoming, result, error)
+            except Exception as e:
+                logger.error(f"❌ Ingestion callback failed: {e}")
+
+        self._executor.submit(run)
+        return True
+
+    def ingest(self, incoming: IncomingFile, parent_id: str, keep_copy: bool = False) -> IngestResult:
+        """Download from Telegram and upload to Drive chunk by chunk
+
+        With ``keep_copy`` the stream is also spooled to a temporary file (on
+        disk, never in memory) for later processing such as previews.
+        """
+        file_path, file_size = self.resolve_file(incoming.file_id)
+        size = file_size or incoming.file_size
+        digest = hashlib.sha256()
+        sink = tempfile.NamedTemporaryFile(prefix='ingest-', delete=False) if keep_copy else None
+
+        url = f"{TELEGRAM_API_URL}/file/bot{self.bot_token}/{file_path}"
+        try:
+            with requests.get(url, stream=True, timeout=60) as download:
+                if download.status_code != 200:
+                    raise FileIngestError(f"Telegram download failed: HTTP {download.status_code}")
+                session = self.session_factory()
+                upload_url = self.start_upload(session, incoming, parent_id, size)
+                stream = tee_stream(download.iter_content(self.chunk_size), digest, sink)
+                drive_file = self.upload_chunks(session, upload_url, stream)
+        except Exception:
+            if sink is not None:
+                sink.close()
+                os.unlink(sink.name)
+            raise
+
+        local_copy = None
+        if sink is not None:
+            local_copy = sink.name
+            sink.close()
+        logger.info(f"📎 Filed {incoming.file_name} into {parent_id} (ID: {drive_file.get('id')})")
+        return IngestResult(drive_file, digest.hexdigest(),
+                            os.path.getsize(local_copy) if local_copy else (size or 0), local_copy)
+
+    def upload_file(self, local_path: str, file_name: str, mime_type: str, parent_id: str) -> Dict[str, Any]:
+        """Upload a local file (e.g. a generated preview) with the same chunked protocol"""
+        session = self.session_factory()
+        incoming = IncomingFile('', '', file_name, mime_type, os.path.getsize(local_path))
+        upload_url = self.start_upload(session, incoming, parent_id, incoming.file_size)
+        with open(local_path, 'rb') as f:
+            return self.upload_chunks(session, upload_url, iter(lambda: f.read(self.chunk_size), b''))
+
+    def resolve_file(self, file_id: str) -> Tuple[str, Optional[int]]:
+        """Telegram getFile: download path and size of a file_id"""
+        response = requests.get(f"{TELEGRAM_API_URL}/bot{self.bot_token}/getFile",
+                                params={'file_id': file_id}, timeout=30)
+        result = response.json() if response.status_code == 200 else {}
+        if not result.get('ok'):
+            # Bot API downloads are limited to 20 MB
+            raise FileIngestError(f"getFile failed: {result.get('description', response.status_code)}")
+        return result['result']['file_path'], result['result'].get('file_size')
+
+    def start_upload(self, session: requests.Session, incoming: IncomingFile,
+                     parent_id: str, size: Optional[int]) -> str:
+        """Open a resumable upload session, returns its upload URL"""
+        headers = {'X-Upload-Content-Type': incoming.mime_type}
+        if size:
+            headers['X-Upload-Content-Length'] = str(size)
+        self._throttle()
+        response = session.post(
+            DRIVE_UPLOAD_URL,
+            params={'uploadType': 'resumable', 'supportsAllDrives': 'true', 'fields': 'id,name,webViewLink'},
+            json={'name': incoming.file_name, 'parents': [parent_id], 'mimeType': incoming.mime_type},
+            headers=headers,
+            timeout=30
+        )
+        if response.status_code != 200 or 'Location' not in response.headers:
+            raise FileIngestError(f"Resumable upload not started: HTTP {response.status_code}")
+        return response.headers['Location']
+
+    def upload_chunks(self, session: requests.Session, upload_url: str,
+                      stream: Iterable[bytes]) -> Dict[str, Any]:
+        """PUT the stream chunk by chunk, the total size is only announced with the last chunk
+
+        Drive may keep less than it was sent. Every 308 reports the bytes it
+        has (``Range``) and after an error the upload status is queried, so
+        each PUT starts where Drive actually is - bytes it did not keep stay
+        buffered and go out with the next request.
+        """
+        offset = 0
+        buffer = bytearray()
+        stalled = 0
+        for chunk, last in rechunk(stream, self.chunk_size):
+            buffer.extend(chunk)
+            while buffer and (last or len(buffer) >= self.chunk_size):
+                # All but the final PUT must be a multiple of 256 KiB
+                size = len(buffer) if last else len(buffer) - len(buffer) % UPLOAD_ALIGNMENT
+                total = str(offset + len(buffer)) if last else '*'
+                response = self._put_range(session, upload_url, bytes(buffer[:size]), offset, total)
+                if response.status_code in (200, 201):
+                    return response.json()
+
+                persisted = persisted_bytes(response)
+                if not offset <= persisted <= offset + size:
+                    raise FileIngestError(f"Drive reports {persisted} bytes, {offset} were confirmed before")
+                stalled = stalled + 1 if persisted == offset else 0
+                if stalled > UPLOAD_CHUNK_RETRIES:
+                    raise FileIngestError(f"No upload progress at {offset}")
+                del buffer[:persisted - offset]
+                offset = persisted
+
+        raise FileIngestError("Empty file")
+
+    def _put_range(self, session: requests.Session, upload_url: str, data: bytes,
+                   offset: int, total: str) -> requests.Response:
+        """PUT one byte range, returns the 200/201/308 response - also the one of a status query"""
+        headers = {'Content-Range': f"bytes {offset}-{offset + len(data) - 1}/{total}"}
+        for attempt in range(UPLOAD_CHUNK_RETRIES + 1):
+            self._throttle()
+            try:
+                response = session.put(upload_url, data=data, headers=headers, timeout=60)
+            except requests.RequestException as e:
+                error = str(e)
+            else:
+                if response.status_code in (200, 201, 308):
+                    return response
+                if response.status_code < 500:
+                    raise FileIngestError(f"Unexpected upload response: HTTP {response.status_code}")
+                error = f"HTTP {response.status_code}"
+            if attempt == UPLOAD_CHUNK_RETRIES:
+                raise FileIngestError(f"Chunk at {offset} failed: {error}")
+            time.sleep(0.5 * 2 ** attempt)
+
+            # Part of the range may have arrived - ask instead of resending it blindly
+            status = self._query_status(session, upload_url, total)
+            if status is not None:
+                return status
+        raise FileIngestError(f"Chunk at {offset} failed")
+
+    def _query_status(self, session: requests.Session, upload_url: str, total: str) -> Optional[requests.Response]:
+        """Empty PUT asking how much of the upload Drive has, None if that fails too"""
+        self._throttle()
+        try:
+            response = session.put(upload_url, data=b'', headers={'Content-Range': f"bytes */{total}"}, timeout=60)
+        except requests.RequestException as e:
+            logger.warning(f"⚠️ Upload status query failed: {e}")
+            return None
+        if response.status_code in (200, 201, 308):
+            return response
+        logger.warning(f"⚠️ Upload status query failed: HTTP {response.status_code}")
+        return None
+
+    def _throttle(self) -> None:
+        if self.throttle is not None:
+            self.throttle()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
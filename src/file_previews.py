@@ -0,0 +1,153 @@
+"""
+Thumbnail and first-page previews for filed photos and plans, rendered in a process pool
+"""
+
+import importlib.util
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_MAX_SIZE = (640, 640)
+PREVIEW_QUALITY = 80
+
+
+# PDFs are only spooled for a preview if the workers can render them
+PDF_PREVIEWS = importlib.util.find_spec('fitz') is not None
+
+
+def is_previewable(file_name: str, mime_type: str) -> bool:
+    if mime_type.startswith('image/'):
+        return True
+    return PDF_PREVIEWS and (mime_type == 'application/pdf' or file_name.lower().endswith('.pdf'))
+
+
+def preview_name(file_name: str) -> str:
+    """'Grundriss EG.pdf' -> 'Grundriss EG_preview.jpg'"""
+    return f"{os.path.splitext(file_name)[0]}_preview.jpg"
+
+
+def render_preview(source_path: str, mime_type: str, target_path: str,
+                   max_size: Tuple[int, int] = PREVIEW_MAX_SIZE) -> Optional[str]:
+    """Write a downscaled JPEG of an image or of a PDF's first page (runs in a worker process)"""
+    # Imported here so the bot starts without the imaging libraries installed
+    from PIL import Image, ImageOps
+
+    if mime_type == 'application/pdf' or source_path.lower().endswith('.pdf'):
+        try:
+            import fitz  # PyMuPDF
+        except ImportError:
+            return None
+        with fitz.open(source_path) as document:
+            if not document.page_count:
+                return None
+            page = document.load_page(0)
+            zoom = min(max_size[0] / page.rect.width, max_size[1] / page.rect.height)
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            image = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+    else:
+        image = Image.open(source_path)
+        # Let the JPEG decoder downscale while loading
+        image.draft('RGB', max_size)
+        # Phone photos are often stored sideways with an EXIF rotation
+        image = ImageOps.exif_transpose(image)
+
+    image = image.convert('RGB')
+    image.thumbnail(max_size)
+    temp_path = f"{target_path}.{os.getpid()}.tmp"
+    image.save(temp_path, 'JPEG', quality=PREVIEW_QUALITY, optimize=True)
+    os.replace(temp_path, target_path)
+    return target_path
+
+
+class PreviewPool:
+    """Bounded process pool with a content-hash cache of rendered previews
+
+    Rendering is CPU-bound, so it runs in separate processes and never on the
+    request thread. ``submit`` refuses work beyond ``max_queue`` waiting jobs.
+    Previews are cached as ``<sha256>.jpg``, so identical files are rendered
+    once, and concurrent requests for the same content share one render.
+    Callbacks run on a dedicated thread, not on the pool's result thread.
+    """
+
+    def __init__(self, cache_dir: str, max_workers: int = 2, max_queue: int = 8,
+                 max_size: Tuple[int, int] = PREVIEW_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        # Spawned, not forked: the bot's threads (write-behind, token refresher, ingest) may hold
+        # logging, httplib2 or sqlite locks at fork time, and a forked child would inherit them held
+        self._processes = ProcessPoolExecutor(max_workers=max(1, max_workers),
+                                              mp_context=multiprocessing.get_context('spawn'))
+        self._callbacks = ThreadPoolExecutor(max_workers=1, thread_name_prefix='preview')
+        self._slots = threading.BoundedSemaphore(max(1, max_workers) + max(0, max_queue))
+        self._inflight: Dict[str, Future] = {}
+        # Re-entrant: a future that is already done runs its callback inside submit
+        self._lock = threading.RLock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def cache_path(self, sha256: str) -> str:
+        return os.path.join(self.cache_dir, f"{sha256}.jpg")
+
+    def cached(self, sha256: str) -> Optional[str]:
+        path = self.cache_path(sha256)
+        return path if os.path.exists(path) else None
+
+    def submit(self, sha256: str, source_path: str, mime_type: str,
+               on_done: Callable[[Optional[str]], None]) -> bool:
+        """Render (or reuse) the preview of a spooled file, returns False if the queue is full
+
+        The pool takes ownership of ``source_path`` and deletes it once done.
+        ``on_done`` receives the cached preview path, or None if the file
+        cannot be previewed.
+        """
+        cached = self.cached(sha256)
+        if cached:
+            os.unlink(source_path)
+            self._callbacks.submit(on_done, cached)
+            return True
+
+        with self._lock:
+            future = self._inflight.get(sha256)
+            if future is None:
+                if not self._slots.acquire(blocking=False):
+                    os.unlink(source_path)
+                    return False
+                future = self._processes.submit(render_preview, source_path, mime_type,
+                                                self.cache_path(sha256), self.max_size)
+                self._inflight[sha256] = future
+                future.add_done_callback(lambda f: self._finished(sha256, source_path))
+            else:
+                # Same content is already being rendered - this copy is not needed
+                os.unlink(source_path)
+
+        future.add_done_callback(lambda f: self._callbacks.submit(self._deliver, f, on_done))
+        return True
+
+    def _finished(self, sha256: str, source_path: str) -> None:
+        with self._lock:
+            self._inflight.pop(sha256, None)
+        self._slots.release()
+        try:
+            os.unlink(source_path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _deliver(future: Future, on_done: Callable[[Optional[str]], None]) -> None:
+        try:
+            path = future.result()
+        except Exception as e:
+            logger.error(f"❌ Preview rendering failed: {e}")
+            path = None
+        try:
+            on_done(path)
+        except Exception as e:
+            logger.error(f"❌ Preview callback failed: {e}")
+
+    def shutdown(self) -> None:
+        self._processes.shutdown(wait=True)
+        self._callbacks.shutdown(wait=True)
@@ -0,0 +1,221 @@
+"""
+Google credentials, lazily built API clients from the bundled (static) discovery documents, pooled transports
+"""
+
+import base64
+import binascii
+import json
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Any, Callable, Iterator, Optional
+
+import google_auth_httplib2
+import httplib2
+from google.auth.transport.requests import Request
+from google.oauth2 import service_account
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_SCOPES = [
+    'https://www.googleapis.com/auth/drive',
+    'https://www.googleapis.com/auth/calendar'
+]
+
+SERVICE_VERSIONS = {'drive': 'v3', 'calendar': 'v3'}
+
+
+def decode_service_account_info(value: str) -> Dict[str, Any]:
+    """Service account JSON from its Base64 form (or plain JSON for backwards compatibility)"""
+    value = value.strip()
+    if value.startswith('{'):
+        return json.loads(value)
+    try:
+        return json.loads(base64.b64decode(value).decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid service account JSON: {e}")
+
+
+class GoogleClients:
+    """One credential for all Google APIs, one client per API, a bounded pool of transports
+
+    httplib2 transports are not thread-safe, but building a request is: the
+    client for each API is shared, and every request is executed on an
+    authorized transport checked out of the pool (``transport()``) and put
+    back afterwards, keeping its connection alive for the next request - on
+    whatever thread that runs. At most ``pool_size`` transports exist, a
+    checkout beyond that waits for a return. All of them share the
+    credential, so a token refreshed by one is used by all. Clients are
+    built on first use from the discovery documents bundled with
+    google-api-python-client.
+    """
+
+    def __init__(self, info_loader: Callable[[], Dict[str, Any]], scopes=None, timeout: float = 30,
+                 pool_size: int = 8):
+        self.info_loader = info_loader
+        self.scopes = scopes or GOOGLE_SCOPES
+        self.timeout = timeout
+        self.pool_size = max(1, pool_size)
+        self._credentials = None
+        self._services: Dict[str, Any] = {}
+        self._idle: "queue.LifoQueue[google_auth_httplib2.AuthorizedHttp]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        # Re-entrant: building a client loads the credentials
+        self._lock = threading.RLock()
+        self._counts = {'transports': 0, 'checkouts': 0, 'in_use': 0}
+
+    @property
+    def credentials(self) -> service_account.Credentials:
+        with self._lock:
+            if self._credentials is None:
+                self._credentials = service_account.Credentials.from_service_account_info(
+                    self.info_loader(), scopes=self.scopes
+                )
+            return self._credentials
+
+    def authorized_http(self) -> google_auth_httplib2.AuthorizedHttp:
+        """A new transport carrying the shared credential"""
+        return google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=self.timeout))
+
+    @contextmanager
+    def transport(self) -> Iterator[google_auth_httplib2.AuthorizedHttp]:
+        """Check out a transport for one request (or batch), returned to the pool afterwards"""
+        self._slots.acquire()
+        try:
+            try:
+                http = self._idle.get_nowait()
+            except queue.Empty:
+                http = self.authorized_http()
+                self._count('transports')
+            self._count('checkouts')
+            self._count('in_use')
+            try:
+                yield http
+            finally:
+                self._count('in_use', -1)
+                self._idle.put(http)
+        finally:
+            self._slots.release()
+
+    def service(self, name: str):
+        """The shared client for `name` ('drive' or 'calendar') - execute its requests with ``http=`` a pooled transport"""
+        with self._lock:
+            if name not in self._services:
+                document = json.loads(get_static_doc(name, SERVICE_VERSIONS[name]))
+                # Its own transport is only a fallback for requests executed without one
+                self._services[name] = build_from_document(document, http=self.authorized_http())
+                logger.debug(f"🔌 Google {name} client built")
+            return self._services[name]
+
+    def built(self, name: str) -> bool:
+        return name in self._services
+
+    def stats(self) -> Dict[str, Any]:
+        """Clients built and transport pool usage"""
+        with self._lock:
+            return {'clients': sorted(self._services), 'pool_size': self.pool_size, **self._counts}
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counts[name] += amount
+
+
+class LazyService:
+    """Stands in for a googleapiclient resource
+
+    Every attribute access resolves to the shared client, which is built on
+    first use - so the module-level service can be used before the
+    credentials are loaded.
+    """
+
+    def __init__(self, clients: GoogleClients, name: str):
+        self._clients = clients
+        self._name = name
+
+    def __getattr__(self, attribute: str):
+        return getattr(self._clients.service(self._name), attribute)
+
+    def __repr__(self) -> str:
+        state = 'built' if self._clients.built(self._name) else 'not built'
+        return f"<LazyService {self._name} ({state})>"
+
+
+def utcnow() -> datetime:
+    """Naive UTC, the way google-auth stores `expiry`"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class TokenRefresher:
+    """Renews the shared access token in the background, shortly before it expires
+
+    google-auth only refreshes when a request finds the token (nearly)
+    expired, so that request pays for the OAuth round trip. With a
+    ``margin`` larger than the library's own refresh threshold no request
+    ever sees a stale token. Failures are retried every ``retry_seconds``.
+    """
+
+    def __init__(self, credentials, margin_seconds: float = 300, retry_seconds: float = 30):
+        self.credentials = credentials
+        self.margin_seconds = margin_seconds
+        self.retry_seconds = retry_seconds
+        self.refreshed_at: Optional[float] = None
+        self.last_latency: Optional[float] = None
+        self.refreshes = 0
+        self.failures = 0
+        self._request = Request()
+        self._stop = threading.Event()
+
+    def refresh(self) -> None:
+        start = time.monotonic()
+        self.credentials.refresh(self._request)
+        self.last_latency = time.monotonic() - start
+        self.refreshed_at = time.time()
+        self.refreshes += 1
+        logger.info(f"🔑 Google access token refreshed in {self.last_latency * 1000:.0f} ms")
+
+    def seconds_until_refresh(self) -> float:
+        expiry = self.credentials.expiry
+        if not expiry:
+            return 0
+        return (expiry - utcnow()).total_seconds() - self.margin_seconds
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            delay = self.seconds_until_refresh()
+            if delay > 0:
+                self._stop.wait(delay)
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"❌ Google token refresh failed: {e}")
+                self._stop.wait(self.retry_seconds)
+
+    def start(self) -> None:
+        """Refresh once right away (so startup pays, not a user), then keep the token fresh"""
+        try:
+            self.refresh()
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"❌ Initial Google token refresh failed: {e}")
+        threading.Thread(target=self._run, name='token-refresher', daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Token age and refresh latency, for /health"""
+        expiry = self.credentials.expiry
+        return {
+            'token_age_seconds': round(time.time() - self.refreshed_at) if self.refreshed_at else None,
+            'expires_in_seconds': round((expiry - utcnow()).total_seconds()) if expiry else None,
+            'last_refresh_latency_ms': round(self.last_latency * 1000) if self.last_latency is not None else None,
+            'refreshes': self.refreshes,
+            'failures': self.failures
+        }
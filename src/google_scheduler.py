@@ -0,0 +1,175 @@
+"""
+Shared scheduler for Google API calls: per-API token buckets, backoff with jitter, coalescing
+
+Drive traffic reaches Google three ways, all metered by the same bucket:
+googleapiclient requests (``execute``), the Drive mirror's listings (passed
+``execute`` as their runner) and the resumable uploads of the file ingestor,
+which use plain HTTP and take a token per request through ``acquire``.
+"""
+
+import json
+import logging
+import random
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Any, Callable, ContextManager, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# 403s that are rate limits rather than permission problems
+RATE_LIMIT_REASONS = {'userRateLimitExceeded', 'rateLimitExceeded', 'backendError'}
+# Errors that mean the request was turned away unprocessed - safe to resend even for a create
+REJECTED_STATUS = {429}
+REJECTED_REASONS = {'userRateLimitExceeded', 'rateLimitExceeded'}
+
+
+def error_reason(error: HttpError) -> Optional[str]:
+    """First `reason` of a Google API error response"""
+    try:
+        content = error.content.decode('utf-8') if isinstance(error.content, bytes) else error.content
+        errors = json.loads(content).get('error', {}).get('errors', [])
+        return errors[0].get('reason') if errors else None
+    except (ValueError, AttributeError, TypeError):
+        return None
+
+
+def is_retryable(error: Exception, idempotent: bool = True) -> bool:
+    """Whether resending is safe - for a non-idempotent request (a create) only if it was rejected unprocessed
+
+    A 5xx or a timeout may come after the request took effect, resending a
+    create would then make a duplicate.
+    """
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if not idempotent:
+            return status in REJECTED_STATUS or (status == 403 and error_reason(error) in REJECTED_REASONS)
+        return status in RETRYABLE_STATUS or (status == 403 and error_reason(error) in RATE_LIMIT_REASONS)
+    return idempotent and isinstance(error, (socket.timeout, ConnectionError, TimeoutError))
+
+
+class TokenBucket:
+    """`rate` requests per second on average, bursts of up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available; returns the seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def available(self) -> float:
+        with self._lock:
+            return min(self.capacity, self.tokens + (time.monotonic() - self.updated) * self.rate)
+
+
+class GoogleApiScheduler:
+    """Runs Google API requests through a token bucket per API
+
+    Retryable failures (429, 5xx, rate-limit 403s, network timeouts) are
+    retried with exponential backoff and full jitter - requests passed with
+    ``retry=False`` (creates) only after a 429 or rate-limit 403. Calls sharing a
+    ``coalesce_key`` while one is in flight wait for that call's result
+    instead of issuing their own request.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]], max_retries: int = 5,
+                 base_delay: float = 0.5, max_delay: float = 32.0,
+                 transport: Optional[Callable[[], ContextManager[Any]]] = None):
+        self.buckets = {api: TokenBucket(rate, burst) for api, (rate, burst) in limits.items()}
+        # Checks out an HTTP transport per attempt, see GoogleClients.transport
+        self.transport = transport
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {api: {'requests': 0, 'retries': 0, 'failures': 0, 'coalesced': 0, 'throttled_seconds': 0.0}
+                       for api in limits}
+
+    def _count(self, api: str, key: str, amount=1) -> None:
+        with self._lock:
+            self._stats[api][key] += amount
+
+    def acquire(self, api: str) -> None:
+        """Take a token for a request sent outside ``execute`` (e.g. a plain HTTP upload)"""
+        self._count(api, 'throttled_seconds', self.buckets[api].acquire())
+        self._count(api, 'requests')
+
+    def execute(self, api: str, request, coalesce_key: Optional[str] = None, http=None, retry: bool = True) -> Any:
+        """Execute a googleapiclient request (or any object with ``execute``) under the API's quota
+
+        Pass ``retry=False`` for requests that are not idempotent, like
+        ``files().create`` or ``events().insert``.
+        """
+        if not coalesce_key:
+            return self._run(api, request, http, retry)
+
+        with self._lock:
+            future = self._inflight.get(coalesce_key)
+            owner = future is None
+            if owner:
+                future = self._inflight[coalesce_key] = Future()
+            else:
+                self._stats[api]['coalesced'] += 1
+
+        if not owner:
+            return future.result()
+        try:
+            result = self._run(api, request, http, retry)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(coalesce_key, None)
+
+    def _run(self, api: str, request, http, retry: bool) -> Any:
+        for attempt in range(self.max_retries + 1):
+            self.acquire(api)
+            try:
+                if http is None and self.transport is not None:
+                    with self.transport() as pooled:
+                        return request.execute(http=pooled)
+                return request.execute(http=http) if http is not None else request.execute()
+            except Exception as e:
+                if not is_retryable(e, idempotent=retry) or attempt == self.max_retries:
+                    self._count(api, 'failures')
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                self._count(api, 'retries')
+                logger.warning(f"⚠️ {api} request failed ({e}), retry {attempt + 1} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Quota usage per API, for /health"""
+        with self._lock:
+            stats = {api: dict(values) for api, values in self._stats.items()}
+        for api, values in stats.items():
+            bucket = self.buckets[api]
+            values['throttled_seconds'] = round(values['throttled_seconds'], 2)
+            values['rate_per_second'] = bucket.rate
+            values['tokens_available'] = round(bucket.available(), 1)
+        return stats
+
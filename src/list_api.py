@@ -0,0 +1,156 @@
+"""
+Paginated task and project lists for the portal: keyset cursors, filters, ETags
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+from flask import Blueprint, Response, jsonify, request
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+TASK_FIELDS = ('id,created_at,content,is_done,priority,priority_rank,due_date,project_id,'
+               'project_name,project_number,behörde,gemeinde,tags,created_by')
+PROJECT_FIELDS = 'id,created_at,name,project_number,drive_folder_id,drive_folder_link,status'
+
+PRIORITY_RANKS = {'hoch': 1, 'mittel': 2, 'niedrig': 3}
+
+# (column, descending) - open tasks first, then by priority, newest first, id as tie-breaker
+TASK_ORDER = [('is_done', False), ('priority_rank', False), ('created_at', True), ('id', True)]
+PROJECT_ORDER = [('created_at', True), ('id', True)]
+
+
+class ListApiError(Exception):
+    pass
+
+
+def encode_cursor(values: List[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, length: int) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise ListApiError("invalid cursor")
+    if not isinstance(values, list) or len(values) != length:
+        raise ListApiError("invalid cursor")
+    return values
+
+
+def filter_value(value: Any) -> str:
+    """A value inside a PostgREST logic tree - quoted, timestamps contain ':' and '+'"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def keyset_filter(order: List[Tuple[str, bool]], values: List[Any]) -> str:
+    """PostgREST `or` filter for "rows after `values`" in `order` (mixed directions allowed)
+
+    (a, b, c) after (x, y, z) is a > x, or a = x and b > y, or a = x and
+    b = y and c > z - with < for descending columns.
+    """
+    branches = []
+    for position, (column, descending) in enumerate(order):
+        equal = [f"{c}.eq.{filter_value(v)}" for (c, _), v in zip(order[:position], values)]
+        after = f"{column}.{'lt' if descending else 'gt'}.{filter_value(values[position])}"
+        branches.append(f"and({','.join(equal + [after])})" if equal else after)
+    return ','.join(branches)
+
+
+def page_size() -> int:
+    try:
+        size = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ListApiError("limit must be a number")
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def fetch_page(query, order: List[Tuple[str, bool]], limit: int) -> Dict[str, Any]:
+    """Apply cursor, order and limit to a filtered query, returns {'items', 'next_cursor'}"""
+    cursor = request.args.get('cursor')
+    if cursor:
+        query = query.or_(keyset_filter(order, decode_cursor(cursor, len(order))))
+    for column, descending in order:
+        query = query.order(column, desc=descending)
+    # One extra row tells whether there is a next page
+    rows = query.limit(limit + 1).execute().data or []
+    items = rows[:limit]
+    next_cursor = encode_cursor([items[-1][column] for column, _ in order]) if len(rows) > limit else None
+    return {'items': items, 'next_cursor': next_cursor}
+
+
+def etag_response(payload: Dict[str, Any]) -> Response:
+    """JSON response with an ETag of its body - 304 without a body if the client has it already"""
+    body = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    etag = '"' + hashlib.sha256(body.encode()).hexdigest()[:32] + '"'
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.headers['ETag'] = etag
+    # Always revalidate - a 304 is cheap, a stale task list is not
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def create_list_api(get_client: Callable[[], Any], token: Optional[str] = None) -> Blueprint:
+    """Blueprint with /api/tasks and /api/projects on top of the Supabase client from `get_client`
+
+    Without a `token` every request is refused - the lists are never served unauthenticated.
+    """
+    api = Blueprint('list_api', __name__, url_prefix='/api')
+
+    @api.before_request
+    def check_access():
+        if not token:
+            return jsonify({"ok": False, "error": "list API disabled - LIST_API_TOKEN not set"}), 503
+        # Constant time - the comparison must not reveal how much of a guess was right
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f"Bearer {token}".encode()):
+            return jsonify({"ok": False, "error": "unauthorized"}), 401
+        if not get_client():
+            return jsonify({"ok": False, "error": "database not configured"}), 503
+
+    @api.errorhandler(ListApiError)
+    def bad_request(error):
+        return jsonify({"ok": False, "error": str(error)}), 400
+
+    @api.route('/tasks', methods=['GET'])
+    def list_tasks():
+        """?status=open|done|all &priority=hoch|mittel|niedrig &project_id= &cursor= &limit="""
+        query = get_client().table('tasks_with_projects').select(TASK_FIELDS)
+        order = list(TASK_ORDER)
+
+        status = request.args.get('status', 'open')
+        if status not in ('open', 'done', 'all'):
+            raise ListApiError("status must be open, done or all")
+        if status != 'all':
+            query = query.eq('is_done', status == 'done')
+            # A fixed column needs no keyset condition
+            order.remove(('is_done', False))
+        priority = request.args.get('priority')
+        if priority:
+            if priority not in PRIORITY_RANKS:
+                raise ListApiError("priority must be hoch, mittel or niedrig")
+            query = query.eq('priority_rank', PRIORITY_RANKS[priority])
+            order.remove(('priority_rank', False))
+        if request.args.get('project_id'):
+            query = query.eq('project_id', request.args['project_id'])
+
+        return etag_response(fetch_page(query, order, page_size()))
+
+    @api.route('/projects', methods=['GET'])
+    def list_projects():
+        """?status= &cursor= &limit= - newest first"""
+        query = get_client().table('projects').select(PROJECT_FIELDS)
+        if request.args.get('status'):
+            query = query.eq('status', request.args['status'])
+        return etag_response(fetch_page(query, PROJECT_ORDER, page_size()))
+
+    return api
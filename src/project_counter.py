@@ -0,0 +1,326 @@
+"""
+Multi-process safe project counter (YY-NNN)
+"""
+
+import errno
+import fcntl
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def current_year() -> int:
+    """Last two digits of the current year"""
+    return int(datetime.now().strftime("%y"))
+
+
+def format_project_number(year: int, counter: int) -> str:
+    return f"{year:02d}-{counter:03d}"
+
+
+# YY-NNN, from 1000 projects a year YY-NNNN - longer suffixes are the HHMMSS numbers
+# handed out when the counter failed and must not move the counter
+PROJECT_NUMBER_PATTERN = re.compile(r'^(\d{2})-(\d{3,4})(?!\d)')
+
+
+def parse_project_number(text: str) -> Optional[Tuple[int, int]]:
+    """Split '25-003-EFH Müller' into (25, 3), None if there is no YY-NNN prefix"""
+    match = PROJECT_NUMBER_PATTERN.match(text.strip()) if text else None
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def project_number_key(project_number: str) -> Tuple[int, int]:
+    """Sort key for project numbers - as text '25-1000' would sort before '25-999'"""
+    return parse_project_number(project_number) or (0, 0)
+
+
+def write_json_atomic(path: str, data: Any) -> None:
+    """Replace a JSON file via temp file + fsync + rename, so readers never see a partial file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+    # Persist the rename itself
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class ProjectCounter:
+    """Project number allocator backed by a JSON file
+
+    Every read-modify-write runs under an exclusive flock on a sidecar
+    ``.lock`` file, so gunicorn workers and other processes never hand out
+    the same number. The JSON file is replaced atomically (temp file, fsync,
+    rename), so a crash leaves either the old or the new counter on disk.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Hold the cross-process counter lock"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def read(self) -> Dict[str, Any]:
+        """Load the counter data, an empty or missing file starts a fresh counter"""
+        try:
+            with open(self.path, 'r') as f:
+                content = f.read()
+        except FileNotFoundError:
+            content = ""
+
+        if not content.strip():
+            year = current_year()
+            return {"year": year, "counter": 0, "last_number": format_project_number(year, 0)}
+        return json.loads(content)
+
+    def write(self, data: Dict[str, Any]) -> None:
+        """Atomically replace the counter file"""
+        try:
+            write_json_atomic(self.path, data)
+        except OSError as e:
+            # A single bind-mounted file cannot be renamed over (EBUSY)
+            if e.errno != errno.EBUSY:
+                raise
+            logger.warning(f"⚠️ Counter file is a mount point, writing in place: {self.path}")
+            self._write_in_place(data)
+
+    def _write_in_place(self, data: Dict[str, Any]) -> None:
+        with open(self.path, 'r+') as f:
+            f.seek(0)
+            json.dump(data, f, indent=2)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+
+    def update(self, change: Callable[[Dict[str, Any]], Any]) -> Any:
+        """Run change(data) under the lock, persist data and return change's result"""
+        with self.locked():
+            data = self.read()
+            result = change(data)
+            self.write(data)
+            return result
+
+    def ensure_at_least(self, year: int, high_water: int) -> bool:
+        """Raise the counter to an externally observed high-water mark, returns True if repaired"""
+
+        def repair(data: Dict[str, Any]) -> bool:
+            stored_year = data.get("year")
+            if stored_year == year and data.get("counter", 0) >= high_water:
+                return False
+            if stored_year != year and (high_water == 0 or (stored_year or 0) > year):
+                # Nothing seen this year yet, or never move back into an older year
+                return False
+            data["year"] = year
+            data["counter"] = high_water
+            data["last_number"] = format_project_number(year, data["counter"])
+            # Free numbers below the mark may already be taken
+            data["free"] = [n for n in data.get("free", [])
+                            if (parse_project_number(n) or (year, 0))[1] > high_water]
+            return True
+
+        return self.update(repair)
+
+    def next_number(self, year: Optional[int] = None) -> str:
+        """Allocate the next project number, resetting the counter on a new year"""
+        year = current_year() if year is None else year
+
+        def allocate(data: Dict[str, Any]) -> str:
+            if data.get("year") != year:
+                data["year"] = year
+                data["counter"] = 1
+            else:
+                data["counter"] += 1
+            project_number = format_project_number(year, data["counter"])
+            data["last_number"] = project_number
+            return project_number
+
+        return self.update(allocate)
+
+
+def process_start_time(pid: int) -> Optional[str]:
+    """Start time of a running process (from /proc), None if it is gone"""
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            stat = f.read()
+        # Field 22 (starttime), counted after the parenthesised command name
+        return stat.rsplit(')', 1)[1].split()[19]
+    except FileNotFoundError:
+        return None
+    except (OSError, IndexError):
+        # No /proc - fall back to a plain existence check
+        try:
+            os.kill(pid, 0)
+            return "unknown"
+        except ProcessLookupError:
+            return None
+        except PermissionError:
+            return "unknown"
+
+
+class ProjectNumberLeaser:
+    """Hands out project numbers from a block leased to this worker
+
+    Each worker takes ``block_size`` numbers from the shared counter in one
+    locked update and serves them from memory. Issued numbers are appended to
+    a per-worker journal, so when a worker dies its lease is recovered by the
+    next worker that takes the lock: unissued numbers go to a free list that
+    is handed out before new numbers. On shutdown the unused rest of the
+    block is returned the same way, so gaps stay below one block per worker.
+    """
+
+    def __init__(self, counter: ProjectCounter, block_size: int = 5):
+        self.counter = counter
+        self.block_size = max(1, block_size)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._year = None
+        self._numbers = []
+
+    @property
+    def owner(self) -> str:
+        return str(os.getpid())
+
+    def _journal_path(self, owner: str) -> str:
+        return f"{self.counter.path}.{owner}.issued"
+
+    def _read_journal(self, owner: str) -> List[str]:
+        try:
+            with open(self._journal_path(owner), 'r') as f:
+                return f.read().split()
+        except FileNotFoundError:
+            return []
+
+    def _remove_journal(self, owner: str) -> None:
+        try:
+            os.unlink(self._journal_path(owner))
+        except FileNotFoundError:
+            pass
+
+    def _journal_issued(self, project_number: str) -> None:
+        fd = os.open(self._journal_path(self.owner), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, f"{project_number}\n".encode())
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _recover_dead_leases(self, data: Dict[str, Any]) -> None:
+        """Return the unissued numbers of crashed workers to the free list"""
+        leases = data.setdefault("leases", {})
+        for owner, lease in list(leases.items()):
+            if owner == self.owner or process_start_time(int(owner)) == lease.get("started"):
+                continue
+            issued = set(self._read_journal(owner))
+            unused = [number for number in lease["numbers"] if number not in issued]
+            self._free_numbers(data, lease["year"], unused)
+            del leases[owner]
+            self._remove_journal(owner)
+            logger.warning(f"⚠️ Recovered lease of dead worker {owner}: {len(unused)} numbers returned")
+
+    @staticmethod
+    def _free_numbers(data: Dict[str, Any], year: int, numbers: List[str]) -> None:
+        # Numbers from an old year are simply dropped - the counter restarted
+        if not numbers or data.get("year") != year:
+            return
+        free = data.setdefault("free", [])
+        free.extend(number for number in numbers if number not in free)
+        free.sort(key=project_number_key)
+
+    def _acquire(self, year: int) -> None:
+        """Lease a fresh block, reusing free numbers first"""
+        started = process_start_time(os.getpid())
+
+        def lease_block(data: Dict[str, Any]) -> List[str]:
+            self._recover_dead_leases(data)
+            leases = data.setdefault("leases", {})
+            previous = leases.pop(self.owner, None)
+            if previous:
+                # Unissued rest of our old block (e.g. after a year change)
+                issued = set(self._read_journal(self.owner))
+                self._free_numbers(data, previous["year"],
+                                   [n for n in previous["numbers"] if n not in issued])
+
+            if data.get("year") != year:
+                data["year"] = year
+                data["counter"] = 0
+                data["free"] = []
+
+            free = data.setdefault("free", [])
+            numbers = free[:self.block_size]
+            del free[:self.block_size]
+            while len(numbers) < self.block_size:
+                data["counter"] += 1
+                numbers.append(format_project_number(year, data["counter"]))
+            data["last_number"] = format_project_number(year, data["counter"])
+
+            leases[self.owner] = {"year": year, "numbers": numbers, "started": started}
+            self._remove_journal(self.owner)
+            return numbers
+
+        numbers = self.counter.update(lease_block)
+        self._pid = os.getpid()
+        self._year = year
+        self._numbers = sorted(numbers, key=project_number_key)
+        logger.info(f"📊 Leased project numbers {self._numbers[0]} … {self._numbers[-1]} (worker {self.owner})")
+
+    def next_number(self, year: Optional[int] = None) -> str:
+        """Allocate the next project number from the leased block"""
+        year = current_year() if year is None else year
+        with self._lock:
+            # A forked worker does not own its parent's lease
+            if self._pid != os.getpid() or self._year != year or not self._numbers:
+                self._acquire(year)
+            project_number = self._numbers.pop(0)
+            self._journal_issued(project_number)
+            return project_number
+
+    def release(self) -> None:
+        """Return the unissued rest of the block, e.g. on worker shutdown"""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+
+            def return_block(data: Dict[str, Any]) -> None:
+                lease = data.setdefault("leases", {}).pop(self.owner, None)
+                if lease:
+                    issued = set(self._read_journal(self.owner))
+                    self._free_numbers(data, lease["year"],
+                                       [n for n in lease["numbers"] if n not in issued])
+
+            self.counter.update(return_block)
+            self._remove_journal(self.owner)
+            self._numbers = []
+            self._pid = None
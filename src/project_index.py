@@ -0,0 +1,197 @@
+"""
+Resident index of Supabase projects: exact project numbers, name tokens, trigram fuzzy matching
+"""
+
+import re
+import threading
+from collections import Counter
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+
+UMLAUTS = str.maketrans({'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'ß': 'ss'})
+
+
+def normalize_text(text: str) -> str:
+    """'EFH Müller' and 'efh mueller' normalize to the same text"""
+    return (text or '').lower().translate(UMLAUTS)
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r'[0-9a-z]+', normalize_text(text))
+
+
+# "25-3", "25/003", "25.3" -> "25-003"
+SHORT_NUMBER_PATTERN = re.compile(r'^\s*(\d{2})\s*[-/.]\s*(\d{1,6})\s*$')
+NAME_NUMBER_PREFIX = re.compile(r'^\s*\d{2}-\d{3,}\s*-?\s*')
+
+MIN_SCORE = 0.3
+
+
+def normalize_project_number(text: str) -> Optional[str]:
+    match = SHORT_NUMBER_PATTERN.match(text or '')
+    return f"{match.group(1)}-{int(match.group(2)):03d}" if match else None
+
+
+def trigrams(text: str) -> Set[str]:
+    """pg_trgm style trigrams: every word padded with two spaces in front and one behind"""
+    result = set()
+    for token in tokenize(text):
+        padded = f"  {token} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def name_trigrams(project: Dict[str, Any]) -> Set[str]:
+    # The YY-NNN prefix is matched exactly, in the name it would only add noise
+    return trigrams(NAME_NUMBER_PREFIX.sub('', project.get('name') or ''))
+
+
+def similarity(query: Set[str], target: Set[str]) -> float:
+    """How much of the query the target covers, with overall similarity as tie-breaker"""
+    if not query or not target:
+        return 0.0
+    shared = len(query & target)
+    return 0.8 * shared / len(query) + 0.2 * shared / len(query | target)
+
+
+def score_project(identifier: str, project: Dict[str, Any]) -> float:
+    """1.0 for the exact project number, else the trigram similarity of the name"""
+    number = (project.get('project_number') or '').lower()
+    query = identifier.strip().lower()
+    if number and number in (query, normalize_project_number(query)):
+        return 1.0
+    return similarity(trigrams(identifier), name_trigrams(project))
+
+
+def clear_winner(ranked: List[Tuple[Dict[str, Any], float]], min_score: float = 0.6,
+                 margin: float = 0.15) -> Optional[Dict[str, Any]]:
+    """The top candidate if it is good enough and clearly ahead of the next one"""
+    if not ranked or ranked[0][1] < min_score:
+        return None
+    if len(ranked) > 1 and ranked[0][1] - ranked[1][1] < margin:
+        return None
+    return ranked[0][0]
+
+
+class ProjectIndex:
+    """Projects by ID, by project number and by the tokens of their name
+
+    Number lookups are a dict access, name lookups intersect the posting
+    sets of the query tokens. Fuzzy lookups (``rank``) only score projects
+    that share at least one trigram with the query, found through trigram
+    posting sets, so they stay fast with thousands of projects.
+    """
+
+    def __init__(self):
+        self._projects: Dict[Any, Dict[str, Any]] = {}
+        self._by_number: Dict[str, Any] = {}
+        self._tokens: Dict[str, Set[Any]] = {}
+        self._trigrams: Dict[str, Set[Any]] = {}
+        self._project_trigrams: Dict[Any, Set[str]] = {}
+        self._lock = threading.RLock()
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._projects)
+
+    def warm(self, projects: Iterable[Dict[str, Any]]) -> None:
+        """Replace the whole index, e.g. from a full table load at startup"""
+        with self._lock:
+            self._projects.clear()
+            self._by_number.clear()
+            self._tokens.clear()
+            self._trigrams.clear()
+            self._project_trigrams.clear()
+            for project in projects:
+                self.upsert(project)
+            self.ready = True
+
+    def upsert(self, project: Dict[str, Any]) -> None:
+        with self._lock:
+            self.remove(project['id'])
+            project = dict(project)
+            self._projects[project['id']] = project
+            if project.get('project_number'):
+                self._by_number[project['project_number'].lower()] = project['id']
+            for token in set(tokenize(project.get('name'))):
+                self._tokens.setdefault(token, set()).add(project['id'])
+            self._project_trigrams[project['id']] = name_trigrams(project)
+            for trigram in self._project_trigrams[project['id']]:
+                self._trigrams.setdefault(trigram, set()).add(project['id'])
+
+    def remove(self, project_id: Any) -> None:
+        with self._lock:
+            project = self._projects.pop(project_id, None)
+            if not project:
+                return
+            number = (project.get('project_number') or '').lower()
+            if self._by_number.get(number) == project_id:
+                del self._by_number[number]
+            for token in set(tokenize(project.get('name'))):
+                postings = self._tokens.get(token)
+                if postings:
+                    postings.discard(project_id)
+                    if not postings:
+                        del self._tokens[token]
+            for trigram in self._project_trigrams.pop(project_id, set()):
+                postings = self._trigrams.get(trigram)
+                if postings:
+                    postings.discard(project_id)
+                    if not postings:
+                        del self._trigrams[trigram]
+
+    def get(self, project_id: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._projects.get(project_id)
+
+    def by_number(self, project_number: str) -> Optional[Dict[str, Any]]:
+        """Exact number, also in short form ("25-3")"""
+        number = project_number.strip().lower()
+        with self._lock:
+            project_id = self._by_number.get(number)
+            if project_id is None:
+                project_id = self._by_number.get(normalize_project_number(number))
+            return self._projects.get(project_id) if project_id is not None else None
+
+    def recent(self, project_ids: Iterable[Any], limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            projects = [self._projects[project_id] for project_id in project_ids if project_id in self._projects]
+        return sorted(projects, key=lambda p: p.get('created_at') or '', reverse=True)[:limit]
+
+    def search(self, identifier: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Exact project number first, else projects whose name has all query tokens"""
+        project = self.by_number(identifier)
+        if project:
+            return [project]
+
+        tokens = tokenize(identifier)
+        if not tokens:
+            return []
+        with self._lock:
+            postings = [self._tokens.get(token, set()) for token in tokens]
+            matches = set.intersection(*postings) if all(postings) else set()
+        return self.recent(matches, limit)
+
+    def rank(self, identifier: str, limit: int = 5,
+             min_score: float = MIN_SCORE) -> List[Tuple[Dict[str, Any], float]]:
+        """Candidates with scores, best first (more recent first on equal scores)"""
+        project = self.by_number(identifier)
+        if project:
+            return [(project, 1.0)]
+
+        query = trigrams(identifier)
+        if not query:
+            return []
+        with self._lock:
+            shared = Counter()
+            for trigram in query:
+                shared.update(self._trigrams.get(trigram, ()))
+            scored = []
+            for project_id, count in shared.items():
+                # Cheap upper bound first - most candidates share only a trigram or two
+                if 0.8 * count / len(query) + 0.2 < min_score:
+                    continue
+                score = similarity(query, self._project_trigrams[project_id])
+                if score >= min_score:
+                    scored.append((self._projects[project_id], score))
+        scored.sort(key=lambda item: (round(item[1], 3), item[0].get('created_at') or ''), reverse=True)
+        return scored[:limit]
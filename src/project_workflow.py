@@ -0,0 +1,166 @@
+"""
+Checkpointed, resumable project creation workflow
+"""
+
+import fcntl
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterator, List, Optional
+
+from project_counter import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# Order matters - every step only relies on the results of the steps before it
+WORKFLOW_STEPS = ('allocate_number', 'create_root', 'create_subfolders', 'save_db', 'notify')
+
+
+def normalize_base_name(base_name: str) -> str:
+    """'EFH  Müller!' and 'efh müller' describe the same project request"""
+    return re.sub(r'[^0-9a-zäöüß]+', ' ', (base_name or '').lower()).strip()
+
+
+class ProjectWorkflowStore:
+    """One JSON checkpoint file per project creation, kept in a directory"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, workflow_id: str) -> str:
+        return os.path.join(self.directory, f"{workflow_id}.json")
+
+    def _all(self) -> List[Dict[str, Any]]:
+        if not os.path.isdir(self.directory):
+            return []
+        workflows = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), 'r') as f:
+                    workflows.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.error(f"❌ Unreadable workflow checkpoint {name}: {e}")
+        return workflows
+
+    def create(self, chat_id: int, message_id: Optional[int], base_name: str) -> Dict[str, Any]:
+        """Start a new workflow and persist it before any step runs"""
+        now = time.time()
+        workflow = {
+            'id': uuid.uuid4().hex,
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'base_name': base_name,
+            'key': normalize_base_name(base_name),
+            'status': 'open',
+            'completed_steps': [],
+            'failed_step': None,
+            'error': None,
+            'results': {},
+            'created_at': now,
+            'updated_at': now
+        }
+        self.save(workflow)
+        return workflow
+
+    def load(self, workflow_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(workflow_id), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, workflow: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        workflow['updated_at'] = time.time()
+        write_json_atomic(self._path(workflow['id']), workflow)
+
+    def find(self, chat_id: int, message_id: Optional[int] = None,
+             base_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Same Telegram message (any status) or an open workflow for the same project name"""
+        key = normalize_base_name(base_name) if base_name is not None else None
+        candidates = []
+        for workflow in self._all():
+            if workflow.get('chat_id') != chat_id:
+                continue
+            if message_id is not None and workflow.get('message_id') == message_id:
+                return workflow
+            if key is not None and workflow.get('status') == 'open' and workflow.get('key') == key:
+                candidates.append(workflow)
+        return max(candidates, key=lambda w: w['updated_at']) if candidates else None
+
+    def interrupted_workflows(self, max_age_seconds: float) -> List[Dict[str, Any]]:
+        """Recent workflows a crash or restart stopped mid-step
+
+        Workflows that ended at a failed step stay open for a retry by the
+        user, but are not replayed - the user was already told.
+        """
+        cutoff = time.time() - max_age_seconds
+        return [w for w in self._all() if w.get('status') == 'open' and not w.get('failed_step')
+                and w.get('updated_at', 0) >= cutoff]
+
+    def cleanup(self, retention_seconds: float) -> int:
+        """Delete checkpoints that have not changed within the retention period"""
+        cutoff = time.time() - retention_seconds
+        removed = 0
+        for workflow in self._all():
+            if workflow.get('updated_at', 0) < cutoff:
+                for path in (self._path(workflow['id']), f"{self._path(workflow['id'])}.lock"):
+                    if os.path.exists(path):
+                        os.unlink(path)
+                removed += 1
+        return removed
+
+    @contextmanager
+    def running(self, workflow_id: str) -> Iterator[bool]:
+        """Non-blocking cross-process lock, yields False if another worker runs the workflow"""
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(f"{self._path(workflow_id)}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+def run_workflow(store: ProjectWorkflowStore, workflow: Dict[str, Any],
+                 handlers: Dict[str, Callable[[Dict[str, Any]], None]]) -> bool:
+    """Run the remaining steps, checkpointing after each one
+
+    A handler stores its results in ``workflow['results']`` and raises to
+    signal failure. Completed steps are skipped on the next run, so a retry
+    or a replay after a crash continues at the step that did not finish.
+    """
+    for step in WORKFLOW_STEPS:
+        if step in workflow['completed_steps']:
+            continue
+        try:
+            handlers[step](workflow)
+        except Exception as e:
+            workflow['failed_step'] = step
+            workflow['error'] = str(e)
+            store.save(workflow)
+            logger.error(f"❌ Project workflow {workflow['id']} failed at '{step}': {e}")
+            return False
+
+        workflow['completed_steps'].append(step)
+        workflow['failed_step'] = None
+        workflow['error'] = None
+        store.save(workflow)
+
+    workflow['status'] = 'done'
+    store.save(workflow)
+    logger.info(f"✅ Project workflow {workflow['id']} completed")
+    return True
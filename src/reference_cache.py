@@ -0,0 +1,353 @@
+"""
+Read-through cache of Supabase reference tables (projects), invalidated by realtime events or a version poll
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (max(updated_at), row count) - a delete does not move max(updated_at), the count does
+Version = Tuple[Optional[str], int]
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """One consistent copy of a table - replaced as a whole, never modified in place"""
+    version: Version
+    rows: Dict[Any, Dict[str, Any]] = field(default_factory=dict)
+    loaded_at: float = 0.0
+
+
+def change_from_payload(payload: Dict[str, Any]) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """('INSERT'|'UPDATE'|'DELETE', row) from a realtime postgres_changes payload"""
+    data = payload.get('data') or payload
+    change = (data.get('type') or data.get('eventType') or '').upper() or None
+    if change == 'DELETE':
+        return change, data.get('old_record') or data.get('old')
+    return change, data.get('record') or data.get('new')
+
+
+class ReferenceCache:
+    """All rows of a rarely changing table, served from memory
+
+    Reads go through ``snapshot()``: a snapshot older than ``ttl_seconds`` is
+    revalidated first by one cheap version query, and only reloaded if the
+    version moved - just the rows updated since the last version, or the
+    whole table if rows were deleted. Realtime change events (see
+    ``RealtimeInvalidator``) are applied as they arrive; without them a
+    background thread revalidates every ``poll_seconds``. If Supabase is
+    unreachable the last snapshot keeps serving.
+
+    Rows this process wrote itself (``upsert()``) may not be in the
+    database yet, e.g. while they wait in the write-behind outbox. They are
+    kept aside and merged into every reloaded snapshot until a load
+    returns them.
+
+    An optional ``sink`` with ``warm(rows)``, ``upsert(row)`` and
+    ``remove(id)`` (e.g. a ``ProjectIndex``) mirrors every change.
+    """
+
+    def __init__(self, name: str, load_all: Callable[[], List[Dict[str, Any]]],
+                 load_version: Callable[[], Version],
+                 load_since: Optional[Callable[[str], List[Dict[str, Any]]]] = None,
+                 sink=None, ttl_seconds: float = 300, poll_seconds: float = 30,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.load_all = load_all
+        self.load_version = load_version
+        self.load_since = load_since
+        self.sink = sink
+        self.ttl_seconds = ttl_seconds
+        self.poll_seconds = poll_seconds
+        self.clock = clock
+        self.realtime = False
+        self._snapshot: Optional[Snapshot] = None
+        # id -> (row, already in the database) for local writes no load has returned yet
+        self._local: Dict[Any, Tuple[Dict[str, Any], bool]] = {}
+        self._reload_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._counts = {'hits': 0, 'revalidations': 0, 'reloads': 0, 'delta_loads': 0, 'events': 0, 'errors': 0}
+
+    # --- reads -----------------------------------------------------------
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    def __len__(self) -> int:
+        snapshot = self._snapshot
+        return len(snapshot.rows) if snapshot else 0
+
+    def snapshot(self) -> Optional[Snapshot]:
+        """The current snapshot, revalidated first if it is older than the TTL"""
+        snapshot = self._snapshot
+        if snapshot is None or self.clock() - snapshot.loaded_at > self.ttl_seconds:
+            self.refresh()
+            snapshot = self._snapshot
+        else:
+            self._count('hits')
+        return snapshot
+
+    def rows(self) -> List[Dict[str, Any]]:
+        snapshot = self.snapshot()
+        return list(snapshot.rows.values()) if snapshot else []
+
+    def get(self, row_id: Any) -> Optional[Dict[str, Any]]:
+        snapshot = self.snapshot()
+        return snapshot.rows.get(row_id) if snapshot else None
+
+    # --- refresh ---------------------------------------------------------
+
+    def refresh(self, force: bool = False) -> bool:
+        """Revalidate against the database version, True if the rows changed
+
+        Concurrent callers wait for the one refresh in flight instead of
+        issuing their own queries. Errors are logged and leave the current
+        snapshot in place.
+        """
+        started = self.clock()
+        with self._reload_lock:
+            snapshot = self._snapshot
+            if not force and snapshot and snapshot.loaded_at > started:
+                # Someone else refreshed while we waited
+                return False
+            try:
+                self._count('revalidations')
+                version = self.load_version()
+                if snapshot and not force and version == snapshot.version:
+                    self._replace(version, snapshot.rows)
+                    return False
+                if snapshot and not force and self._load_delta(snapshot, version):
+                    return True
+                rows = self._replace(version, {row['id']: row for row in self.load_all()}, loaded=True)
+                self._count('reloads')
+                if self.sink is not None:
+                    self.sink.warm(rows.values())
+                logger.info(f"🗃️ {self.name} cache loaded: {len(rows)} rows")
+                return True
+            except Exception as e:
+                self._count('errors')
+                logger.error(f"❌ {self.name} cache refresh failed, serving the last snapshot: {e}")
+                return False
+
+    def _load_delta(self, snapshot: Snapshot, version: Version) -> bool:
+        """Apply only the rows updated since the snapshot - False if that cannot be exact"""
+        since = snapshot.version[0]
+        if not self.load_since or not since:
+            return False
+        changed = self.load_since(since)
+        with self._lock:
+            # Only rows the database has count against its version
+            rows = {row_id: row for row_id, row in snapshot.rows.items() if self._in_database(row_id)}
+        rows.update((row['id'], row) for row in changed)
+        if len(rows) != version[1]:
+            # Rows were deleted (or the delta missed some) - only a full load is exact
+            return False
+        self._count('delta_loads')
+        rows = self._replace(version, rows, loaded=True)
+        if self.sink is not None:
+            for row in changed:
+                self.sink.upsert(rows[row['id']])
+        return True
+
+    def invalidate(self) -> None:
+        """The next read revalidates"""
+        with self._lock:
+            if self._snapshot:
+                self._snapshot = Snapshot(self._snapshot.version, self._snapshot.rows, float('-inf'))
+
+    # --- changes ---------------------------------------------------------
+
+    def upsert(self, row: Dict[str, Any]) -> None:
+        """A row this process wrote itself - visible right away and kept until a load returns it"""
+        with self._lock:
+            snapshot = self._snapshot
+            self._local[row['id']] = (dict(row), bool(snapshot and row['id'] in snapshot.rows
+                                                       and self._in_database(row['id'])))
+        self._apply(row)
+
+    def _apply(self, row: Dict[str, Any]) -> None:
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None:
+                self._snapshot = Snapshot(snapshot.version, {**snapshot.rows, row['id']: dict(row)}, snapshot.loaded_at)
+        if self.sink is not None:
+            self.sink.upsert(row)
+
+    def remove(self, row_id: Any) -> None:
+        with self._lock:
+            self._local.pop(row_id, None)
+            snapshot = self._snapshot
+            if snapshot is not None and row_id in snapshot.rows:
+                rows = dict(snapshot.rows)
+                del rows[row_id]
+                self._snapshot = Snapshot(snapshot.version, rows, snapshot.loaded_at)
+        if self.sink is not None:
+            self.sink.remove(row_id)
+
+    def apply_change(self, payload: Dict[str, Any]) -> None:
+        """Realtime postgres_changes payload for this table"""
+        change, row = change_from_payload(payload)
+        if not row or 'id' not in row:
+            # Nothing to apply - let the next read find out what changed
+            self.invalidate()
+            return
+        self._count('events')
+        if change == 'DELETE':
+            self.remove(row['id'])
+        elif change in ('INSERT', 'UPDATE'):
+            # Straight from the database - nothing local left to keep
+            with self._lock:
+                self._local.pop(row['id'], None)
+            self._apply(row)
+        # The event is the newest state - carry the version along so the next revalidation is a no-op
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None:
+                updated_at = row.get('updated_at') if change != 'DELETE' else None
+                count = sum(1 for row_id in snapshot.rows if self._in_database(row_id))
+                version = (max(filter(None, (snapshot.version[0], updated_at)), default=None), count)
+                self._snapshot = Snapshot(version, snapshot.rows, snapshot.loaded_at)
+
+    def set_realtime(self, live: bool) -> None:
+        """Realtime subscription state - events may have been missed while it was down"""
+        if live and not self.realtime:
+            self.invalidate()
+        self.realtime = live
+        logger.info(f"🗃️ {self.name} cache invalidation: {'realtime' if live else f'poll every {self.poll_seconds}s'}")
+
+    # --- background ------------------------------------------------------
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_seconds):
+            # Realtime events keep the snapshot current, the TTL still catches missed ones
+            if self.realtime:
+                self.snapshot()
+            else:
+                self.refresh()
+
+    def start(self) -> None:
+        """Initial load, then revalidation in a background thread (poll_seconds <= 0: TTL only)"""
+        self.refresh()
+        if self.poll_seconds > 0:
+            threading.Thread(target=self._run, name=f'{self.name}-cache', daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counts)
+        stats.update({
+            'rows': len(snapshot.rows) if snapshot else 0,
+            'version': snapshot.version[0] if snapshot else None,
+            'age_seconds': round(self.clock() - snapshot.loaded_at, 1) if snapshot and snapshot.loaded_at > float('-inf') else None,
+            'invalidation': 'realtime' if self.realtime else 'poll'
+        })
+        return stats
+
+    def _replace(self, version: Version, rows: Dict[Any, Dict[str, Any]], loaded: bool = False) -> Dict[Any, Dict[str, Any]]:
+        """Install a snapshot of `rows` with the local writes merged in, returns the merged rows
+
+        Merging under the lock keeps a write that raced with the load. With
+        ``loaded`` the rows come from the database - local writes they
+        include (as new as the local copy) are confirmed and dropped.
+        """
+        with self._lock:
+            rows = dict(rows)
+            for row_id, (row, in_database) in list(self._local.items()):
+                stored = rows.get(row_id) if loaded else None
+                if stored is not None and (stored.get('updated_at') or '') >= (row.get('updated_at') or ''):
+                    del self._local[row_id]
+                else:
+                    rows[row_id] = row
+                    self._local[row_id] = (row, in_database or stored is not None)
+            self._snapshot = Snapshot(version, rows, self.clock())
+            return rows
+
+    def _in_database(self, row_id: Any) -> bool:
+        """False for a local write the database does not have yet (call with the lock held)"""
+        local = self._local.get(row_id)
+        return local is None or local[1]
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+
+def table_loaders(get_client: Callable[[], Any], table: str, page_size: int = 1000):
+    """(load_all, load_version, load_since) for a table with ``id`` and ``updated_at`` columns"""
+
+    def load_all() -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = []
+        while True:
+            page = get_client().table(table).select('*') \
+                .order('id').range(len(rows), len(rows) + page_size - 1).execute().data or []
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+
+    def load_version() -> Version:
+        # Served by the updated_at index, the count comes with the same request
+        result = get_client().table(table).select('updated_at', count='exact') \
+            .order('updated_at', desc=True).limit(1).execute()
+        return ((result.data[0].get('updated_at') if result.data else None), result.count or 0)
+
+    def load_since(updated_at: str) -> List[Dict[str, Any]]:
+        # gte: rows committed later with the same timestamp are not lost, re-reading one is harmless
+        return get_client().table(table).select('*').gte('updated_at', updated_at).execute().data or []
+
+    return load_all, load_version, load_since
+
+
+class RealtimeInvalidator:
+    """Feeds Supabase realtime postgres_changes into reference caches
+
+    Realtime needs the async Supabase client, so it runs its own event loop
+    in a daemon thread. Whenever the subscription is not live the caches
+    fall back to polling; a failed start leaves them polling for good.
+    """
+
+    def __init__(self, url: str, key: str, caches: Dict[str, ReferenceCache]):
+        self.url = url
+        self.key = key
+        self.caches = caches
+        self.state = 'not_started'
+
+    def _on_state(self, state, error: Optional[Exception]) -> None:
+        self.state = getattr(state, 'value', str(state))
+        live = self.state == 'SUBSCRIBED'
+        if error:
+            logger.error(f"❌ Realtime subscription {self.state}: {error}")
+        for cache in self.caches.values():
+            cache.set_realtime(live)
+
+    async def _subscribe(self) -> None:
+        from supabase import acreate_client
+
+        client = await acreate_client(self.url, self.key)
+        channel = client.channel('reference-cache')
+        for table, cache in self.caches.items():
+            channel.on_postgres_changes('*', callback=cache.apply_change, table=table)
+        await channel.subscribe(self._on_state)
+        # The client's own tasks do the listening and reconnecting
+        await asyncio.Event().wait()
+
+    def _run(self) -> None:
+        try:
+            asyncio.run(self._subscribe())
+        except Exception as e:
+            logger.error(f"❌ Realtime unavailable, reference caches poll: {e}")
+        self.state = 'unavailable'
+        for cache in self.caches.values():
+            cache.set_realtime(False)
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, name='realtime-invalidator', daemon=True).start()
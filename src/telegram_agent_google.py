@@ -6,6 +6,7 @@ MGA Telegram Bot - WITH TIME TRACKING
 import os
 import json
 import logging
+import atexit
 from datetime import datetime, timedelta, timezone
 from flask import Flask, request, jsonify
 import requests
@@ -13,13 +14,52 @@ from groq import Groq
 import io
 from typing import Dict, Any, Optional, Tuple, List
 import re
+import tempfile
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Google Drive imports
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from google_clients import GoogleClients, LazyService, TokenRefresher, decode_service_account_info
+
+# Quota-aware execution of all Google API requests
+from google_scheduler import GoogleApiScheduler
 
 # Supabase imports
 from supabase import create_client, Client
+from postgrest.types import ReturnMethod
+
+# Time entries and tasks are confirmed from a local journal and inserted in batches
+from write_behind import WriteBehindWriter, is_permanent_error, row_id
+
+# Hour reports aggregated in the database
+from time_summary import SummaryCache, render_summary, resolve_time_range
+from time_export import (EXPORT_MIME_TYPES, ExportError, export_file_name, export_time_entries,
+                         iter_time_entry_pages, parse_export_command)
+
+# Paginated task/project lists for the portal
+from list_api import create_list_api
+
+# Conversation context for follow-up questions
+from conversation_state import ConversationStateStore, ChatState, new_prompt_nonce, parse_confirmation
+
+# Project numbering shared by all workers
+from project_counter import ProjectCounter, ProjectNumberLeaser, current_year, parse_project_number
+from project_workflow import ProjectWorkflowStore, run_workflow
+
+# Local project lookups without a database round trip
+from project_index import ProjectIndex, clear_winner
+from reference_cache import RealtimeInvalidator, ReferenceCache, table_loaders
+
+# In-memory view of the Drive project tree
+from drive_mirror import DriveMirror
+
+# Photos and documents sent to the bot
+from file_ingest import FileIngestor, IncomingFile, IngestResult, incoming_file_from_message, target_subfolder
+from file_previews import PreviewPool, is_previewable, preview_name
+from file_dedup import FileDedupIndex
+from google.auth.transport.requests import AuthorizedSession
 
 # Logging setup
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -36,47 +76,123 @@ GOOGLE_DRIVE_ROOT_FOLDER_ID = os.getenv('GOOGLE_DRIVE_ROOT_FOLDER_ID', '0ADxsi_1
 SUPABASE_URL = os.getenv('SUPABASE_URL', '')
 SUPABASE_ANON_KEY = os.getenv('SUPABASE_ANON_KEY', '')
 PROJECT_COUNTER_FILE = os.getenv('PROJECT_COUNTER_FILE', 'project_counter.json')
+# Numbers leased per worker at once (0 or 1 = every number from the shared counter)
+PROJECT_NUMBER_LEASE_SIZE = int(os.getenv('PROJECT_NUMBER_LEASE_SIZE', '0'))
+# Also scan project folder names in Drive when repairing the counter at startup
+PROJECT_COUNTER_RECONCILE_DRIVE = os.getenv('PROJECT_COUNTER_RECONCILE_DRIVE', 'true').lower() == 'true'
+
+# Checkpointed Project Creation
+PROJECT_WORKFLOW_DIR = os.getenv('PROJECT_WORKFLOW_DIR', 'project_workflows')
+PROJECT_WORKFLOW_REPLAY_HOURS = float(os.getenv('PROJECT_WORKFLOW_REPLAY_HOURS', '24'))
+PROJECT_WORKFLOW_RETENTION_DAYS = float(os.getenv('PROJECT_WORKFLOW_RETENTION_DAYS', '7'))
+
+# Drive Folder Creation
+DRIVE_PARALLEL_REQUESTS = int(os.getenv('DRIVE_PARALLEL_REQUESTS', '4'))
+DRIVE_SUBFOLDER_RETRIES = int(os.getenv('DRIVE_SUBFOLDER_RETRIES', '2'))
+
+# Google API Quotas (requests per second, burst size) and retries
+GOOGLE_DRIVE_RATE = float(os.getenv('GOOGLE_DRIVE_RATE', '10'))
+GOOGLE_DRIVE_BURST = float(os.getenv('GOOGLE_DRIVE_BURST', '20'))
+GOOGLE_CALENDAR_RATE = float(os.getenv('GOOGLE_CALENDAR_RATE', '5'))
+GOOGLE_CALENDAR_BURST = float(os.getenv('GOOGLE_CALENDAR_BURST', '10'))
+GOOGLE_API_MAX_RETRIES = int(os.getenv('GOOGLE_API_MAX_RETRIES', '5'))
+# Kept-alive HTTP connections to Google shared by all threads
+GOOGLE_HTTP_POOL_SIZE = int(os.getenv('GOOGLE_HTTP_POOL_SIZE', '8'))
+# Renew the access token this long before it expires (above google-auth's own ~4 min threshold)
+GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS = float(os.getenv('GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS', '300'))
+
+# Local Drive Mirror (0 = no background polling)
+DRIVE_MIRROR_FILE = os.getenv('DRIVE_MIRROR_FILE', 'drive_mirror.json')
+DRIVE_MIRROR_POLL_SECONDS = float(os.getenv('DRIVE_MIRROR_POLL_SECONDS', '60'))
+
+# File Ingestion (concurrent uploads and queued jobs beyond them)
+FILE_INGEST_WORKERS = int(os.getenv('FILE_INGEST_WORKERS', '3'))
+FILE_INGEST_MAX_PENDING = int(os.getenv('FILE_INGEST_MAX_PENDING', '10'))
+
+# Index of filed files for deduplication
+FILE_DEDUP_DB = os.getenv('FILE_DEDUP_DB', 'file_index.sqlite3')
+
+# Previews (0 workers = no previews)
+PREVIEW_CACHE_DIR = os.getenv('PREVIEW_CACHE_DIR', 'preview_cache')
+PREVIEW_WORKERS = int(os.getenv('PREVIEW_WORKERS', '2'))
+PREVIEW_MAX_QUEUE = int(os.getenv('PREVIEW_MAX_QUEUE', '8'))
+
+# Write-behind journal for time entries and tasks
+WRITE_BEHIND_JOURNAL = os.getenv('WRITE_BEHIND_JOURNAL', 'write_behind.sqlite3')
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', '50'))
+WRITE_BEHIND_FLUSH_SECONDS = float(os.getenv('WRITE_BEHIND_FLUSH_SECONDS', '1.0'))
+
+# Rendered hour summaries are reused per chat and range for this long
+SUMMARY_CACHE_TTL_SECONDS = float(os.getenv('SUMMARY_CACHE_TTL_SECONDS', '60'))
+
+# Bearer token for /api/tasks and /api/projects (unset = the list API answers 503)
+LIST_API_TOKEN = os.getenv('LIST_API_TOKEN')
+
+# Projects cache: revalidated after the TTL, polled without realtime (0 = TTL only)
+REFERENCE_CACHE_TTL_SECONDS = float(os.getenv('REFERENCE_CACHE_TTL_SECONDS', '300'))
+REFERENCE_CACHE_POLL_SECONDS = float(os.getenv('REFERENCE_CACHE_POLL_SECONDS', '30'))
+REFERENCE_CACHE_REALTIME = os.getenv('REFERENCE_CACHE_REALTIME', 'true').lower() == 'true'
+
+# Conversation State Configuration
+CONVERSATION_STATE_TTL_SECONDS = int(os.getenv('CONVERSATION_STATE_TTL_SECONDS', '900'))
+CONVERSATION_STATE_MAX_CHATS = int(os.getenv('CONVERSATION_STATE_MAX_CHATS', '500'))
+CONVERSATION_CONTEXT_MAX_CHARS = int(os.getenv('CONVERSATION_CONTEXT_MAX_CHARS', '240'))
 
 # Initialize Flask
 app = Flask(__name__)
+# supabase_client is looked up per request - it is only created in init_services()
+app.register_blueprint(create_list_api(lambda: supabase_client, LIST_API_TOKEN))
 
 # Global variables for services (will be initialized in main)
 groq_client = None
 supabase_client: Optional[Client] = None
 drive_service = None
 calendar_service = None
+google_credentials = None
+file_ingestor: Optional[FileIngestor] = None
+preview_pool: Optional[PreviewPool] = None
+token_refresher: Optional[TokenRefresher] = None
+file_index: Optional[FileDedupIndex] = None
+write_behind: Optional[WriteBehindWriter] = None
+
+# Built from the bundled discovery documents when first used, see google_clients.py
+google_clients = GoogleClients(lambda: decode_service_account_info(GOOGLE_SERVICE_ACCOUNT_JSON),
+                               pool_size=GOOGLE_HTTP_POOL_SIZE)
+
+# Every Drive/Calendar request goes through here, see google_scheduler.py
+google_api = GoogleApiScheduler({
+    'drive': (GOOGLE_DRIVE_RATE, GOOGLE_DRIVE_BURST),
+    'calendar': (GOOGLE_CALENDAR_RATE, GOOGLE_CALENDAR_BURST)
+}, max_retries=GOOGLE_API_MAX_RETRIES, transport=google_clients.transport)
+
+# SHOW_SUMMARY answers per chat, see time_summary.py
+summary_cache = SummaryCache(ttl_seconds=SUMMARY_CACHE_TTL_SECONDS)
+
+# Exports run one at a time, off the webhook thread
+export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export')
+
+# Last intent, project and open question per chat
+conversation_store = ConversationStateStore(
+    max_chats=CONVERSATION_STATE_MAX_CHATS,
+    ttl_seconds=CONVERSATION_STATE_TTL_SECONDS,
+    max_context_chars=CONVERSATION_CONTEXT_MAX_CHARS
+)
+
+# Project folders and subfolders of the shared drive, see drive_mirror.py
+drive_mirror = DriveMirror(DRIVE_MIRROR_FILE, GOOGLE_DRIVE_ROOT_FOLDER_ID)
 
 def get_google_services():
-    """Initialize both Drive and Calendar services"""
-    import base64
-    import tempfile
+    """Load the shared credential, Drive and Calendar clients are built on first use"""
+    global google_credentials
     
     if not GOOGLE_SERVICE_ACCOUNT_JSON:
         logger.error("GOOGLE_SERVICE_ACCOUNT_JSON not found in environment variables")
         raise ValueError("GOOGLE_SERVICE_ACCOUNT_JSON is required")
     
-    # Decode base64 service account JSON
     try:
-        service_account_json = base64.b64decode(GOOGLE_SERVICE_ACCOUNT_JSON).decode('utf-8')
-        # Create temporary file for credentials
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-            f.write(service_account_json)
-            temp_path = f.name
-        
-        creds = service_account.Credentials.from_service_account_file(
-            temp_path,
-            scopes=[
-                'https://www.googleapis.com/auth/drive',
-                'https://www.googleapis.com/auth/calendar'
-            ]
-        )
-        
-        # Clean up temp file
-        os.unlink(temp_path)
-        
-        drive_service = build('drive', 'v3', credentials=creds)
-        calendar_service = build('calendar', 'v3', credentials=creds)
-        return drive_service, calendar_service
+        # Credentials straight from the decoded JSON - no temp file
+        google_credentials = google_clients.credentials
+        return LazyService(google_clients, 'drive'), LazyService(google_clients, 'calendar')
     except Exception as e:
         logger.error(f"Failed to initialize Google services: {e}")
         raise
@@ -84,6 +200,14 @@ def get_google_services():
 # Services will be initialized in init_services()
 
 # Calendar helper functions
+def get_primary_calendar_id() -> Optional[str]:
+    """ID of the primary calendar - concurrent lookups share one request"""
+    calendar_list = google_api.execute('calendar', calendar_service.calendarList().list(),
+                                       coalesce_key='calendar:primary')
+    primary_calendar = next((cal for cal in calendar_list.get('items', []) 
+                           if cal.get('primary')), None)
+    return primary_calendar['id'] if primary_calendar else None
+
 def get_calendar_events(days_ahead: int = 7) -> List[Dict[str, Any]]:
     """Get calendar events for the next N days"""
     now = datetime.now(timezone.utc)
@@ -92,24 +216,19 @@ def get_calendar_events(days_ahead: int = 7) -> List[Dict[str, Any]]:
     
     try:
         # Get primary calendar ID
-        calendar_list = calendar_service.calendarList().list().execute()
-        primary_calendar = next((cal for cal in calendar_list.get('items', []) 
-                               if cal.get('primary')), None)
-        
-        if not primary_calendar:
+        calendar_id = get_primary_calendar_id()
+        if not calendar_id:
             logger.error("No primary calendar found")
             return []
-            
-        calendar_id = primary_calendar['id']
         
         # Fetch events
-        events_result = calendar_service.events().list(
+        events_result = google_api.execute('calendar', calendar_service.events().list(
             calendarId=calendar_id,
             timeMin=time_min,
             timeMax=time_max,
             singleEvents=True,
             orderBy='startTime'
-        ).execute()
+        ))
         
         events = events_result.get('items', [])
         return events
@@ -124,15 +243,10 @@ def create_calendar_event(summary: str, description: str = "",
     """Create a calendar event"""
     try:
         # Get primary calendar
-        calendar_list = calendar_service.calendarList().list().execute()
-        primary_calendar = next((cal for cal in calendar_list.get('items', []) 
-                               if cal.get('primary')), None)
-        
-        if not primary_calendar:
+        calendar_id = get_primary_calendar_id()
+        if not calendar_id:
             logger.error("No primary calendar found")
             return None
-            
-        calendar_id = primary_calendar['id']
         
         # Default to tomorrow 9 AM if no start time
         if not start_time:
@@ -157,10 +271,11 @@ def create_calendar_event(summary: str, description: str = "",
             },
         }
         
-        created_event = calendar_service.events().insert(
+        # Not retried after a 5xx or timeout - the event may exist already
+        created_event = google_api.execute('calendar', calendar_service.events().insert(
             calendarId=calendar_id, 
             body=event
-        ).execute()
+        ), retry=False)
         
         return created_event.get('htmlLink')
         
@@ -194,53 +309,114 @@ PROJECT_FOLDERS = [
     "05_Berechnungen", "06_Ausschreibung", "07_Verträge", "08_Protokolle"
 ]
 
-# Project Numbering System
-PROJECT_COUNTER_FILE = "/var/www/mga-portal/project_counter.json"
+# Project Numbering System - locked and atomically written (see project_counter.py)
+project_counter = ProjectCounter(PROJECT_COUNTER_FILE)
+project_number_allocator = project_counter
+if PROJECT_NUMBER_LEASE_SIZE > 1:
+    project_number_allocator = ProjectNumberLeaser(project_counter, PROJECT_NUMBER_LEASE_SIZE)
+    # Hand unused numbers back when the worker exits
+    atexit.register(project_number_allocator.release)
 
 def get_next_project_number():
     """Get next project number in format YY-NNN"""
     try:
-        # Load current counter
-        if os.path.exists(PROJECT_COUNTER_FILE):
-            with open(PROJECT_COUNTER_FILE, 'r') as f:
-                counter_data = json.load(f)
-        else:
-            counter_data = {"year": 25, "counter": 0, "last_number": "25-000"}
+        project_number = project_number_allocator.next_number()
         
-        # Get current year (last 2 digits)
-        current_year = int(datetime.now().strftime("%y"))
+        logger.info(f"📊 Generated project number: {project_number}")
+        return project_number
+    except Exception as e:
+        logger.error(f"❌ Project numbering error: {e}")
+        # Six digits - never read back as a counter value (see PROJECT_NUMBER_PATTERN)
+        return f"{current_year():02d}-{datetime.now().strftime('%H%M%S')}"
+
+def get_highest_project_number_in_supabase(year: int) -> int:
+    """Highest NNN of the year in the projects table"""
+    if not supabase_client:
+        return 0
         
-        # Reset counter if year changed
-        if counter_data["year"] != current_year:
-            counter_data["year"] = current_year
-            counter_data["counter"] = 1
-        else:
-            counter_data["counter"] += 1
+    # Numeric maximum from an index (scripts/create_project_counter.sql) - as text '25-1000' < '25-999'
+    result = supabase_client.rpc('highest_project_number', {'for_year': year}).execute()
+    return int(result.data or 0)
+
+def get_highest_project_number_in_drive(year: int) -> int:
+    """Highest NNN of the year among the project folders in the shared drive"""
+    highest = 0
+    if drive_mirror.ready:
+        for name in drive_mirror.project_folder_names():
+            parsed = parse_project_number(name)
+            if parsed and parsed[0] == year:
+                highest = max(highest, parsed[1])
+        return highest
+    
+    if not drive_service:
+        return 0
         
-        # Format project number
-        project_number = f"{current_year:02d}-{counter_data['counter']:03d}"
-        counter_data["last_number"] = project_number
+    page_token = None
+    while True:
+        response = google_api.execute('drive', drive_service.files().list(
+            q=(f"'{GOOGLE_DRIVE_ROOT_FOLDER_ID}' in parents and name contains '{year:02d}-' "
+               "and mimeType = 'application/vnd.google-apps.folder' and trashed = false"),
+            corpora='drive',
+            driveId=GOOGLE_DRIVE_ROOT_FOLDER_ID,
+            includeItemsFromAllDrives=True,
+            supportsAllDrives=True,
+            fields='nextPageToken, files(name)',
+            pageSize=1000,
+            pageToken=page_token
+        ))
         
-        # Save updated counter
-        with open(PROJECT_COUNTER_FILE, 'w') as f:
-            json.dump(counter_data, f, indent=2)
+        for folder in response.get('files', []):
+            parsed = parse_project_number(folder.get('name', ''))
+            if parsed and parsed[0] == year:
+                highest = max(highest, parsed[1])
+                
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return highest
+
+def reconcile_project_counter() -> None:
+    """Repair the project counter from Supabase (and Drive) before serving traffic"""
+    year = current_year()
+    sources = {}
+    
+    try:
+        sources['supabase'] = get_highest_project_number_in_supabase(year)
+    except Exception as e:
+        logger.error(f"❌ Counter reconciliation - Supabase query failed: {e}")
         
-        logger.info(f"📊 Generated project number: {project_number}")
-        return project_number
+    if PROJECT_COUNTER_RECONCILE_DRIVE:
+        try:
+            sources['drive'] = get_highest_project_number_in_drive(year)
+        except Exception as e:
+            logger.error(f"❌ Counter reconciliation - Drive scan failed: {e}")
+    
+    if not sources:
+        logger.warning("⚠️ Project counter not reconciled - no source available")
+        return
+        
+    high_water = max(sources.values())
+    try:
+        if project_counter.ensure_at_least(year, high_water):
+            logger.warning(f"🔧 Project counter repaired to {year:02d}-{high_water:03d} (sources: {sources})")
+        else:
+            logger.info(f"📊 Project counter consistent (sources: {sources})")
     except Exception as e:
-        logger.error(f"❌ Project numbering error: {e}")
-        return f"25-{datetime.now().strftime('%H%M%S')}"
+        logger.error(f"❌ Counter reconciliation failed: {e}")
+
+def clean_project_base_name(base_name: str = None) -> str:
+    """Strip filler words the AI sometimes leaves in the project name"""
+    if not base_name:
+        return ""
+    return base_name.replace("neues projekt", "").replace("projekt", "").strip()
 
-def format_project_name(base_name: str = None):
-    """Format project name with number and optional description"""
-    project_number = get_next_project_number()
+def build_project_name(project_number: str, base_name: str = None) -> str:
+    """Combine an allocated number with the optional description"""
+    base_name = clean_project_base_name(base_name)
     if base_name:
-        base_name = base_name.replace("neues projekt", "").replace("projekt", "").strip()
-        if base_name:
-            return f"{project_number}-{base_name}"
+        return f"{project_number}-{base_name}"
     return project_number
 
-def send_telegram_message(chat_id: int, text: str) -> bool:
+def send_telegram_message(chat_id: int, text: str, reply_markup: Optional[Dict[str, Any]] = None) -> bool:
     """Send message to Telegram with error handling"""
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     data = {
@@ -248,6 +424,8 @@ def send_telegram_message(chat_id: int, text: str) -> bool:
         "text": text,
         "parse_mode": "Markdown"
     }
+    if reply_markup:
+        data["reply_markup"] = reply_markup
     
     try:
         response = requests.post(url, json=data, timeout=10)
@@ -264,7 +442,70 @@ def send_telegram_message(chat_id: int, text: str) -> bool:
         logger.error(f"❌ Send message error: {e}")
         return False
 
-def analyze_with_groq(text: str) -> Dict[str, Any]:
+def send_telegram_photo(chat_id: int, photo_path: str, caption: str = "") -> bool:
+    """Upload a local image to the chat"""
+    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto"
+    try:
+        with open(photo_path, 'rb') as photo:
+            response = requests.post(url, data={"chat_id": chat_id, "caption": caption, "parse_mode": "Markdown"},
+                                     files={"photo": photo}, timeout=30)
+        result = response.json()
+        if not result.get('ok'):
+            logger.error(f"❌ Telegram API error: {result}")
+        return bool(result.get('ok'))
+    except Exception as e:
+        logger.error(f"❌ Send photo error: {e}")
+        return False
+
+def inline_keyboard(*rows: List[Tuple[str, str]]) -> Dict[str, Any]:
+    """Build an inline keyboard from rows of (label, callback_data)"""
+    return {
+        "inline_keyboard": [
+            [{"text": label, "callback_data": data} for label, data in row]
+            for row in rows
+        ]
+    }
+
+# callback_data is <action>:<value>:<nonce> and must stay below Telegram's 64 byte limit.
+# The nonce ties the buttons to the prompt they belong to, see handle_callback_query.
+def confirm_keyboard(nonce: str) -> Dict[str, Any]:
+    return inline_keyboard([("✅ Ja", f"cf:y:{nonce}"), ("❌ Nein", f"cf:n:{nonce}")])
+
+def priority_keyboard(nonce: str) -> Dict[str, Any]:
+    return inline_keyboard([("🔴 Hoch", f"pr:hoch:{nonce}"), ("🟡 Mittel", f"pr:mittel:{nonce}"),
+                            ("🟢 Niedrig", f"pr:niedrig:{nonce}")])
+
+def project_choice_keyboard(projects: List[Dict[str, Any]], nonce: str) -> Dict[str, Any]:
+    """One button per candidate project"""
+    return inline_keyboard(*[[(p['name'][:40], f"pj:{p['id']}:{nonce}")] for p in projects])
+
+def answer_callback_query(callback_query_id: str, text: str = None) -> bool:
+    """Acknowledge a button tap so the client stops showing the spinner"""
+    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/answerCallbackQuery"
+    data = {"callback_query_id": callback_query_id}
+    if text:
+        data["text"] = text
+        
+    try:
+        response = requests.post(url, json=data, timeout=10)
+        return response.json().get('ok', False)
+    except Exception as e:
+        logger.error(f"❌ Answer callback error: {e}")
+        return False
+
+def remove_inline_keyboard(chat_id: int, message_id: int) -> bool:
+    """Remove the buttons from a message once one of them was used"""
+    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/editMessageReplyMarkup"
+    data = {"chat_id": chat_id, "message_id": message_id, "reply_markup": {"inline_keyboard": []}}
+    
+    try:
+        response = requests.post(url, json=data, timeout=10)
+        return response.json().get('ok', False)
+    except Exception as e:
+        logger.error(f"❌ Edit reply markup error: {e}")
+        return False
+
+def analyze_with_groq(text: str, context: str = "") -> Dict[str, Any]:
     """Analyze text with Groq AI - Enhanced for time tracking"""
     try:
         system_prompt = """Du bist ein hochintelligenter und proaktiver Assistent für ein Architekturbüro. Deine Aufgabe ist es, aus einem freien, natürlichen Gespräch die Absichten des Architekten zu interpretieren und sie in strukturierte JSON-Aktionen umzuwandeln. Denke mit, antizipiere den nächsten Schritt.
@@ -306,7 +547,8 @@ def analyze_with_groq(text: str) -> Dict[str, Any]:
     "duration_hours": 0.0,
     "activity_description": "...",
     "entry_date": "YYYY-MM-DD",
-    "priority": "hoch|mittel|niedrig"
+    "priority": "hoch|mittel|niedrig",
+    "time_range": "this_week|last_week|this_month|last_month|Monatsname|YYYY-MM-DD..YYYY-MM-DD"
   },
   "confidence_score": 0.9,
   "interpretation": "Das habe ich verstanden: ...",
@@ -316,12 +558,15 @@ def analyze_with_groq(text: str) -> Dict[str, Any]:
 WICHTIG: Bei Unsicherheit IMMER nachfragen statt zu raten!
         """
         
+        messages = [{"role": "system", "content": system_prompt}]
+        if context:
+            # Keep the follow-up context short - it is sent with every request
+            messages.append({"role": "system", "content": f"Gesprächskontext: {context}"})
+        messages.append({"role": "user", "content": text})
+        
         response = groq_client.chat.completions.create(
             model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": text}
-            ],
+            messages=messages,
             temperature=0.3,
             max_tokens=300,
             response_format={"type": "json_object"}
@@ -344,8 +589,8 @@ WICHTIG: Bei Unsicherheit IMMER nachfragen statt zu raten!
 def create_task(task_content: str, project_id: Optional[str] = None, 
                 priority: str = "mittel", tags: List[str] = None,
                 behörde: Optional[str] = None, gemeinde: Optional[str] = None,
-                created_by: str = None) -> bool:
-    """Create a new task in Supabase"""
+                created_by: str = None, chat_id: Optional[int] = None) -> bool:
+    """Create a new task in Supabase - journaled and inserted in the background once the writer runs"""
     if not supabase_client:
         logger.error("❌ Supabase client not initialized")
         return False
@@ -367,7 +612,10 @@ def create_task(task_content: str, project_id: Optional[str] = None,
         if gemeinde:
             task_data['gemeinde'] = gemeinde
             
-        result = supabase_client.table('tasks').insert(task_data).execute()
+        if write_behind:
+            write_behind.submit('tasks', task_data, {'chat_id': chat_id, 'label': f"Aufgabe: {task_content[:50]}"})
+        else:
+            supabase_client.table('tasks').insert(task_data).execute()
         
         logger.info(f"✅ Task created: {task_content[:50]}...")
         return True
@@ -399,37 +647,76 @@ def extract_tirol_tags(text: str) -> List[str]:
             
     return tags
 
-def find_project_by_identifier(identifier: str) -> Optional[Dict[str, Any]]:
-    """Find project in Supabase by name or number"""
+# Resident copy of the projects table, see project_index.py
+project_index = ProjectIndex()
+
+PROJECT_INDEX_PAGE_SIZE = 1000
+
+# Read-through copy of the projects table feeding the index, see reference_cache.py
+project_cache = ReferenceCache('projects', *table_loaders(lambda: supabase_client, 'projects', PROJECT_INDEX_PAGE_SIZE),
+                               sink=project_index, ttl_seconds=REFERENCE_CACHE_TTL_SECONDS,
+                               poll_seconds=REFERENCE_CACHE_POLL_SECONDS)
+realtime_invalidator: Optional[RealtimeInvalidator] = None
+
+def start_project_cache() -> None:
+    """Load all projects into the cache and index, then keep them current"""
+    global realtime_invalidator
     if not supabase_client:
-        return None
+        return
         
-    try:
-        # Clean the identifier
-        identifier = identifier.strip()
-        
-        # Try exact match first
-        result = supabase_client.table('projects').select('*').ilike('name', f'%{identifier}%').execute()
+    project_cache.start()
+    if project_index.ready:
+        logger.info(f"📇 Project index warmed: {len(project_index)} projects")
+    else:
+        logger.error("❌ Project index not warmed - lookups use Supabase until the next refresh")
         
-        if result.data and len(result.data) > 0:
-            # Return the most recently created match
-            return sorted(result.data, key=lambda x: x['created_at'], reverse=True)[0]
+    # Change events instead of polling where the project has realtime enabled
+    if REFERENCE_CACHE_REALTIME:
+        realtime_invalidator = RealtimeInvalidator(SUPABASE_URL, SUPABASE_ANON_KEY, {'projects': project_cache})
+        realtime_invalidator.start()
+    atexit.register(project_cache.stop)
+
+def rank_projects(identifier: str, limit: int = 5) -> List[Tuple[Dict[str, Any], float]]:
+    """Candidate projects with match scores, best first - index first, Supabase on a miss"""
+    # Clean the identifier
+    identifier = identifier.strip()
+    
+    # Revalidates the cached projects once the TTL is up
+    if supabase_client and project_cache.snapshot() and project_index.ready:
+        ranked = project_index.rank(identifier, limit)
+        if ranked:
+            return ranked
             
-        # Try project number match
-        result = supabase_client.table('projects').select('*').ilike('project_number', f'%{identifier}%').execute()
+    if not supabase_client:
+        return []
         
-        if result.data and len(result.data) > 0:
-            return sorted(result.data, key=lambda x: x['created_at'], reverse=True)[0]
-            
-        return None
+    try:
+        # Number and name matching, ranked and limited server-side (scripts/create_project_search.sql)
+        result = supabase_client.rpc('search_projects', {'q': identifier, 'max_results': limit}).execute()
+        
+        ranked = []
+        for row in result.data or []:
+            score = row.pop('score')
+            # Created elsewhere (portal, other worker) or matched fuzzily only
+            project_cache.upsert(row)
+            ranked.append((row, score))
+        return ranked
         
     except Exception as e:
         logger.error(f"❌ Error finding project: {e}")
-        return None
+        return []
+
+def find_project_by_identifier(identifier: str) -> Optional[Dict[str, Any]]:
+    """The project the identifier clearly names, None if nothing or nothing certain matches"""
+    return clear_winner(rank_projects(identifier))
+
+def pick_unambiguous_project(ranked: List[Tuple[Dict[str, Any], float]]) -> Optional[Dict[str, Any]]:
+    """The top match if it clearly names one project - a single weak fuzzy match needs a confirmation too"""
+    return clear_winner(ranked)
 
 def record_time_entry(project_id: str, duration_hours: float, activity_description: str, 
-                     entry_date: str, created_by: str) -> bool:
-    """Record time entry in Supabase"""
+                     entry_date: str, created_by: str, chat_id: Optional[int] = None) -> bool:
+    """Record time entry in Supabase - journaled and inserted in the background once the writer runs"""
     if not supabase_client:
         logger.error("❌ Supabase client not initialized")
         return False
@@ -443,7 +730,11 @@ def record_time_entry(project_id: str, duration_hours: float, activity_descripti
             'created_by': created_by
         }
         
-        result = supabase_client.table('time_entries').insert(time_entry).execute()
+        if write_behind:
+            write_behind.submit('time_entries', time_entry,
+                                {'chat_id': chat_id, 'label': f"{duration_hours}h {activity_description} ({entry_date})"})
+        else:
+            supabase_client.table('time_entries').insert(time_entry).execute()
         
         logger.info(f"✅ Time entry saved: {duration_hours}h for project {project_id}")
         return True
@@ -452,6 +743,24 @@ def record_time_entry(project_id: str, duration_hours: float, activity_descripti
         logger.error(f"❌ Error saving time entry: {e}")
         return False
 
+def send_journaled_rows(table: str, rows: List[Dict[str, Any]]) -> None:
+    """Deliver a write-behind batch - one request, resent rows are skipped by their ID"""
+    supabase_client.table(table).upsert(rows, on_conflict='id', ignore_duplicates=True,
+                                        returning=ReturnMethod.minimal, default_to_null=False).execute()
+
+def report_failed_write(table: str, row: Dict[str, Any], context: Optional[Dict[str, Any]], error: Exception) -> None:
+    """Tell the user that an already confirmed entry was rejected by the database"""
+    if not context or not context.get('chat_id'):
+        return
+    send_telegram_message(context['chat_id'],
+                          f"❌ **Nicht gespeichert:** {context.get('label', table)}\n\n"
+                          f"Die Datenbank hat den Eintrag abgelehnt: `{error}`\nBitte erneut erfassen.")
+
+def on_write_delivered(table: str, row: Dict[str, Any], context: Optional[Dict[str, Any]]) -> None:
+    """A journaled time entry reached Supabase - summaries cached in the meantime miss it"""
+    if table == 'time_entries' and context and context.get('chat_id'):
+        summary_cache.invalidate(context['chat_id'])
+
 def parse_date_from_ai(date_str: str) -> str:
     """Parse date string from AI to YYYY-MM-DD format"""
     if not date_str:
@@ -485,14 +794,16 @@ def create_folder(name: str, parent_id: str = None) -> Tuple[Optional[str], Opti
         if parent_id:
             metadata['parents'] = [parent_id]
             
-        folder = drive_service.files().create(
+        folder = google_api.execute('drive', drive_service.files().create(
             body=metadata, 
             fields='id,webViewLink',
             supportsAllDrives=True
-        ).execute()
+        ), retry=False)
         
         folder_id = folder.get('id')
         folder_link = folder.get('webViewLink')
+        if parent_id:
+            drive_mirror.record_folder(folder_id, name, parent_id)
         
         logger.info(f"📁 Created folder: {name} (ID: {folder_id})")
         return folder_id, folder_link
@@ -501,19 +812,35 @@ def create_folder(name: str, parent_id: str = None) -> Tuple[Optional[str], Opti
         logger.error(f"❌ Create folder error: {e}")
         return None, None
 
-def save_project_to_supabase(project_name: str, folder_id: str, folder_link: str) -> bool:
-    """Save project metadata to Supabase database"""
+def extract_project_number(project_name: str) -> Optional[str]:
+    """Extract the YY-NNN prefix from a project name"""
+    if '-' in project_name:
+        parts = project_name.split('-')
+        if len(parts) >= 2 and parts[0].isdigit() and parts[1].isdigit():
+            return f"{parts[0]}-{parts[1]}"
+    return None
+
+def queue_project(project_data: Dict[str, Any]) -> str:
+    """Put a project row into the outbox - it is inserted once Supabase is reachable again"""
+    write_behind.submit('projects', project_data, {'label': f"Projekt {project_data['name']}"},
+                        key=project_data['drive_folder_id'])
+    # Known to the bot right away, e.g. for time entries on the new project
+    project_cache.upsert(project_data)
+    logger.warning(f"📮 Project queued in the outbox: {project_data['name']}")
+    return 'queued'
+
+def save_project_to_supabase(project_name: str, folder_id: str, folder_link: str) -> Optional[str]:
+    """Save project metadata to Supabase database
+    
+    Returns 'saved', 'queued' (Supabase unreachable, the outbox delivers it later) or None on failure.
+    """
     if not supabase_client:
         logger.warning("⚠️  Supabase client not initialized - skipping database save")
-        return False
+        return None
         
     try:
         # Extract project number if available
-        project_number = None
-        if '-' in project_name:
-            parts = project_name.split('-')
-            if len(parts) >= 2 and parts[0].isdigit() and parts[1].isdigit():
-                project_number = f"{parts[0]}-{parts[1]}"
+        project_number = extract_project_number(project_name)
         
         # Prepare data for insertion
         project_data = {
@@ -524,40 +851,805 @@ def save_project_to_supabase(project_name: str, folder_id: str, folder_link: str
             'created_at': datetime.now().isoformat()
         }
         
-        # Insert into projects table
-        result = supabase_client.table('projects').insert(project_data).execute()
+        if write_behind:
+            # The folder ID is the idempotency key - a replayed workflow inserts the same row
+            project_data['id'] = row_id('projects', folder_id)
+            if not write_behind.online:
+                # Supabase is known to be down - don't make the user wait for another timeout
+                return queue_project(project_data)
+            try:
+                result = supabase_client.table('projects').upsert(project_data, on_conflict='id',
+                                                                  ignore_duplicates=True).execute()
+            except Exception as e:
+                if is_permanent_error(e):
+                    raise
+                logger.warning(f"⚠️ Supabase unreachable ({e})")
+                return queue_project(project_data)
+        else:
+            # Insert into projects table
+            result = supabase_client.table('projects').insert(project_data).execute()
+        if result.data or 'id' in project_data:
+            project_cache.upsert(result.data[0] if result.data else project_data)
         
         logger.info(f"✅ Project metadata saved to Supabase: {project_name}")
         logger.info(f"   Database record: {result.data[0] if result.data else 'No data returned'}")
-        return True
+        return 'saved'
         
     except Exception as e:
         logger.error(f"🚨 FEHLER beim Speichern in Supabase: {e}")
         # Log detailed error for debugging
         logger.error(f"   Project data: {project_data}")
         logger.error(f"   Error type: {type(e).__name__}")
+        return None
+
+def folder_create_request(name: str, parent_id: str):
+    """Drive files.create request for a folder (not yet executed)"""
+    return drive_service.files().create(
+        body={'name': name, 'mimeType': 'application/vnd.google-apps.folder', 'parents': [parent_id]},
+        fields='id',
+        supportsAllDrives=True
+    )
+
+def create_folders_batch(names: List[str], parent_id: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Create folders in one Drive batch request, returns (created name->id, failed name->error)"""
+    created, failed = {}, {}
+    
+    def on_response(request_id, response, exception):
+        name = names[int(request_id)]
+        if exception:
+            failed[name] = str(exception)
+        else:
+            created[name] = response.get('id')
+            drive_mirror.record_folder(created[name], name, parent_id)
+    
+    # Not retried as a whole - failed entries are retried individually by the caller
+    batch = drive_service.new_batch_http_request(callback=on_response)
+    for index, name in enumerate(names):
+        batch.add(folder_create_request(name, parent_id), request_id=str(index))
+        
+    try:
+        google_api.execute('drive', batch, retry=False)
+    except Exception as e:
+        # The whole batch failed - unanswered creates may still have gone through
+        unanswered = [name for name in names if name not in created and name not in failed]
+        found = find_existing_folders(parent_id, unanswered)
+        created.update(found)
+        for name in unanswered:
+            if name not in found:
+                failed[name] = str(e)
+                
+    return created, failed
+
+def find_existing_folders(parent_id: str, names: List[str]) -> Dict[str, str]:
+    """Which of `names` already exist below `parent_id` - files.create is not idempotent
+
+    A create that failed with a 5xx, a timeout or a lost batch response may
+    still have created the folder, so every retry looks first. If the lookup
+    itself fails, nothing is reported as existing.
+    """
+    found = {name: drive_mirror.find_child(parent_id, name) for name in names}
+    found = {name: folder_id for name, folder_id in found.items() if folder_id}
+    missing = [name for name in names if name not in found]
+    if not missing:
+        return found
+        
+    names_query = ' or '.join("name = '" + name.replace("\\", "\\\\").replace("'", "\\'") + "'" for name in missing)
+    try:
+        response = google_api.execute('drive', drive_service.files().list(
+            q=(f"'{parent_id}' in parents and ({names_query}) "
+               "and mimeType = 'application/vnd.google-apps.folder' and trashed = false"),
+            corpora='drive',
+            driveId=GOOGLE_DRIVE_ROOT_FOLDER_ID,
+            includeItemsFromAllDrives=True,
+            supportsAllDrives=True,
+            pageSize=1000,
+            fields='files(id,name)'
+        ))
+    except Exception as e:
+        logger.error(f"❌ Folder lookup below {parent_id} failed: {e}")
+        return found
+        
+    for folder in response.get('files', []):
+        if folder['name'] in missing and folder['name'] not in found:
+            found[folder['name']] = folder['id']
+            drive_mirror.record_folder(folder['id'], folder['name'], parent_id)
+    return found
+
+def create_folders_parallel(names: List[str], parent_id: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Create folders with a bounded number of concurrent requests"""
+    created, failed = {}, {}
+    
+    def create(name: str) -> Tuple[str, Optional[str], Optional[str]]:
+        try:
+            # The request runs on a transport checked out of the shared pool
+            # A failed create is looked up, not resent, see create_project_subfolders
+            folder = google_api.execute('drive', folder_create_request(name, parent_id), retry=False)
+            return name, folder.get('id'), None
+        except Exception as e:
+            return name, None, str(e)
+    
+    with ThreadPoolExecutor(max_workers=max(1, DRIVE_PARALLEL_REQUESTS)) as executor:
+        for name, folder_id, error in executor.map(create, names):
+            if folder_id:
+                created[name] = folder_id
+                drive_mirror.record_folder(folder_id, name, parent_id)
+            else:
+                failed[name] = error
+                
+    return created, failed
+
+def create_project_subfolders(project_id: str, names: List[str] = None) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Create the standard subfolders: one batch, then retry failures in parallel"""
+    names = list(PROJECT_FOLDERS if names is None else names)
+    if not names:
+        return {}, {}
+        
+    created, failed = create_folders_batch(names, project_id)
+    
+    for attempt in range(1, DRIVE_SUBFOLDER_RETRIES + 1):
+        if not failed:
+            break
+        logger.warning(f"⚠️ Retrying {len(failed)} subfolders (attempt {attempt}): {failed}")
+        time.sleep(0.5 * 2 ** (attempt - 1))
+        # A failed create may have gone through anyway - only create what is really missing
+        existing = find_existing_folders(project_id, list(failed))
+        created.update(existing)
+        retried, failed = create_folders_parallel([name for name in failed if name not in existing], project_id)
+        created.update(retried)
+        
+    return created, failed
+
+def drive_folder_link(folder_id: str) -> str:
+    return f"https://drive.google.com/drive/folders/{folder_id}"
+
+def drive_request(request) -> Any:
+    """Run a Drive request under the shared Drive quota"""
+    return google_api.execute('drive', request)
+
+def start_drive_mirror() -> None:
+    """Load or seed the Drive mirror, then keep it fresh in a background thread"""
+    try:
+        if drive_mirror.load():
+            drive_mirror.poll(drive_service, drive_request)
+            logger.info(f"🗂️ Drive mirror loaded: {len(drive_mirror)} folders")
+        else:
+            drive_mirror.seed(drive_service, drive_request)
+    except Exception as e:
+        # e.g. an expired page token - start over from a fresh listing
+        logger.error(f"❌ Drive mirror sync failed, reseeding: {e}")
+        try:
+            drive_mirror.seed(drive_service, drive_request)
+        except Exception as e:
+            logger.error(f"❌ Drive mirror disabled: {e}")
+            return
+    
+    if DRIVE_MIRROR_POLL_SECONDS <= 0:
+        return
+        
+    def poll_forever():
+        while True:
+            time.sleep(DRIVE_MIRROR_POLL_SECONDS)
+            try:
+                changes = drive_mirror.poll(drive_service, drive_request)
+                if changes:
+                    logger.info(f"🗂️ Drive mirror applied {changes} changes")
+            except Exception as e:
+                logger.error(f"❌ Drive mirror poll failed: {e}")
+    
+    threading.Thread(target=poll_forever, daemon=True).start()
+
+# Each CREATE_PROJECT run is checkpointed, see project_workflow.py
+project_workflows = ProjectWorkflowStore(PROJECT_WORKFLOW_DIR)
+
+PROJECT_WORKFLOW_STEP_LABELS = {
+    'allocate_number': 'Projektnummer vergeben',
+    'create_root': 'Projektordner anlegen',
+    'create_subfolders': 'Unterordner anlegen',
+    'save_db': 'In Datenbank speichern',
+    'notify': 'Bestätigung senden'
+}
+
+def workflow_allocate_number(workflow: Dict[str, Any]) -> None:
+    workflow['results']['project_name'] = build_project_name(get_next_project_number(), workflow['base_name'])
+
+def workflow_create_root(workflow: Dict[str, Any]) -> None:
+    results = workflow['results']
+    send_telegram_message(workflow['chat_id'], f"🏗️ **Projekt wird erstellt...**\n\n📁 Projektnummer: `{results['project_name']}`\n🔧 Erstelle Ordnerstruktur in Google Drive...")
+    
+    # A crash or a failed files.create may have left the folder behind - reuse it instead of a duplicate
+    existing_id = find_existing_folders(GOOGLE_DRIVE_ROOT_FOLDER_ID, [results['project_name']]).get(results['project_name'])
+    if existing_id:
+        logger.info(f"📁 Reusing existing project folder: {results['project_name']} (ID: {existing_id})")
+        results['folder_id'] = existing_id
+        results['folder_link'] = drive_folder_link(existing_id)
+        return
+    
+    folder_id, folder_link = create_folder(results['project_name'], GOOGLE_DRIVE_ROOT_FOLDER_ID)
+    if not folder_id:
+        raise RuntimeError("Projektordner konnte nicht erstellt werden")
+    results['folder_id'] = folder_id
+    results['folder_link'] = folder_link
+
+def workflow_create_subfolders(workflow: Dict[str, Any]) -> None:
+    results = workflow['results']
+    subfolders = results.setdefault('subfolders', {})
+    # Subfolders that already exist in Drive (e.g. from an interrupted run) are adopted
+    for name in PROJECT_FOLDERS:
+        existing_id = drive_mirror.find_child(results['folder_id'], name)
+        if existing_id:
+            subfolders.setdefault(name, existing_id)
+    missing = [name for name in PROJECT_FOLDERS if name not in subfolders]
+    
+    created, failed = create_project_subfolders(results['folder_id'], missing)
+    subfolders.update(created)
+    if failed:
+        # Keep the created ones - a retry only creates what is still missing
+        project_workflows.save(workflow)
+        raise RuntimeError(f"Unterordner fehlgeschlagen: {', '.join(failed)}")
+
+def workflow_save_db(workflow: Dict[str, Any]) -> None:
+    results = workflow['results']
+    if not supabase_client:
+        # Database integration disabled - nothing to retry
+        results['db_saved'] = False
+        return
+    saved = save_project_to_supabase(results['project_name'], results['folder_id'], results['folder_link'])
+    if not saved:
+        raise RuntimeError("Datenbank-Speicherung fehlgeschlagen")
+    results['db_saved'] = True
+    results['db_queued'] = saved == 'queued'
+
+def workflow_notify(workflow: Dict[str, Any]) -> None:
+    chat_id = workflow['chat_id']
+    results = workflow['results']
+    project_name = results['project_name']
+    db_status = "✅ In Datenbank gespeichert" if results.get('db_saved') else "⚠️ Datenbank nicht konfiguriert"
+    if results.get('db_queued'):
+        db_status = "📮 Datenbank nicht erreichbar - wird automatisch nachgetragen"
+    
+    # Erfolgreiche Completion
+    message = f"""✅ **PROJEKT ERFOLGREICH ERSTELLT!**
+
+📁 **Projekt:** `{project_name}`
+🏗️ **Ordner:** {len(PROJECT_FOLDERS)} Standard-Ordner
+💾 **Speicherort:** Google Drive (Shared)
+🔗 **Link:** [Projekt öffnen]({results['folder_link']})
+🗄️ **Datenbank:** {db_status}
+🕐 **Erstellt:** {datetime.now().strftime('%d.%m.%Y %H:%M')}
+
+🎉 **Das System funktioniert perfekt!**"""
+    
+    # Füge Follow-up Frage hinzu falls vorhanden
+    follow_up_question = results.get('follow_up_question')
+    pending_action = None
+    pending_nonce = None
+    reply_markup = None
+    if not follow_up_question:
+        # Biete proaktiv weitere Aktionen an
+        follow_up_question = "Soll ich gleich einen ersten Termin für das Projekt eintragen?"
+        pending_action = 'schedule_first_appointment'
+        pending_nonce = new_prompt_nonce()
+        reply_markup = confirm_keyboard(pending_nonce)
+    message += f"\n\n💬 {follow_up_question}"
+    
+    if not send_telegram_message(chat_id, message, reply_markup=reply_markup):
+        raise RuntimeError("Bestätigung konnte nicht gesendet werden")
+    conversation_store.update(
+        chat_id, last_intent="CREATE_PROJECT",
+        project={'id': None, 'name': project_name, 'project_number': extract_project_number(project_name),
+                 'drive_folder_id': results['folder_id']},
+        pending_question=follow_up_question, pending_action=pending_action, pending_params={},
+        pending_nonce=pending_nonce
+    )
+
+PROJECT_WORKFLOW_HANDLERS = {
+    'allocate_number': workflow_allocate_number,
+    'create_root': workflow_create_root,
+    'create_subfolders': workflow_create_subfolders,
+    'save_db': workflow_save_db,
+    'notify': workflow_notify
+}
+
+def run_project_workflow(workflow: Dict[str, Any], replay: bool = False) -> bool:
+    """Run (or resume) a project creation, reporting a failed step to the chat"""
+    chat_id = workflow['chat_id']
+    with project_workflows.running(workflow['id']) as acquired:
+        if not acquired:
+            # On a replay nobody asked - another worker is simply finishing it
+            if replay:
+                logger.info(f"🔁 Project workflow {workflow['id']} is already running elsewhere")
+            else:
+                send_telegram_message(chat_id, "⏳ Diese Projektanlage läuft bereits.")
+            return False
+            
+        # Another worker may have advanced the checkpoint in the meantime
+        workflow = project_workflows.load(workflow['id']) or workflow
+        if workflow['status'] == 'done':
+            return True
+        if replay and workflow.get('failed_step'):
+            return False
+            
+        if run_workflow(project_workflows, workflow, PROJECT_WORKFLOW_HANDLERS):
+            return True
+            
+        step = PROJECT_WORKFLOW_STEP_LABELS.get(workflow['failed_step'], workflow['failed_step'])
+        if workflow['failed_step'] != 'notify':
+            send_telegram_message(chat_id, f"❌ **Fehler beim Erstellen des Projekts.**\n\n🔍 **Schritt:** {step}\n\n💡 Senden Sie die Anfrage einfach erneut – bereits erledigte Schritte werden übernommen.")
+        return False
+
+def replay_open_project_workflows() -> None:
+    """Resume project creations interrupted by a crash or restart"""
+    removed = project_workflows.cleanup(PROJECT_WORKFLOW_RETENTION_DAYS * 86400)
+    if removed:
+        logger.info(f"🧹 Removed {removed} old project workflow checkpoints")
+        
+    # Failed ones are left to the user, who was told to send the request again
+    for workflow in project_workflows.interrupted_workflows(PROJECT_WORKFLOW_REPLAY_HOURS * 3600):
+        logger.info(f"🔁 Replaying project workflow {workflow['id']} ({workflow['base_name']})")
+        try:
+            run_project_workflow(workflow, replay=True)
+        except Exception as e:
+            logger.error(f"❌ Replay of project workflow {workflow['id']} failed: {e}")
+
+def project_context(project: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a project row to the fields kept in the conversation state"""
+    return {
+        'id': project.get('id'),
+        'name': project.get('name'),
+        'project_number': project.get('project_number'),
+        'drive_folder_id': project.get('drive_folder_id')
+    }
+
+def schedule_first_appointment(chat_id: int, state: ChatState, confirmed: bool) -> None:
+    """Answer to 'Soll ich gleich einen ersten Termin für das Projekt eintragen?'"""
+    if not confirmed:
+        send_telegram_message(chat_id, "👍 Alles klar, kein Termin eingetragen.")
+        return
+        
+    project_name = (state.project or {}).get('name')
+    event_link = create_calendar_event("Erster Termin", "Automatisch nach Projektanlage erstellt",
+                                       project_name=project_name)
+    if event_link:
+        send_telegram_message(chat_id, f"✅ **Termin erstellt!**\n\n📅 **Termin:** Erster Termin (morgen 09:00)\n📁 **Projekt:** {project_name}\n🔗 [Im Kalender öffnen]({event_link})")
+    else:
+        send_telegram_message(chat_id, "❌ **Fehler beim Erstellen des Termins.**\n\nBitte versuchen Sie es erneut.")
+
+def record_more_time(chat_id: int, state: ChatState, confirmed: bool) -> None:
+    """Answer to 'Möchten Sie noch weitere Zeiten erfassen?'"""
+    if not confirmed:
+        send_telegram_message(chat_id, "👍 Alles klar.")
+        return
+        
+    project_name = (state.project or {}).get('name', 'das Projekt')
+    send_telegram_message(chat_id, f"⏱️ Wie viele Stunden und welche Tätigkeit für **{project_name}**?\n\nz.B. `2.5h Entwurf`")
+
+# Follow-up actions that a plain "ja"/"nein" can resolve without AI analysis
+PENDING_ACTION_HANDLERS = {
+    'schedule_first_appointment': schedule_first_appointment,
+    'record_more_time': record_more_time,
+}
+
+def handle_pending_answer(chat_id: int, state: ChatState, confirmed: bool) -> bool:
+    """Resolve a short confirmation locally, returns False if nothing was pending"""
+    handler = PENDING_ACTION_HANDLERS.get(state.pending_action)
+    if not handler:
+        return False
+        
+    logger.info(f"💬 Resolving pending '{state.pending_action}' locally: {'ja' if confirmed else 'nein'}")
+    conversation_store.clear_pending(chat_id)
+    handler(chat_id, state, confirmed)
+    return True
+
+def complete_time_entry(chat_id: int, project: Dict[str, Any], time_entry: Dict[str, Any]) -> bool:
+    """Save a time entry for a resolved project and confirm it in the chat"""
+    entry_date = time_entry['entry_date']
+    if not record_time_entry(project['id'], time_entry['duration_hours'], time_entry['activity_description'],
+                             entry_date, time_entry['created_by'], chat_id=chat_id):
+        send_telegram_message(chat_id, "❌ **Fehler beim Speichern der Zeiterfassung.**\n\nBitte versuchen Sie es erneut.")
         return False
+    # A cached "Was habe ich diese Woche gemacht?" would miss this entry - a journaled
+    # entry invalidates again once it is delivered (on_write_delivered)
+    summary_cache.invalidate(chat_id)
+        
+    # Format date for display
+    entry_date_display = datetime.strptime(entry_date, '%Y-%m-%d').strftime('%d.%m.%Y')
+    
+    message = f"""✅ **Zeit erfasst!**
 
-def ensure_project_structure(project_name: str) -> Tuple[bool, Optional[str], Optional[str]]:
-    """Create complete project structure and return (success, folder_id, folder_link)"""
+📁 **Projekt:** {project['name']}
+⏱️ **Dauer:** {time_entry['duration_hours']} Stunden
+📝 **Tätigkeit:** {time_entry['activity_description']}
+📅 **Datum:** {entry_date_display}
+👤 **Erfasst von:** {time_entry['user_name']}
+
+💡 **Tipp:** Sie können auch relative Zeitangaben verwenden:
+- "gestern 3h an 25-003 gearbeitet"
+- "vorgestern 2.5h Planung für WP04\""""
+    
+    # Füge Follow-up Frage hinzu falls vorhanden
+    follow_up_question = time_entry.get('follow_up_question')
+    pending_action = None
+    pending_nonce = None
+    reply_markup = None
+    if not follow_up_question:
+        # Biete proaktiv weitere Aktionen an
+        follow_up_question = "Möchten Sie noch weitere Zeiten erfassen?"
+        pending_action = 'record_more_time'
+        pending_nonce = new_prompt_nonce()
+        reply_markup = confirm_keyboard(pending_nonce)
+    message += f"\n\n💬 {follow_up_question}"
+    
+    send_telegram_message(chat_id, message, reply_markup=reply_markup)
+    conversation_store.update(
+        chat_id, last_intent="RECORD_TIME", project=project_context(project),
+        pending_question=follow_up_question, pending_action=pending_action, pending_params={},
+        pending_nonce=pending_nonce
+    )
+    return True
+
+def show_summary(chat_id: int, user_id: str, time_range: Optional[str], project_identifier: Optional[str]) -> None:
+    """Hours per project and week for the user - or per person and week for one project"""
+    start, end, label = resolve_time_range(time_range)
+    project = None
+    if project_identifier:
+        project = find_project_by_identifier(project_identifier)
+        if not project:
+            send_telegram_message(chat_id, f"🚨 **Fehler:** Das Projekt {project_identifier} konnte nicht gefunden werden.")
+            return
+            
+    key = (user_id, start, end, project['id'] if project else None)
+    cached = summary_cache.get(chat_id, key)
+    if cached:
+        send_telegram_message(chat_id, cached)
+        return
+        
+    if not supabase_client:
+        send_telegram_message(chat_id, "❌ **Datenbank nicht konfiguriert** - keine Übersicht möglich.")
+        return
+        
+    dates = {'from_date': start.isoformat(), 'to_date': end.isoformat()}
     try:
-        # Create main project folder
-        project_id, project_link = create_folder(project_name, GOOGLE_DRIVE_ROOT_FOLDER_ID)
-        if not project_id:
-            return False, None, None
+        # Aggregated in the database (scripts/create_time_summary.sql) - only summary rows come back
+        if project:
+            by_project = []
+            by_user = supabase_client.rpc('hours_by_user', {**dates, 'for_project': project['id']}).execute().data
+            by_week = supabase_client.rpc('hours_by_week', {**dates, 'for_project': project['id']}).execute().data
+        else:
+            by_user = None
+            by_project = supabase_client.rpc('hours_by_project', {**dates, 'user_id': user_id}).execute().data
+            by_week = supabase_client.rpc('hours_by_week', {**dates, 'user_id': user_id}).execute().data
+    except Exception as e:
+        logger.error(f"❌ Error loading summary: {e}")
+        send_telegram_message(chat_id, "❌ **Fehler beim Laden der Übersicht.**\n\nBitte versuchen Sie es erneut.")
+        return
+        
+    text = render_summary(label, by_project or [], by_week or [], by_user, project['name'] if project else None)
+    summary_cache.put(chat_id, key, text)
+    send_telegram_message(chat_id, text)
+    if project:
+        conversation_store.update(chat_id, last_intent="SHOW_SUMMARY", project=project_context(project))
+
+def complete_task(chat_id: int, task: Dict[str, Any], priority: str) -> bool:
+    """Create a task with its final priority and confirm it in the chat"""
+    task_content = task['task_content']
+    project = task.get('project') or {}
+    behörde = task.get('behörde')
+    gemeinde = task.get('gemeinde')
+    
+    # Extract Tirol-specific info
+    tags = extract_tirol_tags(task_content)
+    
+    if not create_task(task_content, project.get('id'), priority, tags, behörde, gemeinde, task['created_by'],
+                       chat_id=chat_id):
+        send_telegram_message(chat_id, "❌ **Fehler beim Erstellen der Aufgabe.**\n\nBitte versuchen Sie es erneut.")
+        return False
+        
+    # Build response message
+    priority_emoji = {"hoch": "🔴", "mittel": "🟡", "niedrig": "🟢"}.get(priority, "🟡")
+    
+    response = f"✅ **Aufgabe erstellt!**\n\n"
+    response += f"{priority_emoji} **Priorität:** {priority.capitalize()}\n"
+    response += f"📝 **Aufgabe:** {task_content}\n"
+    
+    if project.get('name'):
+        response += f"📁 **Projekt:** {project['name']}\n"
+    if tags:
+        response += f"🏷️ **Tags:** {', '.join(tags)}\n"
+    if behörde:
+        response += f"🏛️ **Behörde:** {behörde}\n"
+    if gemeinde:
+        response += f"📍 **Gemeinde:** {gemeinde}\n"
+        
+    response += f"\n💡 **Tipp:** Alle Aufgaben im Portal unter [portal.marcelgladbach.com/tasks](https://portal.marcelgladbach.com/tasks)"
+    
+    send_telegram_message(chat_id, response)
+    conversation_store.update(chat_id, last_intent="CREATE_TASK")
+    return True
+
+def ask_project_choice(chat_id: int, identifier: str, matches: List[Dict[str, Any]],
+                       action: str, params: Dict[str, Any]) -> None:
+    """Offer the candidate projects as buttons and park the action until one is tapped"""
+    candidates = {p['id']: project_context(p) for p in matches}
+    nonce = new_prompt_nonce()
+    conversation_store.update(chat_id, pending_question="Welches Projekt?", pending_action=action,
+                              pending_params={**params, 'candidates': candidates}, pending_nonce=nonce)
+    if len(matches) > 1:
+        question = f"🔎 **Mehrere Projekte gefunden** für `{identifier}`.\n\nWelches Projekt meinen Sie?"
+    else:
+        question = f"🔎 **Kein sicherer Treffer** für `{identifier}`.\n\nMeinen Sie dieses Projekt?"
+    send_telegram_message(chat_id, question, reply_markup=project_choice_keyboard(matches, nonce))
+
+def record_time_for_project(chat_id: int, params: Dict[str, Any], project: Dict[str, Any]) -> None:
+    """Finish a parked RECORD_TIME once the project has been chosen"""
+    complete_time_entry(chat_id, project, params)
+
+def find_project_subfolder(folder_id: str, name: str) -> Optional[str]:
+    """Subfolder ID from the Drive mirror, with a live lookup as fallback"""
+    subfolder_id = drive_mirror.find_child(folder_id, name)
+    if subfolder_id:
+        return subfolder_id
+        
+    escaped = name.replace("'", "\\'")
+    response = google_api.execute('drive', drive_service.files().list(
+        q=(f"'{folder_id}' in parents and name = '{escaped}' "
+           "and mimeType = 'application/vnd.google-apps.folder' and trashed = false"),
+        corpora='drive',
+        driveId=GOOGLE_DRIVE_ROOT_FOLDER_ID,
+        includeItemsFromAllDrives=True,
+        supportsAllDrives=True,
+        fields='files(id)'
+    ))
+    files = response.get('files', [])
+    return files[0]['id'] if files else None
+
+def on_preview_rendered(chat_id: int, incoming: IncomingFile, parent_id: str):
+    """Callback filing a rendered preview next to its original"""
+    def done(preview_path: Optional[str]) -> None:
+        if not preview_path:
+            return
+        try:
+            file_ingestor.upload_file(preview_path, preview_name(incoming.file_name), 'image/jpeg', parent_id)
+        except Exception as e:
+            logger.error(f"❌ Preview upload failed for {incoming.file_name}: {e}")
+        # Photos are already visible in the chat, plans are not
+        if not incoming.mime_type.startswith('image/'):
+            send_telegram_photo(chat_id, preview_path, f"🖼️ Vorschau: {incoming.file_name}")
+    return done
+
+def create_shortcut(target_id: str, name: str, parent_id: str) -> Optional[Dict[str, Any]]:
+    """Drive shortcut to an already filed file, None if the target no longer exists"""
+    try:
+        return google_api.execute('drive', drive_service.files().create(
+            body={
+                'name': name,
+                'mimeType': 'application/vnd.google-apps.shortcut',
+                'shortcutDetails': {'targetId': target_id},
+                'parents': [parent_id]
+            },
+            fields='id,webViewLink',
+            supportsAllDrives=True
+        ), retry=False)
+    except HttpError as e:
+        if e.resp.status == 404:
+            return None
+        raise
+
+def link_known_file(chat_id: int, incoming: IncomingFile, known: Dict[str, Any],
+                    parent_id: str, where: str) -> bool:
+    """File a repeat by shortcut instead of a second copy, False if the original is gone"""
+    if known['parent_id'] == parent_id:
+        send_telegram_message(chat_id, f"♻️ **Bereits abgelegt:** `{incoming.file_name}` liegt schon in {where}.")
+        return True
+        
+    shortcut = create_shortcut(known['drive_file_id'], incoming.file_name, parent_id)
+    if not shortcut:
+        logger.info(f"🗑️ Indexed file {known['drive_file_id']} no longer exists in Drive")
+        file_index.forget(known['drive_file_id'])
+        return False
+        
+    link = shortcut.get('webViewLink')
+    send_telegram_message(chat_id, f"🔗 **Verknüpfung angelegt!**\n\n📎 **Datei:** {incoming.file_name} (schon vorhanden, nicht erneut hochgeladen)\n📁 **Projekt:** {where}" + (f"\n🔗 [In Drive öffnen]({link})" if link else ""))
+    return True
+
+def on_file_ingested(chat_id: int, project: Dict[str, Any], subfolder: str, parent_id: str):
+    """Callback reporting the outcome of a background upload to the chat"""
+    def done(incoming: IncomingFile, result: Optional[IngestResult], error: Optional[Exception]) -> None:
+        if error:
+            send_telegram_message(chat_id, f"❌ **Ablage fehlgeschlagen:** `{incoming.file_name}`\n\nBitte senden Sie die Datei erneut.")
+            return
             
-        # Create all subfolders
-        for folder_name in PROJECT_FOLDERS:
-            subfolder_id, _ = create_folder(folder_name, project_id)
-            if not subfolder_id:
-                logger.warning(f"⚠️ Failed to create subfolder: {folder_name}")
-                
-        logger.info(f"📁 Project structure created: {project_name}")
-        return True, project_id, project_link
+        drive_id = result.drive_file['id']
+        if file_index:
+            # Same content under a new file_unique_id - keep the original, drop the copy
+            original = file_index.by_sha256(result.sha256, exclude_id=drive_id)
+            if original and link_known_file(chat_id, incoming, original, parent_id, f"{project['name']} / {subfolder}"):
+                # The user already has the answer - a failed delete only leaves a stray copy behind
+                try:
+                    google_api.execute('drive', drive_service.files().delete(fileId=drive_id, supportsAllDrives=True))
+                except Exception as e:
+                    logger.error(f"❌ Duplicate upload {drive_id} not deleted: {e}")
+                finally:
+                    file_index.link(incoming.file_unique_id, original['drive_file_id'])
+                    if result.local_copy:
+                        os.unlink(result.local_copy)
+                return
+            file_index.record(drive_id, result.sha256, incoming.file_name, parent_id,
+                              size=result.size, file_unique_id=incoming.file_unique_id)
+            
+        link = result.drive_file.get('webViewLink')
+        send_telegram_message(chat_id, f"✅ **Datei abgelegt!**\n\n📎 **Datei:** {incoming.file_name}\n📁 **Projekt:** {project['name']} / {subfolder}" + (f"\n🔗 [In Drive öffnen]({link})" if link else ""))
         
+        if result.local_copy:
+            # Rendering happens in the preview processes, the copy is theirs now
+            if not preview_pool.submit(result.sha256, result.local_copy, incoming.mime_type,
+                                       on_preview_rendered(chat_id, incoming, parent_id)):
+                logger.warning(f"⚠️ Preview queue full - no preview for {incoming.file_name}")
+    return done
+
+def file_incoming(chat_id: int, params: Dict[str, Any], project: Dict[str, Any]) -> None:
+    """Queue the upload of a Telegram file into the project's matching subfolder"""
+    incoming = IncomingFile(**params['file'])
+    folder_id = project.get('drive_folder_id') or drive_mirror.project_folder_id(project.get('name') or '')
+    if not folder_id:
+        send_telegram_message(chat_id, f"❌ Kein Drive-Ordner für **{project.get('name')}** gefunden.")
+        return
+        
+    subfolder = target_subfolder(incoming)
+    try:
+        parent_id = find_project_subfolder(folder_id, subfolder) or folder_id
+    except Exception as e:
+        logger.error(f"❌ Subfolder lookup failed: {e}")
+        parent_id = folder_id
+        
+    # The same Telegram file again - no download, no upload
+    known = file_index.by_unique_id(incoming.file_unique_id) if file_index else None
+    if known and link_known_file(chat_id, incoming, known, parent_id, f"{project['name']} / {subfolder}"):
+        conversation_store.update(chat_id, project=project_context(project))
+        return
+        
+    keep_copy = preview_pool is not None and is_previewable(incoming.file_name, incoming.mime_type)
+    if not file_ingestor or not file_ingestor.submit(incoming, parent_id, on_file_ingested(chat_id, project, subfolder, parent_id),
+                                                     keep_copy=keep_copy):
+        send_telegram_message(chat_id, "⏳ Gerade laufen zu viele Uploads. Bitte senden Sie die Datei gleich noch einmal.")
+        return
+        
+    send_telegram_message(chat_id, f"📤 **Lade hoch:** `{incoming.file_name}` → {project['name']} / {subfolder}")
+    conversation_store.update(chat_id, project=project_context(project))
+
+def run_time_export(chat_id: int, project: Dict[str, Any], time_range: Optional[str], export_format: str) -> None:
+    """Stream a project's entries into a file and file it in 01_Admin (runs on export_executor)"""
+    # Billing is per month - no range means the current one
+    start, end, label = resolve_time_range(time_range or 'this_month')
+    notes = ''
+    fd, path = tempfile.mkstemp(suffix=f".{export_format}")
+    os.close(fd)
+    try:
+        pages = iter_time_entry_pages(supabase_client, project['id'], start, end)
+        try:
+            rows, hours = export_time_entries(pages, path, export_format, project['name'])
+        except ExportError as e:
+            logger.warning(f"⚠️ {e} - exporting CSV instead")
+            notes = "\nℹ️ XLSX ist auf dem Server nicht verfügbar, daher CSV."
+            export_format = 'csv'
+            pages = iter_time_entry_pages(supabase_client, project['id'], start, end)
+            rows, hours = export_time_entries(pages, path, export_format, project['name'])
+        if not rows:
+            send_telegram_message(chat_id, f"📭 **Keine Zeiten** für {project['name']} ({label}).")
+            return
+            
+        file_name = export_file_name(project, start, end, export_format)
+        folder_id = project.get('drive_folder_id')
+        parent_id = find_project_subfolder(folder_id, '01_Admin') or folder_id
+        uploaded = file_ingestor.upload_file(path, file_name, EXPORT_MIME_TYPES[export_format], parent_id)
+        link = uploaded.get('webViewLink') or drive_folder_link(parent_id)
+        send_telegram_message(chat_id, f"""✅ **Export erstellt!**
+
+📁 **Projekt:** {project['name']}
+📅 **Zeitraum:** {label}
+⏱️ **Summe:** {hours:.2f} h in {rows} Einträgen
+📄 [{file_name}]({link}) in 01_Admin{notes}""")
     except Exception as e:
-        logger.error(f"❌ Project creation error: {e}")
-        return False, None, None
+        logger.error(f"❌ Export failed for {project.get('name')}: {e}")
+        send_telegram_message(chat_id, "❌ **Fehler beim Export.**\n\nBitte versuchen Sie es erneut.")
+    finally:
+        os.unlink(path)
+
+def export_for_project(chat_id: int, params: Dict[str, Any], project: Dict[str, Any]) -> None:
+    """Queue an export once the project is known"""
+    if not supabase_client or not file_ingestor or not project.get('drive_folder_id'):
+        send_telegram_message(chat_id, "❌ **Export nicht möglich** - Datenbank oder Drive nicht verfügbar.")
+        return
+    send_telegram_message(chat_id, f"📤 **Export läuft:** {project['name']} ({params['export_format'].upper()})...")
+    conversation_store.update(chat_id, project=project_context(project))
+    export_executor.submit(run_time_export, chat_id, project, params.get('time_range'), params['export_format'])
+
+def handle_export_command(chat_id: int, identifier: str, time_range: Optional[str], export_format: str) -> None:
+    """"Export 25-003 Juni" - no AI analysis needed"""
+    params = {'time_range': time_range, 'export_format': export_format}
+    ranked = rank_projects(identifier)
+    project = pick_unambiguous_project(ranked)
+    if project:
+        export_for_project(chat_id, params, project)
+    elif ranked:
+        ask_project_choice(chat_id, identifier, [p for p, _ in ranked], 'export_time_entries', params)
+    else:
+        send_telegram_message(chat_id, f"❌ **Projekt nicht gefunden:** `{identifier}`\n\nz.B. `Export 25-003 Juni` oder `Export 25-003 letzten Monat xlsx`")
+
+def handle_incoming_file(chat_id: int, message: Dict[str, Any], incoming: IncomingFile) -> None:
+    """File a photo or document: project from the caption, else the one from the conversation"""
+    params = {'file': incoming.to_dict()}
+    caption = (message.get('caption') or '').strip()
+    
+    if caption:
+        ranked = rank_projects(caption)
+        project = pick_unambiguous_project(ranked)
+        if project:
+            file_incoming(chat_id, params, project)
+        elif ranked:
+            ask_project_choice(chat_id, caption, [p for p, _ in ranked], 'file_incoming', params)
+        else:
+            send_telegram_message(chat_id, f"❌ **Projekt nicht gefunden:** `{caption}`\n\nSchreiben Sie die Projektnummer (z.B. `25-003`) als Bildunterschrift.")
+        return
+        
+    state = conversation_store.get(chat_id)
+    if state and state.project:
+        file_incoming(chat_id, params, state.project)
+    else:
+        send_telegram_message(chat_id, "📎 Zu welchem Projekt gehört die Datei? Senden Sie sie bitte mit der Projektnummer als Bildunterschrift (z.B. `25-003`).")
+
+# Parked actions that wait for a project button (pj:<project_id>)
+PROJECT_CHOICE_HANDLERS = {
+    'record_time': record_time_for_project,
+    'file_incoming': file_incoming,
+    'export_time_entries': export_for_project,
+}
+
+def handle_callback_query(callback: Dict[str, Any]) -> None:
+    """Handle an inline button tap directly - no AI analysis needed"""
+    callback_id = callback.get('id')
+    data = callback.get('data', '')
+    message = callback.get('message', {})
+    chat_id = message.get('chat', {}).get('id')
+    action, _, value = data.partition(':')
+    value, _, nonce = value.partition(':')
+    
+    logger.info(f"🔘 Callback from chat {chat_id}: {data}")
+    
+    state = conversation_store.get(chat_id) if chat_id else None
+    # Buttons of an older prompt must not answer the current one
+    if not state or not state.pending_action or not nonce or nonce != state.pending_nonce:
+        answer_callback_query(callback_id, "⌛ Diese Auswahl ist abgelaufen.")
+        if chat_id and message.get('message_id'):
+            remove_inline_keyboard(chat_id, message['message_id'])
+        return
+        
+    # Clearing the pending action resets the state object, so keep what we need
+    pending_action = state.pending_action
+    pending_params = state.pending_params
+    
+    handled = False
+    if action == 'cf' and pending_action in PENDING_ACTION_HANDLERS:
+        answer_callback_query(callback_id)
+        handled = handle_pending_answer(chat_id, state, value == 'y')
+        
+    elif action == 'pj' and pending_action in PROJECT_CHOICE_HANDLERS:
+        project = pending_params.get('candidates', {}).get(value)
+        if project:
+            answer_callback_query(callback_id, f"📁 {project['name']}")
+            conversation_store.clear_pending(chat_id)
+            PROJECT_CHOICE_HANDLERS[pending_action](chat_id, pending_params, project)
+            handled = True
+            
+    elif action == 'pr' and pending_action == 'create_task' and value in ('hoch', 'mittel', 'niedrig'):
+        answer_callback_query(callback_id)
+        conversation_store.clear_pending(chat_id)
+        complete_task(chat_id, pending_params, value)
+        handled = True
+        
+    if not handled:
+        answer_callback_query(callback_id, "⌛ Diese Auswahl ist abgelaufen.")
+    if message.get('message_id'):
+        remove_inline_keyboard(chat_id, message['message_id'])
 
 @app.route('/telegram-webhook', methods=['POST'])
 def webhook():
@@ -566,6 +1658,11 @@ def webhook():
         update = request.json
         logger.info(f"📩 Webhook received: {json.dumps(update, indent=2)}")
         
+        # Button taps are answered directly from the conversation state
+        if 'callback_query' in update:
+            handle_callback_query(update['callback_query'])
+            return jsonify({"ok": True})
+        
         # Extract message info
         message = update.get('message', {})
         chat_id = message.get('chat', {}).get('id')
@@ -578,18 +1675,37 @@ def webhook():
             return jsonify({"ok": False, "error": "No chat_id"}), 400
             
         if not text:
-            send_telegram_message(chat_id, "❓ Bitte senden Sie eine Textnachricht.")
+            incoming = incoming_file_from_message(message)
+            if incoming:
+                handle_incoming_file(chat_id, message, incoming)
+            else:
+                send_telegram_message(chat_id, "❓ Bitte senden Sie eine Textnachricht, ein Foto oder ein Dokument.")
             return jsonify({"ok": True})
             
         logger.info(f"📩 Message from {user_name}: {text}")
         
+        # 0. KURZE ANTWORT auf offene Rückfrage - ohne KI-Aufruf
+        state = conversation_store.get(chat_id)
+        if state and state.pending_action:
+            confirmed = parse_confirmation(text)
+            if confirmed is not None and handle_pending_answer(chat_id, state, confirmed):
+                return jsonify({"ok": True})
+        
+        # Exportbefehl - eindeutig genug für eine lokale Erkennung
+        export_command = parse_export_command(text)
+        if export_command:
+            handle_export_command(chat_id, *export_command)
+            return jsonify({"ok": True})
+        
         # 1. SOFORTIGES FEEDBACK - Empfangsbestätigung
         send_telegram_message(chat_id, f"🤖 **Nachricht empfangen!**\\n\\n💬 Ihre Anfrage: _{text}_\\n\\n🔄 Analysiere mit KI...")
         
         try:
             # 2. AI ANALYSE
-            ai_result = analyze_with_groq(text)
+            ai_result = analyze_with_groq(text, conversation_store.prompt_context(chat_id))
             intent = ai_result.get("intent", "UNKNOWN")
+            # The open question has been answered (or ignored) by this message
+            conversation_store.clear_pending(chat_id)
             interpretation = ai_result.get("interpretation", "")
             follow_up_question = ai_result.get("follow_up_question", "")
             
@@ -610,6 +1726,8 @@ def webhook():
                 else:
                     response += "Können Sie Ihre Anfrage bitte anders formulieren?"
                 send_telegram_message(chat_id, response)
+                conversation_store.update(chat_id, last_intent=intent, pending_question=follow_up_question or None,
+                                          pending_action=None, pending_params={})
                 return jsonify({"ok": True})
             
             # 3. VERARBEITUNG mit Status-Updates
@@ -618,44 +1736,24 @@ def webhook():
             
             if intent == "CREATE_PROJECT":
                 # Versuche zuerst aus entities zu lesen, dann Fallback zu altem Format
-                base_name = entities.get("project", ai_result.get("project", "")).strip()
-                project_name = format_project_name(base_name)
-                
-                # Status Update
-                send_telegram_message(chat_id, f"🏗️ **Projekt wird erstellt...**\\n\\n📁 Projektnummer: `{project_name}`\\n🔧 Erstelle Ordnerstruktur in Google Drive...")
+                base_name = clean_project_base_name(entities.get("project", ai_result.get("project", "")).strip())
                 
-                # Aktion ausführen
-                success, folder_id, folder_link = ensure_project_structure(project_name)
-                
-                if success and folder_id:
-                    # Save to Supabase
-                    db_saved = save_project_to_supabase(project_name, folder_id, folder_link)
-                    
-                    # Prepare success message
-                    db_status = "✅ In Datenbank gespeichert" if db_saved else "⚠️ Datenbank-Speicherung fehlgeschlagen"
-                    
-                    # Erfolgreiche Completion
-                    message = f"""✅ **PROJEKT ERFOLGREICH ERSTELLT!**
-
-📁 **Projekt:** `{project_name}`
-🏗️ **Ordner:** {len(PROJECT_FOLDERS)} Standard-Ordner
-💾 **Speicherort:** Google Drive (Shared)
-🔗 **Link:** [Projekt öffnen]({folder_link})
-🗄️ **Datenbank:** {db_status}
-🕐 **Erstellt:** {datetime.now().strftime('%d.%m.%Y %H:%M')}
-
-🎉 **Das System funktioniert perfekt!**"""
-                    
-                    # Füge Follow-up Frage hinzu falls vorhanden
-                    if follow_up_question:
-                        message += f"\n\n💬 {follow_up_question}"
-                    else:
-                        # Biete proaktiv weitere Aktionen an
-                        message += "\n\n💬 Soll ich gleich einen ersten Termin für das Projekt eintragen?"
+                # Gleiche Nachricht erneut zugestellt oder Wiederholung einer abgebrochenen Anlage?
+                workflow = project_workflows.find(chat_id, message_id=message.get('message_id'), base_name=base_name)
+                if workflow and workflow['status'] == 'done':
+                    logger.info(f"♻️ Project workflow {workflow['id']} already completed for this message")
+                    return jsonify({"ok": True})
                     
-                    send_telegram_message(chat_id, message)
+                if workflow:
+                    step = PROJECT_WORKFLOW_STEP_LABELS.get(workflow['failed_step'], workflow['failed_step'] or 'unterbrochen')
+                    send_telegram_message(chat_id, f"🔁 **Setze Projektanlage fort** (zuletzt: {step})...")
                 else:
-                    send_telegram_message(chat_id, "❌ **Fehler beim Erstellen des Projekts.**\\n\\nBitte versuchen Sie es erneut oder kontaktieren Sie den Support.")
+                    workflow = project_workflows.create(chat_id, message.get('message_id'), base_name)
+                workflow['results']['follow_up_question'] = follow_up_question
+                project_workflows.save(workflow)
+                
+                # Aktion ausführen - Schritte werden einzeln gesichert
+                run_project_workflow(workflow)
                     
             elif intent == "RECORD_TIME":
                 # Extract time tracking data from entities first, then fallback to old format
@@ -676,85 +1774,68 @@ def webhook():
                 # Parse date
                 entry_date = parse_date_from_ai(entry_date_raw)
                 
-                # Find project
-                project = find_project_by_identifier(project_identifier)
-                if not project:
+                # Find project - fall back to the project from the previous message
+                state = conversation_store.get(chat_id)
+                if not project_identifier and state and state.project:
+                    project_identifier = state.project.get('project_number') or state.project.get('name', '')
+                ranked = rank_projects(project_identifier)
+                if not ranked:
                     send_telegram_message(chat_id, f"🚨 **Fehler:** Das Projekt {project_identifier} konnte nicht gefunden werden. Bitte geben Sie eine gültige Projektnummer oder einen Namen an.")
                     return jsonify({"ok": True})
                 
-                # Save time entry
-                created_by = f"{user_name} ({user_id})"
-                if record_time_entry(project['id'], duration_hours, activity_description, entry_date, created_by):
-                    # Format date for display
-                    entry_date_display = datetime.strptime(entry_date, '%Y-%m-%d').strftime('%d.%m.%Y')
-                    
-                    message = f"""✅ **Zeit erfasst!**
-
-📁 **Projekt:** {project['name']}
-⏱️ **Dauer:** {duration_hours} Stunden
-📝 **Tätigkeit:** {activity_description}
-📅 **Datum:** {entry_date_display}
-👤 **Erfasst von:** {user_name}
-
-💡 **Tipp:** Sie können auch relative Zeitangaben verwenden:
-- "gestern 3h an 25-003 gearbeitet"
-- "vorgestern 2.5h Planung für WP04\""""
+                time_entry = {
+                    'duration_hours': duration_hours,
+                    'activity_description': activity_description,
+                    'entry_date': entry_date,
+                    'created_by': f"{user_name} ({user_id})",
+                    'user_name': user_name,
+                    'follow_up_question': follow_up_question
+                }
+                
+                # Mehrere Treffer - per Button auswählen lassen
+                project = pick_unambiguous_project(ranked)
+                if not project:
+                    ask_project_choice(chat_id, project_identifier, [p for p, _ in ranked], 'record_time', time_entry)
+                    return jsonify({"ok": True})
                     
-                    # Füge Follow-up Frage hinzu falls vorhanden
-                    if follow_up_question:
-                        message += f"\n\n💬 {follow_up_question}"
-                    else:
-                        # Biete proaktiv weitere Aktionen an
-                        message += "\n\n💬 Möchten Sie noch weitere Zeiten erfassen?"
-                    
-                    send_telegram_message(chat_id, message)
-                else:
-                    send_telegram_message(chat_id, "❌ **Fehler beim Speichern der Zeiterfassung.**\\n\\nBitte versuchen Sie es erneut.")
+                complete_time_entry(chat_id, project, time_entry)
                     
             elif intent == "CREATE_TASK":
                 # Extract task data from entities first, then fallback to old format
                 task_content = entities.get("task_description", ai_result.get("task_description", ai_result.get("content", "")))
-                priority = entities.get("priority", ai_result.get("priority", "mittel")).lower()
+                priority = entities.get("priority", ai_result.get("priority"))
                 project_identifier = entities.get("project_identifier", ai_result.get("project_identifier"))
                 
-                # Extract Tirol-specific info
-                tags = extract_tirol_tags(task_content)
-                behörde = ai_result.get("behörde")
-                gemeinde = ai_result.get("gemeinde")
-                
                 # Find project if specified
-                project_id = None
-                project_name = None
+                project = None
                 if project_identifier:
                     project = find_project_by_identifier(project_identifier)
                     if project:
-                        project_id = project['id']
-                        project_name = project['name']
+                        conversation_store.update(chat_id, project=project_context(project))
                 
-                # Create task
-                created_by = f"{user_name} ({user_id})"
-                if create_task(task_content, project_id, priority, tags, behörde, gemeinde, created_by):
-                    # Build response message
-                    priority_emoji = {"hoch": "🔴", "mittel": "🟡", "niedrig": "🟢"}.get(priority, "🟡")
-                    
-                    response = f"✅ **Aufgabe erstellt\!**\n\n"
-                    response += f"{priority_emoji} **Priorität:** {priority.capitalize()}\n"
-                    response += f"📝 **Aufgabe:** {task_content}\n"
-                    
-                    if project_name:
-                        response += f"📁 **Projekt:** {project_name}\n"
-                    if tags:
-                        response += f"🏷️ **Tags:** {', '.join(tags)}\n"
-                    if behörde:
-                        response += f"🏛️ **Behörde:** {behörde}\n"
-                    if gemeinde:
-                        response += f"📍 **Gemeinde:** {gemeinde}\n"
-                        
-                    response += f"\n💡 **Tipp:** Alle Aufgaben im Portal unter [portal.marcelgladbach.com/tasks](https://portal.marcelgladbach.com/tasks)"
+                task = {
+                    'task_content': task_content,
+                    'project': project_context(project) if project else None,
+                    'behörde': ai_result.get("behörde"),
+                    'gemeinde': ai_result.get("gemeinde"),
+                    'created_by': f"{user_name} ({user_id})"
+                }
+                
+                # Keine Priorität erkannt - per Button auswählen lassen
+                if not priority:
+                    nonce = new_prompt_nonce()
+                    conversation_store.update(chat_id, last_intent=intent, pending_question="Welche Priorität?",
+                                              pending_action='create_task', pending_params=task, pending_nonce=nonce)
+                    send_telegram_message(chat_id, f"📝 **Aufgabe:** {task_content}\n\nWelche Priorität soll die Aufgabe haben?",
+                                          reply_markup=priority_keyboard(nonce))
+                    return jsonify({"ok": True})
                     
-                    send_telegram_message(chat_id, response)
-                else:
-                    send_telegram_message(chat_id, "❌ **Fehler beim Erstellen der Aufgabe.**\n\nBitte versuchen Sie es erneut.")
+                complete_task(chat_id, task, priority.lower())
+                
+            elif intent == "SHOW_SUMMARY":
+                show_summary(chat_id, user_id,
+                             entities.get("time_range", ai_result.get("time_range")),
+                             entities.get("project_identifier", ai_result.get("project_identifier")))
                 
             elif intent == "SHOW_CALENDAR_EVENTS":
                 days = ai_result.get("days_ahead", 7)
@@ -819,6 +1900,14 @@ def webhook():
 `"buche 2.5 stunden auf WP04"`
 `"gestern 4h an Fassade gearbeitet"`
 
+📊 **Übersicht:**
+`"Was habe ich diese Woche gemacht?"`
+`"Zeige Stunden für Projekt 25-003 im Juni"`
+
+📤 **Stunden exportieren (nach 01_Admin):**
+`"Export 25-003 Juni"`
+`"/export EFH Müller letzten Monat xlsx"`
+
 📝 **Aufgabe hinzufügen:**
 📅 **Termine anzeigen:**
 `"Zeige meine Termine"`
@@ -872,13 +1961,23 @@ def health():
             "google_drive": "connected",
             "telegram": "webhook_active",
             "supabase": "connected" if supabase_client else "not_configured",
+            "drive_mirror": f"{len(drive_mirror)} folders" if drive_mirror.ready else "not_seeded",
+            "google_clients": google_clients.stats(),
+            "project_index": f"{len(project_index)} projects" if project_index.ready else "not_warmed",
+            "project_cache": project_cache.stats(),
+            "realtime": realtime_invalidator.state if realtime_invalidator else "not_started",
+            "google_token": token_refresher.stats() if token_refresher else "not_started",
+            "google_api": google_api.stats(),
+            "write_behind": write_behind.stats() if write_behind else "not_started",
+            "summary_cache": summary_cache.stats(),
             "time_tracking": "active"
         }
     })
 
 def init_services():
     """Initialize all external services"""
-    global groq_client, supabase_client, drive_service, calendar_service
+    global groq_client, supabase_client, drive_service, calendar_service, file_ingestor, preview_pool, file_index
+    global token_refresher, write_behind
     
     # Initialize Groq
     if not GROQ_API_KEY:
@@ -896,10 +1995,42 @@ def init_services():
             logger.error(f"❌ Failed to initialize Supabase client: {e}")
     else:
         logger.warning("⚠️  Supabase credentials not found - database integration disabled")
+        
+    # Entries journaled before a restart are delivered first
+    if supabase_client:
+        write_behind = WriteBehindWriter(WRITE_BEHIND_JOURNAL, send_journaled_rows,
+                                         batch_size=WRITE_BEHIND_BATCH_SIZE, flush_seconds=WRITE_BEHIND_FLUSH_SECONDS,
+                                         on_failed=report_failed_write, on_delivered=on_write_delivered)
+        write_behind.start()
+        atexit.register(write_behind.stop)
     
     # Initialize Google services
     drive_service, calendar_service = get_google_services()
     
+    # Keep the shared access token fresh - no user request waits on the token endpoint
+    token_refresher = TokenRefresher(google_credentials, margin_seconds=GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS)
+    token_refresher.start()
+    
+    # Uploads stream Telegram -> Drive on their own sessions
+    file_ingestor = FileIngestor(TELEGRAM_BOT_TOKEN, lambda: AuthorizedSession(google_clients.credentials),
+                                 max_workers=FILE_INGEST_WORKERS, max_pending=FILE_INGEST_MAX_PENDING,
+                                 throttle=lambda: google_api.acquire('drive'))
+    file_index = FileDedupIndex(FILE_DEDUP_DB)
+    if PREVIEW_WORKERS > 0:
+        preview_pool = PreviewPool(PREVIEW_CACHE_DIR, max_workers=PREVIEW_WORKERS, max_queue=PREVIEW_MAX_QUEUE)
+    
+    # Project folders in memory - also speeds up the Drive scan below
+    start_drive_mirror()
+    
+    # A lost counter file must not restart numbering at YY-001
+    reconcile_project_counter()
+    
+    # Project lookups are answered from memory from now on
+    start_project_cache()
+    
+    # Finish project creations that a crash or restart interrupted
+    threading.Thread(target=replay_open_project_workflows, daemon=True).start()
+    
     return groq_client, supabase_client, drive_service, calendar_service
 
 if __name__ == '__main__':
@@ -0,0 +1,144 @@
+"""
+Streaming export of a project's time entries to CSV or XLSX, page by page with keyset pagination
+"""
+
+import csv
+import re
+from datetime import date
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from time_summary import MONTHS
+
+EXPORT_PAGE_SIZE = 1000
+EXPORT_FIELDS = 'id,entry_date,duration_hours,activity_description,created_by'
+HEADER = ['Datum', 'Stunden', 'Tätigkeit', 'Erfasst von']
+
+EXPORT_MIME_TYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+# "/export EFH Müller letzten Monat xlsx" - the command form takes any project identifier
+EXPORT_COMMAND = re.compile(r'^\s*/export(?:@\w+)?\s+(.+?)\s*$', re.IGNORECASE)
+# "Export 25-003 Juni" - as plain text only with a project number, so that sentences like
+# "Exportiere die Pläne als PDF" still reach the AI
+EXPORT_SENTENCE = re.compile(r'^\s*export(?:iere)?\s+(\d{2}\s*[-/.]\s*\d{1,6}(?![\d.]).*?)\s*$', re.IGNORECASE)
+RANGE_WORDS = {
+    'heute', 'gestern', 'diese', 'dieser', 'diesen', 'letzte', 'letzter', 'letzten', 'vorige', 'vorigen',
+    'vergangene', 'vergangenen', 'woche', 'monat', 'jahr', 'this', 'last', 'week', 'month', 'year'
+}
+FORMAT_WORDS = {'csv': 'csv', 'xlsx': 'xlsx', 'excel': 'xlsx'}
+
+
+class ExportError(Exception):
+    pass
+
+
+def is_range_word(word: str) -> bool:
+    word = word.lower()
+    return (word in RANGE_WORDS or re.match(r'^\d{4}-\d{2}-\d{2}', word) is not None
+            or any(word == name.lower() or (len(word) >= 3 and name.lower().startswith(word)) for name in MONTHS))
+
+
+def parse_export_command(text: str) -> Optional[Tuple[str, Optional[str], str]]:
+    """(project identifier, time range words or None, 'csv'|'xlsx') for an export command, else None"""
+    match = EXPORT_COMMAND.match(text or '') or EXPORT_SENTENCE.match(text or '')
+    if not match:
+        return None
+    words = match.group(1).split()
+    export_format = 'csv'
+    if len(words) > 1 and words[-1].lower() in FORMAT_WORDS:
+        export_format = FORMAT_WORDS[words.pop().lower()]
+    # The project comes first, the range starts at the first date word ("25-003 letzten Monat")
+    split = next((i for i, word in enumerate(words) if i > 0 and is_range_word(word)), len(words))
+    identifier = ' '.join(words[:split])
+    time_range = ' '.join(words[split:]) or None
+    return identifier, time_range, export_format
+
+
+def iter_time_entry_pages(client, project_id: str, start: date, end: date,
+                          page_size: int = EXPORT_PAGE_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Pages of a project's entries ordered by (entry_date, id)
+
+    Each page continues after the last row of the previous one instead of
+    using an offset, so every page is an index range scan of the same cost
+    and no page size limit of the API is ever hit.
+    """
+    last: Optional[Dict[str, Any]] = None
+    while True:
+        query = client.table('time_entries').select(EXPORT_FIELDS) \
+            .eq('project_id', project_id) \
+            .gte('entry_date', start.isoformat()) \
+            .lte('entry_date', end.isoformat())
+        if last:
+            query = query.or_(f"entry_date.gt.{last['entry_date']},"
+                              f"and(entry_date.eq.{last['entry_date']},id.gt.{last['id']})")
+        rows = query.order('entry_date').order('id').limit(page_size).execute().data or []
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1]
+
+
+def export_row(entry: Dict[str, Any]) -> list:
+    return [date.fromisoformat(entry['entry_date'][:10]), float(entry['duration_hours']),
+            entry.get('activity_description') or '', entry.get('created_by') or '']
+
+
+class CsvExport:
+    """Semicolon-separated with decimal commas and a BOM - opens as-is in a German Excel"""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'w', newline='', encoding='utf-8-sig')
+        self._writer = csv.writer(self._file, delimiter=';')
+
+    def write(self, row: list) -> None:
+        self._writer.writerow([value.strftime('%d.%m.%Y') if isinstance(value, date)
+                               else f"{value:.2f}".replace('.', ',') if isinstance(value, float)
+                               else value for value in row])
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class XlsxExport:
+    """openpyxl in write-only mode: rows go to disk as they come, the sheet is never held in memory"""
+
+    def __init__(self, path: str, title: str):
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise ExportError("XLSX export needs openpyxl (see requirements.txt)")
+        self.path = path
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet(title[:31])
+
+    def write(self, row: list) -> None:
+        self._sheet.append(row)
+
+    def close(self) -> None:
+        self._workbook.save(self.path)
+
+
+def export_time_entries(pages, path: str, export_format: str, title: str) -> Tuple[int, float]:
+    """Write all pages to `path`, returns (rows, total hours)"""
+    writer = XlsxExport(path, title) if export_format == 'xlsx' else CsvExport(path)
+    rows, hours = 0, 0.0
+    try:
+        writer.write(HEADER)
+        for page in pages:
+            for entry in page:
+                row = export_row(entry)
+                writer.write(row)
+                rows += 1
+                hours += row[1]
+        writer.write([None, round(hours, 2), 'Summe', None])
+    finally:
+        writer.close()
+    return rows, hours
+
+
+def export_file_name(project: Dict[str, Any], start: date, end: date, export_format: str) -> str:
+    number = project.get('project_number') or re.sub(r'[^\w-]+', '_', project.get('name') or 'Projekt')
+    return f"Stunden_{number}_{start.isoformat()}_{end.isoformat()}.{export_format}"
@@ -0,0 +1,138 @@
+"""
+Hour summaries: date ranges from the AI's wording, rendering of aggregated rows, a short-lived per-chat cache
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, Any, Hashable, List, Optional, Tuple
+
+MONTHS = ['Januar', 'Februar', 'März', 'April', 'Mai', 'Juni', 'Juli',
+          'August', 'September', 'Oktober', 'November', 'Dezember']
+
+
+def month_range(year: int, month: int) -> Tuple[date, date]:
+    first = date(year, month, 1)
+    following = date(year + month // 12, month % 12 + 1, 1)
+    return first, following - timedelta(days=1)
+
+
+def resolve_time_range(time_range: Optional[str], today: Optional[date] = None) -> Tuple[date, date, str]:
+    """(first day, last day, label) for 'this_week', 'letzte woche', 'juni', 'YYYY-MM-DD..YYYY-MM-DD' etc.
+
+    Anything not understood means the current week.
+    """
+    today = today or date.today()
+    text = (time_range or '').strip().lower().replace('_', ' ')
+    monday = today - timedelta(days=today.weekday())
+
+    explicit = re.match(r'^(\d{4}-\d{2}-\d{2})\s*(?:\.\.|bis|-|to)\s*(\d{4}-\d{2}-\d{2})$', text)
+    if explicit:
+        start, end = date.fromisoformat(explicit.group(1)), date.fromisoformat(explicit.group(2))
+        return start, end, f"{start.strftime('%d.%m.%Y')} – {end.strftime('%d.%m.%Y')}"
+    if text in ('today', 'heute'):
+        return today, today, 'Heute'
+    if text in ('yesterday', 'gestern'):
+        yesterday = today - timedelta(days=1)
+        return yesterday, yesterday, 'Gestern'
+    if re.search(r'\b(last|letzte[nr]?|vorige[nr]?|vergangene[nr]?)\b', text) and re.search(r'\b(week|woche)\b', text):
+        return monday - timedelta(days=7), monday - timedelta(days=1), 'Letzte Woche'
+    if re.search(r'\b(last|letzte[nr]?|vorige[nr]?|vergangene[nr]?)\b', text) and re.search(r'\b(month|monat)\b', text):
+        year, month = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+        start, end = month_range(year, month)
+        return start, end, f"{MONTHS[month - 1]} {year}"
+    if re.search(r'\b(month|monat)\b', text):
+        start, _ = month_range(today.year, today.month)
+        return start, today, f"{MONTHS[today.month - 1]} {today.year}"
+    if re.search(r'\b(year|jahr)\b', text):
+        return date(today.year, 1, 1), today, str(today.year)
+    for number, name in enumerate(MONTHS, start=1):
+        if name.lower() in text or (name[:3].lower() == text[:3] and len(text) >= 3 and text.isalpha()):
+            # "Juni" in July means the June just past
+            year = today.year if number <= today.month else today.year - 1
+            start, end = month_range(year, number)
+            return start, min(end, today), f"{name} {year}"
+    return monday, today, 'Diese Woche'
+
+
+def format_hours(hours) -> str:
+    return f"{float(hours):.2f}".rstrip('0').rstrip('.') + ' h'
+
+
+def render_summary(label: str, by_project: List[Dict[str, Any]], by_week: List[Dict[str, Any]],
+                   by_user: Optional[List[Dict[str, Any]]] = None, project_name: Optional[str] = None) -> str:
+    """Telegram message for aggregated rows from hours_by_project / hours_by_week / hours_by_user"""
+    weeks_total = sum(float(row['hours']) for row in by_week)
+    title = f"📊 **Übersicht {label}**"
+    if project_name:
+        title += f"\n📁 {project_name}"
+    if not by_week:
+        return f"{title}\n\nKeine Zeiten erfasst."
+
+    lines = [title, '', f"⏱️ **Gesamt:** {format_hours(weeks_total)}"]
+    if by_project:
+        lines += ['', '**Nach Projekt:**']
+        for row in by_project[:10]:
+            name = row.get('project_name') or row.get('project_number') or '?'
+            lines.append(f"• {name}: {format_hours(row['hours'])}")
+        if len(by_project) > 10:
+            rest = sum(float(row['hours']) for row in by_project[10:])
+            lines.append(f"• {len(by_project) - 10} weitere: {format_hours(rest)}")
+    if by_user:
+        lines += ['', '**Nach Person:**']
+        for row in by_user:
+            # 'Name (telegram_user_id)' -> 'Name'
+            name = re.sub(r'\s*\(\d+\)$', '', row.get('created_by') or '?')
+            lines.append(f"• {name}: {format_hours(row['hours'])}")
+    if len(by_week) > 1:
+        lines += ['', '**Nach Woche:**']
+        for row in by_week:
+            week_start = date.fromisoformat(str(row['week_start'])[:10])
+            lines.append(f"• KW {week_start.isocalendar()[1]:02d} ({week_start.strftime('%d.%m.')}): "
+                         f"{format_hours(row['hours'])}")
+    return '\n'.join(lines)
+
+
+class SummaryCache:
+    """Rendered summaries per chat and range, kept for ``ttl_seconds``
+
+    Repeated questions ("und diese Woche?") within the TTL cost no database
+    round trip. Recording time in a chat drops that chat's entries.
+    """
+
+    def __init__(self, ttl_seconds: float = 60, max_entries: int = 200):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[int, Hashable], Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chat_id: int, key: Hashable) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((chat_id, key))
+            if entry is None or now - entry[0] > self.ttl_seconds:
+                self._entries.pop((chat_id, key), None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, chat_id: int, key: Hashable, text: str) -> None:
+        with self._lock:
+            self._entries.pop((chat_id, key), None)
+            self._entries[(chat_id, key)] = (time.monotonic(), text)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, chat_id: int) -> None:
+        with self._lock:
+            for cached in [cached for cached in self._entries if cached[0] == chat_id]:
+                del self._entries[cached]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
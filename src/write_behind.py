@@ -0,0 +1,253 @@
+"""
+Write-behind inserts and offline outbox: rows are journaled locally, then sent to Supabase in multi-row batches
+"""
+
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    row_id TEXT PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    context TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS journal_status ON journal (status, created_at);
+"""
+
+# Row IDs derived from an idempotency key are stable across retries and restarts
+ROW_ID_NAMESPACE = uuid.UUID('5d3c1f0e-8a34-4c1b-9a6e-2f7d6b0c4e91')
+
+# SQLSTATE classes that no retry can fix: data exceptions, constraint violations, unknown columns
+PERMANENT_SQLSTATE_CLASSES = ('22', '23', '42')
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """True for errors the database will repeat for the same row (PostgREST APIError codes)"""
+    code = str(getattr(error, 'code', None) or '')
+    if code.startswith('PGRST'):
+        # PGRST0xx: connection problems, everything else: the request itself is wrong
+        return not code.startswith('PGRST0')
+    return code[:2] in PERMANENT_SQLSTATE_CLASSES
+
+
+def row_id(table: str, key: str) -> str:
+    """The row ID for an idempotency key, e.g. a project's Drive folder ID"""
+    return str(uuid.uuid5(ROW_ID_NAMESPACE, f"{table}:{key}"))
+
+
+class WriteBehindWriter:
+    """Confirms a row once it is in the local journal, delivers it later
+
+    Every row gets a client-generated UUID as its ``id``, so ``send`` can
+    upsert with "ignore duplicates" and a batch that reached Supabase but
+    whose response was lost is harmless to resend. A flusher thread sends
+    pending rows in batches of up to ``batch_size`` - right away once that
+    many are waiting, else after ``flush_seconds``. Failed batches are
+    retried with exponential backoff until they are delivered. Rows the
+    database rejects for good are isolated, kept as 'failed' and reported
+    through ``on_failed``. ``on_delivered`` hears about every row once it
+    is in the database, e.g. to drop caches that read that table.
+
+    The journal doubles as outbox while Supabase is unreachable: ``online``
+    turns False after a failed delivery, so callers that normally write
+    synchronously can journal right away instead of waiting for timeouts.
+    """
+
+    def __init__(self, path: str, send: Callable[[str, List[Dict[str, Any]]], None],
+                 batch_size: int = 50, flush_seconds: float = 1.0,
+                 on_failed: Optional[Callable[[str, Dict[str, Any], Optional[Dict[str, Any]], Exception], None]] = None,
+                 on_delivered: Optional[Callable[[str, Dict[str, Any], Optional[Dict[str, Any]]], None]] = None,
+                 is_permanent: Callable[[Exception], bool] = is_permanent_error,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.path = path
+        self.send = send
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.on_failed = on_failed
+        self.on_delivered = on_delivered
+        self.is_permanent = is_permanent
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_at = 0.0
+        self.failures_in_row = 0
+        self.delivered = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # One short-lived connection per call - request threads and the flusher share the file
+        db = sqlite3.connect(self.path, timeout=10)
+        db.row_factory = sqlite3.Row
+        # The confirmation to the user promises that the row survives a crash
+        db.execute('PRAGMA synchronous=FULL')
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @property
+    def online(self) -> bool:
+        """False from a failed delivery until the next successful one"""
+        return self.failures_in_row == 0
+
+    def submit(self, table: str, row: Dict[str, Any], context: Optional[Dict[str, Any]] = None,
+               key: Optional[str] = None) -> str:
+        """Journal a row for `table`, returns its ID once it is on disk
+
+        With an idempotency ``key`` the row ID is derived from it, and
+        submitting the same key again is a no-op.
+        """
+        row = dict(row)
+        if key is not None:
+            row['id'] = row_id(table, key)
+        row.setdefault('id', str(uuid.uuid4()))
+        with self._connect() as db:
+            db.execute(
+                'INSERT OR IGNORE INTO journal (row_id, table_name, payload, context, created_at) VALUES (?, ?, ?, ?, ?)',
+                (row['id'], table, json.dumps(row), json.dumps(context) if context else None, time.time())
+            )
+            pending = db.execute("SELECT COUNT(*) FROM journal WHERE status = 'pending'").fetchone()[0]
+        if pending >= self.batch_size:
+            self._wake.set()
+        return row['id']
+
+    def _pending(self) -> List[sqlite3.Row]:
+        with self._connect() as db:
+            return db.execute(
+                "SELECT * FROM journal WHERE status = 'pending' ORDER BY created_at, rowid LIMIT ?", (self.batch_size,)
+            ).fetchall()
+
+    def flush(self) -> int:
+        """Send one batch of pending rows, returns how many were delivered"""
+        with self._flush_lock:
+            if time.time() < self.retry_at:
+                return 0
+            rows = self._pending()
+            # PostgREST wants the same columns in every row of a multi-row insert
+            groups: Dict[Tuple[str, Tuple[str, ...]], List[sqlite3.Row]] = {}
+            for row in rows:
+                payload = json.loads(row['payload'])
+                groups.setdefault((row['table_name'], tuple(sorted(payload))), []).append(row)
+
+            delivered = 0
+            for (table, _), group in groups.items():
+                try:
+                    delivered += self._deliver(table, group)
+                except Exception as e:
+                    self._back_off(group, e)
+                    break
+            else:
+                self.failures_in_row = 0
+            self.delivered += delivered
+            return delivered
+
+    def _deliver(self, table: str, rows: List[sqlite3.Row]) -> int:
+        """Send rows as one request; a permanent error is narrowed down to the offending rows"""
+        try:
+            self.send(table, [json.loads(row['payload']) for row in rows])
+        except Exception as e:
+            if not self.is_permanent(e):
+                raise
+            if len(rows) == 1:
+                self._fail(rows[0], e)
+                return 0
+            return sum(self._deliver(table, [row]) for row in rows)
+        with self._connect() as db:
+            db.executemany('DELETE FROM journal WHERE row_id = ?', [(row['row_id'],) for row in rows])
+        if self.on_delivered:
+            for row in rows:
+                try:
+                    self.on_delivered(table, json.loads(row['payload']),
+                                      json.loads(row['context']) if row['context'] else None)
+                except Exception as e:
+                    logger.error(f"❌ Write-behind delivery callback failed: {e}")
+        return len(rows)
+
+    def _back_off(self, rows: List[sqlite3.Row], error: Exception) -> None:
+        self.failures_in_row += 1
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** self.failures_in_row))
+        self.retry_at = time.time() + delay
+        with self._connect() as db:
+            db.executemany(
+                'UPDATE journal SET attempts = attempts + 1, last_error = ? WHERE row_id = ?',
+                [(str(error), row['row_id']) for row in rows]
+            )
+        logger.warning(f"⏳ Write-behind delivery failed ({error}), retrying in {delay:.1f}s")
+
+    def _fail(self, row: sqlite3.Row, error: Exception) -> None:
+        with self._connect() as db:
+            db.execute(
+                "UPDATE journal SET status = 'failed', attempts = attempts + 1, last_error = ? WHERE row_id = ?",
+                (str(error), row['row_id'])
+            )
+        logger.error(f"❌ {row['table_name']} row {row['row_id']} rejected: {error}")
+        if self.on_failed:
+            try:
+                self.on_failed(row['table_name'], json.loads(row['payload']),
+                               json.loads(row['context']) if row['context'] else None, error)
+            except Exception as e:
+                logger.error(f"❌ Write-behind failure callback failed: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                # Keep going while full batches are waiting
+                while self.flush() >= self.batch_size:
+                    pass
+            except Exception as e:
+                logger.error(f"❌ Write-behind flush failed: {e}")
+
+    def start(self) -> None:
+        """Deliver rows journaled before a restart, then keep flushing in the background"""
+        threading.Thread(target=self._run, name='write-behind', daemon=True).start()
+
+    def stop(self, timeout: float = 10) -> None:
+        """Flush what can be flushed before shutting down"""
+        self._stop.set()
+        self._wake.set()
+        deadline = time.time() + timeout
+        while time.time() < deadline and self.flush():
+            pass
+
+    def failed(self) -> List[Dict[str, Any]]:
+        with self._connect() as db:
+            return [dict(row) for row in db.execute("SELECT * FROM journal WHERE status = 'failed' ORDER BY created_at")]
+
+    def stats(self) -> Dict[str, Any]:
+        """Journal backlog, for /health"""
+        with self._connect() as db:
+            counts = dict(db.execute('SELECT status, COUNT(*) FROM journal GROUP BY status').fetchall())
+            oldest = db.execute("SELECT MIN(created_at) FROM journal WHERE status = 'pending'").fetchone()[0]
+        return {
+            'online': self.online,
+            'pending': counts.get('pending', 0),
+            'failed': counts.get('failed', 0),
+            'delivered': self.delivered,
+            'oldest_pending_seconds': round(time.time() - oldest) if oldest else None,
+            'retry_in_seconds': max(0, round(self.retry_at - time.time()))
+        }
@@ -123,5 +123,176 @@ def test_parse_time_expressions():
                     assert telegram_agent_google.parse_date("gestern") == date(2025, 6, 22)
                     assert telegram_agent_google.parse_date("vorgestern") == date(2025, 6, 21)
 
+def test_callback_query_resolves_without_ai():
+    """Button taps complete the parked action without another AI analysis"""
+    import telegram_agent_google
+    
+    chat_id = 4711
+    telegram_agent_google.conversation_store.update(
+        chat_id, pending_action='create_task',
+        pending_params={'task_content': 'Grundriss überarbeiten', 'project': None,
+                        'behörde': None, 'gemeinde': None, 'created_by': 'Test (1)'},
+        pending_nonce='n1'
+    )
+    update = {'callback_query': {'id': 'cb-1', 'data': 'pr:hoch:n1',
+                                 'message': {'message_id': 5, 'chat': {'id': chat_id}}}}
+    
+    with patch.object(telegram_agent_google, 'analyze_with_groq') as mock_ai, \
+         patch.object(telegram_agent_google, 'create_task', return_value=True) as mock_create_task, \
+         patch.object(telegram_agent_google, 'send_telegram_message'), \
+         patch.object(telegram_agent_google, 'answer_callback_query'), \
+         patch.object(telegram_agent_google, 'remove_inline_keyboard'):
+        response = telegram_agent_google.app.test_client().post('/telegram-webhook', json=update)
+    
+    assert response.status_code == 200
+    mock_ai.assert_not_called()
+    assert mock_create_task.call_args[0][2] == 'hoch'
+    assert telegram_agent_google.conversation_store.get(chat_id).pending_action is None
+
+def test_callback_from_an_older_prompt_is_rejected():
+    """A "Ja" still on screen from an earlier prompt does not confirm the current one"""
+    import telegram_agent_google
+    
+    chat_id = 4712
+    telegram_agent_google.conversation_store.update(chat_id, pending_action='record_more_time',
+                                                    pending_params={}, pending_nonce='new')
+    
+    with patch.object(telegram_agent_google, 'handle_pending_answer') as mock_answer, \
+         patch.object(telegram_agent_google, 'answer_callback_query') as mock_ack, \
+         patch.object(telegram_agent_google, 'remove_inline_keyboard'):
+        for data in ('cf:y:old', 'cf:y'):
+            telegram_agent_google.handle_callback_query(
+                {'id': 'cb-2', 'data': data, 'message': {'message_id': 4, 'chat': {'id': chat_id}}})
+    
+    mock_answer.assert_not_called()
+    assert 'abgelaufen' in mock_ack.call_args[0][1]
+    assert telegram_agent_google.conversation_store.get(chat_id).pending_action == 'record_more_time'
+
+def test_single_weak_match_is_not_taken_without_asking():
+    """'Dachstuhl Hall' only resembles '25-002-Wohnpark Hall' - the user has to confirm it"""
+    import telegram_agent_google
+    
+    project = {'id': 'p2', 'name': '25-002-Wohnpark Hall', 'project_number': '25-002'}
+    with patch.object(telegram_agent_google, 'rank_projects', return_value=[(project, 0.31)]), \
+         patch.object(telegram_agent_google, 'export_for_project') as mock_export, \
+         patch.object(telegram_agent_google, 'send_telegram_message') as mock_send:
+        telegram_agent_google.handle_export_command(4713, 'Dachstuhl Hall', None, 'csv')
+        assert telegram_agent_google.find_project_by_identifier('Dachstuhl Hall') is None
+    
+    mock_export.assert_not_called()
+    assert 'Kein sicherer Treffer' in mock_send.call_args[0][1]
+    assert telegram_agent_google.conversation_store.get(4713).pending_action == 'export_time_entries'
+    
+    with patch.object(telegram_agent_google, 'rank_projects', return_value=[(project, 1.0)]):
+        assert telegram_agent_google.find_project_by_identifier('25-002') == project
+
+def test_highest_supabase_number_is_one_query():
+    """The numeric maximum comes from the database - '25-1000' sorts before '25-999' as text"""
+    import telegram_agent_google
+    
+    supabase = MagicMock()
+    supabase.rpc.return_value.execute.return_value = Mock(data=1000)
+    with patch.object(telegram_agent_google, 'supabase_client', supabase):
+        assert telegram_agent_google.get_highest_project_number_in_supabase(25) == 1000
+    supabase.rpc.assert_called_once_with('highest_project_number', {'for_year': 25})
+    supabase.table.assert_not_called()
+
+def test_project_subfolders_use_one_batch():
+    """All subfolders go out in one batch, failed ones are retried"""
+    import telegram_agent_google
+    
+    class FakeBatch:
+        executions = 0
+        
+        def __init__(self, callback):
+            self.callback = callback
+            self.request_ids = []
+            
+        def add(self, request, request_id):
+            self.request_ids.append(request_id)
+            
+        def execute(self, http=None):
+            FakeBatch.executions += 1
+            for request_id in self.request_ids:
+                if request_id == '3':
+                    self.callback(request_id, None, Exception("userRateLimitExceeded"))
+                else:
+                    self.callback(request_id, {'id': f'folder-{request_id}'}, None)
+    
+    drive = MagicMock()
+    drive.new_batch_http_request.side_effect = lambda callback: FakeBatch(callback)
+    drive.files.return_value.create.return_value.execute.return_value = {'id': 'retried', 'webViewLink': 'link'}
+    
+    with patch.object(telegram_agent_google, 'drive_service', drive), \
+         patch.object(telegram_agent_google.google_api, 'transport', None), \
+         patch.object(telegram_agent_google, 'google_credentials', None), \
+         patch.object(telegram_agent_google.time, 'sleep'):
+        created, failed = telegram_agent_google.create_project_subfolders('project-id')
+    
+    assert FakeBatch.executions == 1
+    assert failed == {}
+    assert len(created) == len(telegram_agent_google.PROJECT_FOLDERS)
+    assert created['04_Fotos'] == 'retried'
+
+def test_subfolders_created_despite_an_error_are_not_duplicated():
+    """After a lost batch response, folders that exist are looked up instead of created again"""
+    import telegram_agent_google
+    
+    class LostBatch:
+        def __init__(self, callback):
+            self.callback = callback
+            self.request_ids = []
+            
+        def add(self, request, request_id):
+            self.request_ids.append(request_id)
+            
+        def execute(self, http=None):
+            self.callback('0', {'id': 'folder-0'}, None)
+            raise TimeoutError("read timeout")
+    
+    names = telegram_agent_google.PROJECT_FOLDERS[:3]
+    drive = MagicMock()
+    drive.new_batch_http_request.side_effect = lambda callback: LostBatch(callback)
+    drive.files.return_value.list.return_value.execute.return_value = {
+        'files': [{'id': 'folder-1', 'name': names[1]}]}
+    drive.files.return_value.create.return_value.execute.return_value = {'id': 'retried'}
+    
+    with patch.object(telegram_agent_google, 'drive_service', drive), \
+         patch.object(telegram_agent_google.google_api, 'transport', None), \
+         patch.object(telegram_agent_google, 'google_credentials', None), \
+         patch.object(telegram_agent_google.time, 'sleep'):
+        created, failed = telegram_agent_google.create_project_subfolders('project-lost', names)
+    
+    assert failed == {}
+    assert created == {names[0]: 'folder-0', names[1]: 'folder-1', names[2]: 'retried'}
+    # The batch itself plus one retry - the existing folder is not created again
+    created_names = [c.kwargs['body']['name'] for c in drive.files.return_value.create.call_args_list]
+    assert created_names.count(names[1]) == 1
+    assert created_names.count(names[2]) == 2
+
+def test_failed_duplicate_delete_still_records_the_link(tmp_path):
+    """The duplicate is linked to the original and the spooled copy removed even if the delete fails"""
+    import telegram_agent_google
+    
+    local_copy = tmp_path / 'spooled.jpg'
+    local_copy.write_bytes(b'jpeg')
+    incoming = telegram_agent_google.IncomingFile('f1', 'u1', 'foto.jpg', 'image/jpeg')
+    result = telegram_agent_google.IngestResult({'id': 'copy'}, 'sha', 4, local_copy=str(local_copy))
+    file_index = MagicMock()
+    file_index.by_sha256.return_value = {'drive_file_id': 'original'}
+    drive = MagicMock()
+    drive.files.return_value.delete.return_value.execute.side_effect = RuntimeError("503")
+    
+    with patch.object(telegram_agent_google, 'file_index', file_index), \
+         patch.object(telegram_agent_google, 'drive_service', drive), \
+         patch.object(telegram_agent_google.google_api, 'transport', None), \
+         patch.object(telegram_agent_google, 'link_known_file', return_value=True), \
+         patch.object(telegram_agent_google.time, 'sleep'):
+        done = telegram_agent_google.on_file_ingested(1, {'name': '25-001-EFH'}, '04_Fotos', 'parent')
+        done(incoming, result, None)
+    
+    file_index.link.assert_called_once_with('u1', 'original')
+    assert not local_copy.exists()
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
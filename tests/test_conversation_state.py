@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-chat conversation state store
+"""
+
+import os
+import sys
+from unittest.mock import patch
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from conversation_state import ConversationStateStore, parse_confirmation
+
+def test_parse_confirmation():
+    """Short answers are resolved, everything else goes to the AI"""
+    assert parse_confirmation("ja") is True
+    assert parse_confirmation("Ja, gerne!") is True
+    assert parse_confirmation("ok 👍") is True
+    assert parse_confirmation("nein danke") is False
+    assert parse_confirmation("Nö") is False
+    assert parse_confirmation("ja aber nicht") is None
+    assert parse_confirmation("3h auf 25-003 für Entwurf") is None
+    assert parse_confirmation("") is None
+
+def test_store_evicts_least_recently_used():
+    """The store never holds more than max_chats entries"""
+    store = ConversationStateStore(max_chats=2)
+    store.update(1, last_intent="CREATE_PROJECT")
+    store.update(2, last_intent="RECORD_TIME")
+    store.get(1)
+    store.update(1, last_intent="CREATE_TASK")
+    store.update(3, last_intent="HELP")
+    
+    assert len(store) == 2
+    assert store.get(2) is None
+    assert store.get(1).last_intent == "CREATE_TASK"
+
+def test_reading_a_chat_keeps_it_in_the_store():
+    store = ConversationStateStore(max_chats=2)
+    store.update(1, last_intent="CREATE_PROJECT")
+    store.update(2, last_intent="RECORD_TIME")
+    store.get(1)
+    store.update(3, last_intent="HELP")
+
+    assert store.get(1).last_intent == "CREATE_PROJECT"
+    assert store.get(2) is None
+
+def test_store_expires_after_ttl():
+    """Stale follow-up questions are not answered by a late 'ja'"""
+    store = ConversationStateStore(ttl_seconds=60)
+    with patch('conversation_state.time.monotonic', return_value=1000.0):
+        store.update(1, pending_action='record_more_time')
+    with patch('conversation_state.time.monotonic', return_value=1061.0):
+        assert store.get(1) is None
+
+def test_prompt_context_respects_budget():
+    """The injected context stays within the configured size"""
+    store = ConversationStateStore(max_context_chars=80)
+    store.update(1, last_intent="CREATE_PROJECT",
+                 project={'name': '25-003-EFH Müller ' * 10},
+                 pending_question="Soll ich gleich einen ersten Termin für das Projekt eintragen?")
+    context = store.prompt_context(1)
+    
+    assert context.startswith("Letzter Intent: CREATE_PROJECT")
+    assert len(context) <= 80
+    assert store.prompt_context(2) == ""
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-v"])
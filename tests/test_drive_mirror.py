@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for the local Drive folder mirror
+"""
+
+import os
+import sys
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from drive_mirror import DriveMirror, FOLDER_MIME_TYPE
+
+ROOT = 'root-drive'
+
+def folder(folder_id, name, parent, **extra):
+    return dict(id=folder_id, name=name, parents=[parent], mimeType=FOLDER_MIME_TYPE, **extra)
+
+class FakeRequest:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self, http=None):
+        return self.response
+
+class FakeDrive:
+    """Serves a fixed folder listing and a queue of change pages"""
+
+    def __init__(self, files, change_pages):
+        self.files_listing = files
+        self.change_pages = change_pages
+
+    def files(self):
+        return self
+
+    def changes(self):
+        return self
+
+    def getStartPageToken(self, **kwargs):
+        return FakeRequest({'startPageToken': '1'})
+
+    def list(self, **kwargs):
+        if 'q' in kwargs:
+            return FakeRequest({'files': self.files_listing})
+        return FakeRequest(self.change_pages.pop(0))
+
+def test_seed_and_changes_keep_index_current(tmp_path):
+    """Only project folders and their subfolders are mirrored, changes are applied"""
+    drive = FakeDrive(
+        files=[
+            folder('sub1', '01_Admin', 'p1'),
+            folder('p1', '25-001-EFH Müller', ROOT),
+            folder('deep', 'Archiv', 'sub1'),
+        ],
+        change_pages=[
+            {'nextPageToken': '2', 'changes': [
+                {'fileId': 'p2', 'file': folder('p2', '25-002-Halle', ROOT)}]},
+            {'newStartPageToken': '3', 'changes': [
+                {'fileId': 'p1', 'file': folder('p1', '25-001-EFH Müller', ROOT, trashed=True)},
+                {'fileId': 'p2', 'file': folder('p2', '25-002-Halle Nord', ROOT)}]},
+        ]
+    )
+    state_file = str(tmp_path / 'drive_mirror.json')
+    mirror = DriveMirror(state_file, ROOT)
+
+    mirror.seed(drive)
+    assert mirror.project_folder_id('25-001-EFH Müller') == 'p1'
+    assert mirror.find_child('p1', '01_Admin') == 'sub1'
+    assert mirror.get('deep') is None
+
+    assert mirror.poll(drive) == 3
+    assert mirror.page_token == '3'
+    assert mirror.project_folder_names() == ['25-002-Halle Nord']
+    assert mirror.get('sub1') is None
+
+    restored = DriveMirror(state_file, ROOT)
+    assert restored.load() is True
+    assert restored.project_folder_id('25-002-Halle Nord') == 'p2'
+    assert restored.page_token == '3'
+
+def test_recorded_folders_are_found_without_poll(tmp_path):
+    """Folders we create ourselves are visible immediately"""
+    mirror = DriveMirror(str(tmp_path / 'drive_mirror.json'), ROOT)
+    mirror.record_folder('p1', '25-001-EFH Müller', ROOT)
+    mirror.record_folder('sub1', '04_Fotos', 'p1')
+
+    assert mirror.find_child('p1', '04_Fotos') == 'sub1'
+    assert mirror.load() is False
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-v"])
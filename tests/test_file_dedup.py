@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests for the local file deduplication index
+"""
+
+import os
+import sys
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from file_dedup import FileDedupIndex
+
+def test_lookup_by_unique_id_and_hash(tmp_path):
+    """Both keys resolve to the first filed copy"""
+    index = FileDedupIndex(str(tmp_path / 'file_index.sqlite3'))
+    index.record('drive-1', 'sha-a', 'Foto.jpg', 'fotos-1', size=10, file_unique_id='tg-1')
+
+    assert index.by_unique_id('tg-1')['drive_file_id'] == 'drive-1'
+    assert index.by_unique_id('tg-2') is None
+    assert index.by_sha256('sha-a')['parent_id'] == 'fotos-1'
+    assert index.by_sha256('sha-a', exclude_id='drive-1') is None
+
+    index.record('drive-2', 'sha-a', 'Foto.jpg', 'fotos-2')
+    assert index.by_sha256('sha-a', exclude_id='drive-2')['drive_file_id'] == 'drive-1'
+
+    index.link('tg-2', 'drive-1')
+    assert index.by_unique_id('tg-2')['drive_file_id'] == 'drive-1'
+
+def test_forget_drops_all_telegram_ids(tmp_path):
+    """A file deleted in Drive is no longer offered as a shortcut target"""
+    path = str(tmp_path / 'file_index.sqlite3')
+    index = FileDedupIndex(path)
+    index.record('drive-1', 'sha-a', 'Plan.pdf', 'plaene-1', file_unique_id='tg-1')
+    index.link('tg-2', 'drive-1')
+
+    index.forget('drive-1')
+
+    reopened = FileDedupIndex(path)
+    assert reopened.by_unique_id('tg-1') is None
+    assert reopened.by_unique_id('tg-2') is None
+    assert reopened.by_sha256('sha-a') is None
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-v"])
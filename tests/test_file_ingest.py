@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Tests for streaming file ingestion from Telegram into Drive
+"""
+
+import os
+import sys
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from file_ingest import FileIngestor, IncomingFile, incoming_file_from_message, rechunk, target_subfolder
+
+CHUNK = 256 * 1024
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body or {}
+        self.headers = headers or {}
+
+    def json(self):
+        return self.body
+
+class FakeUploadSession:
+    """Resumable upload endpoint: 308 with the persisted Range until the total size is reached
+
+    ``keep`` limits how many bytes of each PUT are persisted, ``errors`` are
+    status codes returned (after persisting) for the next PUTs, None for none.
+    """
+
+    def __init__(self, keep=None, errors=()):
+        self.ranges = []
+        self.stored = bytearray()
+        self.total = None
+        self.keep = keep
+        self.errors = list(errors)
+
+    @property
+    def received(self):
+        return len(self.stored)
+
+    def status(self):
+        if self.total is not None and len(self.stored) == self.total:
+            return FakeResponse(200, {'id': 'file-1'})
+        headers = {'Range': f"bytes=0-{len(self.stored) - 1}"} if self.stored else {}
+        return FakeResponse(308, headers=headers)
+
+    def put(self, url, data, headers, timeout):
+        content_range = headers['Content-Range']
+        self.ranges.append(content_range)
+        span, _, total = content_range[len('bytes '):].partition('/')
+        if total != '*':
+            self.total = int(total)
+        if span != '*':
+            start = int(span.split('-')[0])
+            assert start == len(self.stored), f"{content_range} does not continue at {len(self.stored)}"
+            self.stored.extend(data[:self.keep] if self.keep else data)
+        error = self.errors.pop(0) if self.errors else None
+        return FakeResponse(error) if error else self.status()
+
+def test_rechunk_yields_exact_blocks():
+    """Uneven network reads become fixed-size chunks, the last one flagged"""
+    stream = [b'a' * 100, b'b' * 300, b'c' * 50]
+
+    chunks = list(rechunk(stream, 200))
+
+    assert [len(chunk) for chunk, _ in chunks] == [200, 200, 50]
+    assert [last for _, last in chunks] == [False, False, True]
+    assert b''.join(chunk for chunk, _ in chunks) == b'a' * 100 + b'b' * 300 + b'c' * 50
+
+def test_upload_announces_size_with_last_chunk():
+    """Intermediate chunks use an open range, the final PUT completes the file"""
+    ingestor = FileIngestor('token', session_factory=None, chunk_size=CHUNK)
+    session = FakeUploadSession()
+    stream = (b'x' * 1000 for _ in range(600))
+
+    drive_file = ingestor.upload_chunks(session, 'https://upload', stream)
+
+    assert drive_file == {'id': 'file-1'}
+    assert session.received == 600000
+    assert session.ranges == [f"bytes 0-{CHUNK - 1}/*", f"bytes {CHUNK}-{2 * CHUNK - 1}/*",
+                              f"bytes {2 * CHUNK}-599999/600000"]
+
+def test_upload_resumes_where_drive_is(monkeypatch):
+    """Partially kept chunks and a 503 continue from Drive's Range, not from the bytes sent"""
+    monkeypatch.setattr('file_ingest.time.sleep', lambda seconds: None)
+    ingestor = FileIngestor('token', session_factory=None, chunk_size=2 * CHUNK)
+    session = FakeUploadSession(keep=CHUNK, errors=[None, 503])
+    payload = bytes(range(256)) * 4000
+
+    drive_file = ingestor.upload_chunks(session, 'https://upload', (payload[i:i + 5000] for i in range(0, len(payload), 5000)))
+
+    assert drive_file == {'id': 'file-1'}
+    assert bytes(session.stored) == payload
+    # The 503 is followed by a status query instead of a blind resend
+    assert session.ranges[1:3] == ["bytes 262144-1023999/1024000", "bytes */1024000"]
+
+def test_files_are_routed_by_type():
+    """Photos, plans and everything else go to their project subfolders"""
+    photo = incoming_file_from_message({'date': 0, 'photo': [
+        {'file_id': 'small', 'file_unique_id': 'u1'}, {'file_id': 'big', 'file_unique_id': 'u2'}]})
+
+    assert photo.file_id == 'big'
+    assert target_subfolder(photo) == '04_Fotos'
+    assert target_subfolder(IncomingFile('f', 'u', 'Grundriss.DWG', 'application/octet-stream')) == '02_Pläne'
+    assert target_subfolder(IncomingFile('f', 'u', 'Bescheid.pdf', 'application/pdf')) == '02_Pläne'
+    assert target_subfolder(IncomingFile('f', 'u', 'Angebot.xlsx', 'application/vnd.ms-excel')) == '01_Admin'
+    assert incoming_file_from_message({'sticker': {}}) is None
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for preview rendering and the preview cache
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import file_previews
+from file_previews import PreviewPool, is_previewable, preview_name
+
+Image = pytest.importorskip('PIL.Image')
+
+def spool_photo(path, size=(2000, 1500)):
+    Image.new('RGB', size, (200, 120, 40)).save(path, 'JPEG')
+    return str(path)
+
+def render_and_wait(pool, sha256, source, mime_type='image/jpeg'):
+    done = threading.Event()
+    results = []
+    assert pool.submit(sha256, source, mime_type, lambda path: (results.append(path), done.set()))
+    assert done.wait(30)
+    return results[0]
+
+def test_photo_preview_is_downscaled_and_cached(tmp_path):
+    """The first copy is rendered, an identical second copy comes from the cache"""
+    pool = PreviewPool(str(tmp_path / 'cache'), max_workers=1, max_queue=1)
+    try:
+        first_source = spool_photo(tmp_path / 'a.jpg')
+        preview = render_and_wait(pool, 'abc', first_source)
+
+        assert Image.open(preview).size == (640, 480)
+        assert not os.path.exists(first_source)
+
+        second_source = spool_photo(tmp_path / 'b.jpg')
+        assert render_and_wait(pool, 'abc', second_source) == preview
+        assert not os.path.exists(second_source)
+    finally:
+        pool.shutdown()
+
+def test_pdfs_are_only_previewable_with_pymupdf(monkeypatch):
+    """Without PyMuPDF a PDF is not spooled for a preview that cannot be rendered"""
+    assert is_previewable('foto.jpg', 'image/jpeg')
+    monkeypatch.setattr(file_previews, 'PDF_PREVIEWS', False)
+    assert not is_previewable('Grundriss EG.pdf', 'application/pdf')
+    monkeypatch.setattr(file_previews, 'PDF_PREVIEWS', True)
+    assert is_previewable('Grundriss EG.pdf', 'application/octet-stream')
+
+def test_preview_name():
+    assert preview_name('Grundriss EG.pdf') == 'Grundriss EG_preview.jpg'
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for lazy Google client construction and the transport pool
+"""
+
+import base64
+import json
+import os
+import sys
+import threading
+from unittest.mock import MagicMock, patch
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from datetime import timedelta
+
+from google_clients import GoogleClients, LazyService, TokenRefresher, decode_service_account_info, utcnow
+
+def test_service_account_info_accepts_base64_and_json():
+    info = {'type': 'service_account', 'client_email': 'bot@test.iam.gserviceaccount.com'}
+    encoded = base64.b64encode(json.dumps(info).encode()).decode()
+
+    assert decode_service_account_info(encoded) == info
+    assert decode_service_account_info(json.dumps(info)) == info
+
+def test_clients_are_built_once_on_first_use():
+    """Startup only loads credentials, one client per API serves every thread"""
+    with patch('google_clients.service_account.Credentials.from_service_account_info') as credentials, \
+         patch('google_clients.build_from_document', side_effect=lambda doc, http: MagicMock()) as build:
+        clients = GoogleClients(lambda: {'type': 'service_account'})
+        drive = LazyService(clients, 'drive')
+        clients.credentials
+        build.assert_not_called()
+
+        main_client = clients.service('drive')
+        drive.files().list()
+        other = []
+        worker = threading.Thread(target=lambda: other.append(clients.service('drive')))
+        worker.start()
+        worker.join()
+
+    assert build.call_count == 1
+    assert other[0] is main_client
+    credentials.assert_called_once()
+    assert clients.stats()['clients'] == ['drive']
+
+def test_transports_are_reused_across_threads_and_bounded():
+    """A returned transport serves the next request on any thread, checkouts beyond the pool wait"""
+    with patch('google_clients.service_account.Credentials.from_service_account_info'), \
+         patch('google_clients.google_auth_httplib2.AuthorizedHttp', side_effect=lambda *a, **k: MagicMock()):
+        clients = GoogleClients(lambda: {'type': 'service_account'}, pool_size=1)
+        used = []
+
+        def request():
+            with clients.transport() as http:
+                used.append(http)
+
+        for _ in range(3):
+            worker = threading.Thread(target=request)
+            worker.start()
+            worker.join()
+
+        waited = threading.Event()
+        with clients.transport():
+            worker = threading.Thread(target=lambda: (request(), waited.set()))
+            worker.start()
+            assert not waited.wait(0.1)
+        worker.join()
+
+    assert len(set(map(id, used))) == 1
+    stats = clients.stats()
+    assert (stats['transports'], stats['checkouts'], stats['in_use']) == (1, 5, 0)
+
+class FakeCredentials:
+    """Service account credential whose tokens live for one hour"""
+
+    def __init__(self):
+        self.expiry = None
+        self.refreshes = 0
+
+    def refresh(self, request):
+        self.refreshes += 1
+        self.expiry = utcnow() + timedelta(hours=1)
+
+def test_token_is_refreshed_ahead_of_expiry():
+    """The refresher renews at startup and again once the margin is reached"""
+    credentials = FakeCredentials()
+    refresher = TokenRefresher(credentials, margin_seconds=300)
+    refresher.refresh()
+
+    assert 3290 <= refresher.seconds_until_refresh() <= 3300
+    credentials.expiry = utcnow() + timedelta(seconds=200)
+    assert refresher.seconds_until_refresh() < 0
+
+    stats = refresher.stats()
+    assert stats['refreshes'] == 1
+    assert stats['token_age_seconds'] == 0
+    assert stats['last_refresh_latency_ms'] is not None
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Tests for the Google API request scheduler
+"""
+
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from google_scheduler import GoogleApiScheduler, TokenBucket, is_retryable
+
+def http_error(status, reason=''):
+    content = ('{"error": {"errors": [{"reason": "%s"}]}}' % reason).encode()
+    return HttpError(httplib2.Response({'status': status}), content)
+
+class FlakyRequest:
+    """Fails with the given errors first, then succeeds"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def execute(self, http=None):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {'id': 'ok'}
+
+def test_retryable_errors():
+    assert is_retryable(http_error(429))
+    assert is_retryable(http_error(503))
+    assert is_retryable(http_error(403, 'userRateLimitExceeded'))
+    assert not is_retryable(http_error(403, 'insufficientFilePermissions'))
+    assert not is_retryable(http_error(404))
+
+def test_rate_limit_is_retried_with_backoff():
+    """A rate-limit 403 and a 500 are retried, a 404 is not"""
+    scheduler = GoogleApiScheduler({'drive': (100, 100)}, max_retries=3)
+    request = FlakyRequest(http_error(403, 'userRateLimitExceeded'), http_error(500))
+
+    with patch('google_scheduler.time.sleep'):
+        assert scheduler.execute('drive', request) == {'id': 'ok'}
+        with pytest.raises(HttpError):
+            scheduler.execute('drive', FlakyRequest(http_error(404)))
+
+    assert request.calls == 3
+    stats = scheduler.stats()['drive']
+    assert stats['retries'] == 2
+    assert stats['failures'] == 1
+
+def test_creates_are_only_retried_when_rejected():
+    """A 503 or timeout may come after the create took effect - only a 429 is resent"""
+    assert not is_retryable(http_error(503), idempotent=False)
+    assert not is_retryable(TimeoutError(), idempotent=False)
+    assert is_retryable(http_error(403, 'rateLimitExceeded'), idempotent=False)
+
+    scheduler = GoogleApiScheduler({'drive': (100, 100)}, max_retries=3)
+    rejected = FlakyRequest(http_error(429))
+    failed = FlakyRequest(http_error(503))
+    with patch('google_scheduler.time.sleep'):
+        assert scheduler.execute('drive', rejected, retry=False) == {'id': 'ok'}
+        with pytest.raises(HttpError):
+            scheduler.execute('drive', failed, retry=False)
+
+    assert (rejected.calls, failed.calls) == (2, 1)
+
+def test_requests_outside_execute_take_tokens():
+    scheduler = GoogleApiScheduler({'drive': (100, 5)})
+    for _ in range(3):
+        scheduler.acquire('drive')
+    stats = scheduler.stats()['drive']
+    assert stats['requests'] == 3
+    assert stats['tokens_available'] < 3
+
+def test_requests_run_on_a_checked_out_transport():
+    from contextlib import contextmanager
+    checkouts = []
+
+    @contextmanager
+    def transport():
+        checkouts.append('http')
+        yield 'pooled-http'
+
+    class Request:
+        def execute(self, http=None):
+            return http
+
+    scheduler = GoogleApiScheduler({'drive': (100, 100)}, transport=transport)
+    assert scheduler.execute('drive', Request()) == 'pooled-http'
+    assert scheduler.execute('drive', Request(), http='own-http') == 'own-http'
+    assert checkouts == ['http']
+
+def test_token_bucket_smooths_bursts():
+    """Beyond the burst capacity requests wait for new tokens"""
+    bucket = TokenBucket(rate=50, capacity=2)
+    start = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.03
+
+def test_concurrent_identical_reads_are_coalesced():
+    """Callers with the same key share a single in-flight request"""
+    scheduler = GoogleApiScheduler({'calendar': (100, 100)})
+    started = threading.Event()
+    release = threading.Event()
+
+    class SlowRequest:
+        calls = 0
+
+        def execute(self, http=None):
+            SlowRequest.calls += 1
+            started.set()
+            release.wait(5)
+            return {'items': []}
+
+    results = []
+    owner = threading.Thread(target=lambda: results.append(
+        scheduler.execute('calendar', SlowRequest(), coalesce_key='primary')))
+    owner.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(
+        scheduler.execute('calendar', SlowRequest(), coalesce_key='primary')))
+    follower.start()
+    while scheduler.stats()['calendar']['coalesced'] == 0:
+        time.sleep(0.01)
+    release.set()
+    owner.join()
+    follower.join()
+
+    assert SlowRequest.calls == 1
+    assert results == [{'items': []}, {'items': []}]
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Tests for the paginated task/project list API
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+from flask import Flask
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from list_api import TASK_ORDER, create_list_api, decode_cursor, keyset_filter
+
+TASKS = [
+    {'id': f"t{i}", 'is_done': False, 'priority_rank': 1 + i % 3, 'created_at': f"2025-06-{10 + i:02d}T09:00:00+00:00"}
+    for i in range(7)
+]
+
+class FakeQuery:
+    """Records the PostgREST calls, returns a fixed page"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return call
+
+    def execute(self):
+        limit = next(args[0] for name, args, _ in self.calls if name == 'limit')
+        return SimpleNamespace(data=self.rows[:limit])
+
+class FakeClient:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def table(self, name):
+        query = FakeQuery(self.rows)
+        self.queries.append((name, query))
+        return query
+
+def client_for(rows, token='secret'):
+    supabase = FakeClient(rows)
+    app = Flask(__name__)
+    app.register_blueprint(create_list_api(lambda: supabase, token))
+    http = app.test_client()
+    if token:
+        http.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {token}"
+    return http, supabase
+
+def test_keyset_filter_handles_mixed_directions():
+    assert keyset_filter([('priority_rank', False), ('created_at', True), ('id', True)], [2, '2025-06-10T09:00:00+00:00', 't3']) == (
+        'priority_rank.gt."2"'
+        ',and(priority_rank.eq."2",created_at.lt."2025-06-10T09:00:00+00:00")'
+        ',and(priority_rank.eq."2",created_at.eq."2025-06-10T09:00:00+00:00",id.lt."t3")'
+    )
+
+def test_task_page_with_filters_and_cursor():
+    """Fixed filter columns drop out of the keyset, a full page returns a cursor"""
+    http, supabase = client_for(TASKS)
+
+    response = http.get('/api/tasks?status=open&priority=hoch&project_id=p1&limit=3')
+    assert response.status_code == 200
+    page = response.get_json()
+    assert [task['id'] for task in page['items']] == ['t0', 't1', 't2']
+    assert decode_cursor(page['next_cursor'], 2) == [TASKS[2]['created_at'], 't2']
+
+    calls = supabase.queries[0][1].calls
+    assert ('eq', ('is_done', False), {}) in calls
+    assert ('eq', ('priority_rank', 1), {}) in calls
+    assert ('eq', ('project_id', 'p1'), {}) in calls
+    assert [(args[0], kwargs['desc']) for name, args, kwargs in calls if name == 'order'] == [('created_at', True), ('id', True)]
+    assert ('limit', (4,), {}) in calls
+
+    http.get(f"/api/tasks?status=open&priority=hoch&limit=3&cursor={page['next_cursor']}")
+    or_filter = next(args[0] for name, args, _ in supabase.queries[1][1].calls if name == 'or_')
+    assert or_filter.endswith('id.lt."t2")')
+
+def test_all_tasks_keep_the_full_order():
+    http, supabase = client_for(TASKS)
+    page = http.get('/api/tasks?status=all').get_json()
+
+    assert page['next_cursor'] is None
+    orders = [args[0] for name, args, _ in supabase.queries[0][1].calls if name == 'order']
+    assert orders == [column for column, _ in TASK_ORDER]
+
+def test_unchanged_page_is_not_modified():
+    http, _ = client_for(TASKS)
+    first = http.get('/api/projects?limit=2')
+    etag = first.headers['ETag']
+
+    again = http.get('/api/projects?limit=2', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert http.get('/api/projects?limit=3', headers={'If-None-Match': etag}).status_code == 200
+
+def test_bad_requests_and_token():
+    http, _ = client_for(TASKS, token='secret')
+    assert http.get('/api/tasks', headers={'Authorization': ''}).status_code == 401
+    assert http.get('/api/tasks', headers={'Authorization': 'Bearer guess'}).status_code == 401
+
+    assert http.get('/api/tasks?status=later').status_code == 400
+    assert http.get('/api/tasks?cursor=nonsense').status_code == 400
+    assert http.get('/api/tasks').status_code == 200
+
+def test_no_token_disables_the_api():
+    http, supabase = client_for(TASKS, token=None)
+    response = http.get('/api/projects')
+    assert response.status_code == 503
+    assert 'LIST_API_TOKEN' in response.get_json()['error']
+    assert supabase.queries == []
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Tests for the multi-process safe project counter
+"""
+
+import json
+import os
+import sys
+from multiprocessing import Pool
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from project_counter import ProjectCounter, ProjectNumberLeaser, current_year, parse_project_number
+
+def allocate_numbers(args):
+    counter_file, count = args
+    counter = ProjectCounter(counter_file)
+    return [counter.next_number(year=25) for _ in range(count)]
+
+def lease_numbers(args):
+    counter_file, count = args
+    leaser = ProjectNumberLeaser(ProjectCounter(counter_file), block_size=5)
+    numbers = [leaser.next_number(year=25) for _ in range(count)]
+    leaser.release()
+    return numbers
+
+def test_numbers_are_sequential(tmp_path):
+    """Numbers continue from the stored counter"""
+    counter_file = tmp_path / 'project_counter.json'
+    counter_file.write_text(json.dumps({"year": 25, "counter": 41, "last_number": "25-041"}))
+    counter = ProjectCounter(str(counter_file))
+
+    assert counter.next_number(year=25) == "25-042"
+    assert counter.next_number(year=25) == "25-043"
+    assert json.loads(counter_file.read_text())["last_number"] == "25-043"
+
+def test_year_change_resets_counter(tmp_path):
+    """A new year starts again at NNN = 001"""
+    counter_file = tmp_path / 'project_counter.json'
+    counter_file.write_text(json.dumps({"year": 25, "counter": 117, "last_number": "25-117"}))
+
+    assert ProjectCounter(str(counter_file)).next_number(year=26) == "26-001"
+
+def test_empty_file_starts_fresh(tmp_path):
+    """A recreated empty bind mount does not break numbering"""
+    counter_file = tmp_path / 'project_counter.json'
+    counter_file.write_text("")
+
+    assert ProjectCounter(str(counter_file)).next_number(year=25) == "25-001"
+
+def test_no_duplicates_across_processes(tmp_path):
+    """Concurrent workers never receive the same number"""
+    counter_file = str(tmp_path / 'project_counter.json')
+    with Pool(4) as pool:
+        results = pool.map(allocate_numbers, [(counter_file, 50)] * 4)
+
+    numbers = [number for result in results for number in result]
+    assert len(set(numbers)) == 200
+    assert sorted(numbers)[-1] == "25-200"
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+def test_parse_project_number():
+    """Folder and project names carry the YY-NNN prefix"""
+    assert parse_project_number("25-003-EFH Müller") == (25, 3)
+    assert parse_project_number("25-1042") == (25, 1042)
+    # The HHMMSS fallback number is not a counter value
+    assert parse_project_number("25-120000") is None
+    assert parse_project_number("WP04") is None
+    assert parse_project_number("2025-01 Archiv") is None
+
+def test_ensure_at_least_repairs_lost_counter(tmp_path):
+    """A recreated counter file continues after the highest existing project"""
+    counter_file = tmp_path / 'project_counter.json'
+    counter_file.write_text("")
+    counter = ProjectCounter(str(counter_file))
+    year = current_year()
+
+    assert counter.ensure_at_least(year, 37) is True
+    assert counter.next_number(year=year) == f"{year}-038"
+    assert counter.ensure_at_least(year, 12) is False
+    assert counter.ensure_at_least(year - 1, 99) is False
+    assert counter.next_number(year=year) == f"{year}-039"
+
+def test_lease_serves_block_from_memory(tmp_path):
+    """Only one locked counter update per block"""
+    counter = ProjectCounter(str(tmp_path / 'project_counter.json'))
+    leaser = ProjectNumberLeaser(counter, block_size=5)
+
+    numbers = [leaser.next_number(year=25) for _ in range(3)]
+
+    assert numbers == ["25-001", "25-002", "25-003"]
+    assert counter.read()["counter"] == 5
+
+def test_released_numbers_are_reused(tmp_path):
+    """Unused lease numbers are handed out again after shutdown"""
+    counter = ProjectCounter(str(tmp_path / 'project_counter.json'))
+    first = ProjectNumberLeaser(counter, block_size=5)
+    first.next_number(year=25)
+    first.release()
+
+    second = ProjectNumberLeaser(counter, block_size=5)
+    assert second.next_number(year=25) == "25-002"
+    assert counter.read()["counter"] == 6
+
+def test_dead_worker_lease_is_recovered(tmp_path):
+    """Numbers a crashed worker never issued are not lost"""
+    counter_file = tmp_path / 'project_counter.json'
+    counter_file.write_text(json.dumps({
+        "year": 25, "counter": 5, "last_number": "25-005",
+        "leases": {"999999": {"year": 25, "started": "1",
+                              "numbers": ["25-001", "25-002", "25-003", "25-004", "25-005"]}}
+    }))
+    (tmp_path / 'project_counter.json.999999.issued').write_text("25-001\n25-002\n")
+
+    leaser = ProjectNumberLeaser(ProjectCounter(str(counter_file)), block_size=3)
+
+    assert [leaser.next_number(year=25) for _ in range(4)] == ["25-003", "25-004", "25-005", "25-006"]
+    assert "999999" not in json.loads(counter_file.read_text())["leases"]
+
+def test_lease_crosses_999_in_numeric_order(tmp_path):
+    """'25-1000' sorts before '25-999' as text - blocks and free numbers are ordered numerically"""
+    counter_file = tmp_path / 'project_counter.json'
+    counter_file.write_text(json.dumps({"year": 25, "counter": 1001, "last_number": "25-1001",
+                                        "free": ["25-1000", "25-999"]}))
+    leaser = ProjectNumberLeaser(ProjectCounter(str(counter_file)), block_size=3)
+
+    assert [leaser.next_number(year=25) for _ in range(3)] == ["25-999", "25-1000", "25-1002"]
+    leaser.release()
+    assert json.loads(counter_file.read_text())["free"] == []
+
+def test_lease_year_change_resets_counter(tmp_path):
+    """Leases from last year are dropped on rollover"""
+    counter = ProjectCounter(str(tmp_path / 'project_counter.json'))
+    leaser = ProjectNumberLeaser(counter, block_size=5)
+    leaser.next_number(year=25)
+
+    assert leaser.next_number(year=26) == "26-001"
+    assert counter.read()["free"] == []
+
+def test_no_duplicates_across_leasing_processes(tmp_path):
+    """Leasing workers never receive the same number and lose none on shutdown"""
+    counter_file = str(tmp_path / 'project_counter.json')
+    with Pool(4) as pool:
+        results = pool.map(lease_numbers, [(counter_file, 23)] * 4)
+
+    numbers = [number for result in results for number in result]
+    data = ProjectCounter(counter_file).read()
+    assert len(set(numbers)) == 92
+    assert sorted(numbers + data["free"]) == [f"25-{n:03d}" for n in range(1, data["counter"] + 1)]
+    assert data["leases"] == {}
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-memory project index
+"""
+
+import os
+import sys
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from project_index import ProjectIndex, clear_winner, normalize_project_number, tokenize
+
+PROJECTS = [
+    {'id': 'a', 'name': '25-001-EFH Müller', 'project_number': '25-001', 'created_at': '2025-01-10T09:00:00'},
+    {'id': 'b', 'name': '25-014-Halle Müller Bau', 'project_number': '25-014', 'created_at': '2025-03-02T09:00:00'},
+    {'id': 'c', 'name': '25-020-WP04 Wohnpark', 'project_number': '25-020', 'created_at': '2025-04-20T09:00:00'},
+    {'id': 'd', 'name': '25-003-Sanierung Hofer', 'project_number': '25-003', 'created_at': '2025-02-01T09:00:00'},
+]
+
+def test_tokens_fold_umlauts():
+    assert tokenize('25-001-EFH Müller') == ['25', '001', 'efh', 'mueller']
+
+def test_number_and_name_lookups():
+    """Exact numbers win, name tokens match most recent first"""
+    index = ProjectIndex()
+    index.warm(PROJECTS)
+
+    assert [p['id'] for p in index.search('25-014')] == ['b']
+    assert [p['id'] for p in index.search('mueller')] == ['b', 'a']
+    assert [p['id'] for p in index.search('EFH Müller')] == ['a']
+    assert [p['id'] for p in index.search('wp04')] == ['c']
+    assert index.search('Schmid') == []
+
+def test_upsert_replaces_renamed_project():
+    """Saving a project updates all of its index entries"""
+    index = ProjectIndex()
+    index.warm(PROJECTS)
+
+    index.upsert({**PROJECTS[0], 'name': '25-001-EFH Schmid'})
+
+    assert [p['id'] for p in index.search('mueller')] == ['b']
+    assert [p['id'] for p in index.search('schmid')] == ['a']
+    assert len(index) == 4
+
+def test_short_project_numbers_are_normalized():
+    assert normalize_project_number('25-3') == '25-003'
+    assert normalize_project_number('25/014') == '25-014'
+    assert normalize_project_number('WP04') is None
+
+def test_fuzzy_ranking_picks_only_clear_winners():
+    """Typos and partial names rank candidates, close scores stay ambiguous"""
+    index = ProjectIndex()
+    index.warm(PROJECTS)
+
+    def ranked(identifier):
+        return [p['id'] for p, _ in index.rank(identifier)]
+
+    assert index.rank('25-3') == [(PROJECTS[3], 1.0)]
+    assert ranked('Hoffer') == ['d']
+    assert ranked('EFH Müller') == ['a', 'b']
+    assert ranked('mueller') == ['a', 'b']
+    assert index.rank('Schmid') == []
+
+    assert clear_winner(index.rank('EFH Müller'))['id'] == 'a'
+    assert clear_winner(index.rank('WP04'))['id'] == 'c'
+    assert clear_winner(index.rank('mueller')) is None
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-v"])
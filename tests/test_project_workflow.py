@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for the checkpointed project creation workflow
+"""
+
+import os
+import sys
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from project_workflow import ProjectWorkflowStore, WORKFLOW_STEPS, run_workflow
+
+def make_handlers(calls, fail_at=None):
+    def handler(step):
+        def run(workflow):
+            calls.append(step)
+            if step == fail_at:
+                raise RuntimeError(f"{step} failed")
+            workflow['results'][step] = True
+        return run
+    return {step: handler(step) for step in WORKFLOW_STEPS}
+
+def test_retry_resumes_at_failed_step(tmp_path):
+    """Completed steps (e.g. Drive folders) are not redone on retry"""
+    store = ProjectWorkflowStore(str(tmp_path))
+    workflow = store.create(chat_id=1, message_id=10, base_name="EFH Müller")
+    calls = []
+
+    assert run_workflow(store, workflow, make_handlers(calls, fail_at='save_db')) is False
+    assert calls == ['allocate_number', 'create_root', 'create_subfolders', 'save_db']
+
+    # A new message for the same project finds the open workflow on disk
+    resumed = store.find(chat_id=1, message_id=11, base_name="efh  müller")
+    assert resumed['id'] == workflow['id']
+    assert resumed['failed_step'] == 'save_db'
+
+    calls.clear()
+    assert run_workflow(store, resumed, make_handlers(calls)) is True
+    assert calls == ['save_db', 'notify']
+    assert store.load(workflow['id'])['status'] == 'done'
+
+def test_redelivered_message_finds_done_workflow(tmp_path):
+    """A webhook redelivery of the same message does not create a second project"""
+    store = ProjectWorkflowStore(str(tmp_path))
+    workflow = store.create(chat_id=1, message_id=10, base_name="WP04")
+    run_workflow(store, workflow, make_handlers([]))
+
+    assert store.find(chat_id=1, message_id=10, base_name="WP04")['status'] == 'done'
+    assert store.find(chat_id=1, message_id=12, base_name="WP04") is None
+    assert store.interrupted_workflows(3600) == []
+
+def test_only_interrupted_workflows_are_replayed(tmp_path):
+    """A failed workflow waits for the user's retry, an interrupted one is resumed"""
+    store = ProjectWorkflowStore(str(tmp_path))
+    failed = store.create(chat_id=1, message_id=10, base_name="EFH Müller")
+    run_workflow(store, failed, make_handlers([], fail_at='create_root'))
+    interrupted = store.create(chat_id=1, message_id=11, base_name="WP04")
+    interrupted['completed_steps'].append('allocate_number')
+    store.save(interrupted)
+
+    assert [w['id'] for w in store.interrupted_workflows(3600)] == [interrupted['id']]
+
+def test_running_lock_is_exclusive(tmp_path):
+    """Only one worker runs a given workflow at a time"""
+    store = ProjectWorkflowStore(str(tmp_path))
+    with store.running('abc') as first:
+        with store.running('abc') as second:
+            assert first is True
+            assert second is False
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Tests for the read-through reference data cache
+"""
+
+import os
+import sys
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from project_index import ProjectIndex
+from reference_cache import ReferenceCache
+
+class FakeTable:
+    """The projects table behind the loaders, counts what the cache asks for"""
+
+    def __init__(self, rows):
+        self.rows = {row['id']: dict(row) for row in rows}
+        self.calls = []
+        self.down = False
+
+    def _call(self, name):
+        if self.down:
+            raise ConnectionError("Supabase unreachable")
+        self.calls.append(name)
+
+    def load_all(self):
+        self._call('all')
+        return [dict(row) for row in self.rows.values()]
+
+    def load_version(self):
+        self._call('version')
+        return max(row['updated_at'] for row in self.rows.values()), len(self.rows)
+
+    def load_since(self, updated_at):
+        self._call('since')
+        return [dict(row) for row in self.rows.values() if row['updated_at'] >= updated_at]
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+PROJECTS = [
+    {'id': 'a', 'name': '25-001-EFH Müller', 'project_number': '25-001', 'updated_at': '2025-06-01T08:00:00+00:00'},
+    {'id': 'b', 'name': '25-002-Umbau Gasthof Post', 'project_number': '25-002', 'updated_at': '2025-06-02T08:00:00+00:00'},
+]
+
+def make_cache(rows=PROJECTS):
+    table, clock, index = FakeTable(rows), Clock(), ProjectIndex()
+    cache = ReferenceCache('projects', table.load_all, table.load_version, table.load_since,
+                           sink=index, ttl_seconds=60, poll_seconds=0, clock=clock)
+    cache.start()
+    return cache, table, clock, index
+
+def test_reads_within_ttl_stay_local():
+    cache, table, clock, index = make_cache()
+    assert table.calls == ['version', 'all']
+    assert index.ready and index.by_number('25-2')['id'] == 'b'
+
+    clock.now += 30
+    assert cache.get('a')['name'] == '25-001-EFH Müller'
+    assert len(cache.rows()) == 2
+    assert table.calls == ['version', 'all']
+
+def test_expired_snapshot_is_revalidated_by_version():
+    """Unchanged version: one version query, changed: only the updated rows"""
+    cache, table, clock, index = make_cache()
+
+    clock.now += 61
+    assert cache.get('a')
+    assert table.calls[2:] == ['version']
+
+    table.rows['c'] = {'id': 'c', 'name': '25-003-Sanierung Hofer', 'project_number': '25-003',
+                       'updated_at': '2025-06-03T08:00:00+00:00'}
+    clock.now += 61
+    assert cache.get('c')['project_number'] == '25-003'
+    assert table.calls[3:] == ['version', 'since']
+    assert index.by_number('25-003')['id'] == 'c'
+
+def test_deletes_force_a_full_reload():
+    cache, table, clock, index = make_cache()
+
+    del table.rows['a']
+    clock.now += 61
+    assert cache.get('a') is None
+    assert table.calls[2:] == ['version', 'since', 'all']
+    assert index.get('a') is None
+
+def test_realtime_events_are_applied_without_queries():
+    cache, table, clock, index = make_cache()
+    renamed = dict(PROJECTS[1], name='25-002-Umbau Gasthof Krone', updated_at='2025-06-05T08:00:00+00:00')
+    table.rows['b'] = renamed
+
+    cache.apply_change({'data': {'type': 'UPDATE', 'table': 'projects', 'record': renamed}, 'ids': [1]})
+    cache.apply_change({'data': {'type': 'DELETE', 'table': 'projects', 'old_record': {'id': 'a'}}, 'ids': [1]})
+    del table.rows['a']
+    assert cache.get('b')['name'] == '25-002-Umbau Gasthof Krone'
+    assert [project['id'] for project, _ in index.rank('Gasthof Krone')] == ['b']
+    assert index.get('a') is None
+
+    # The event carried the version along - revalidation finds nothing to load
+    clock.now += 61
+    cache.get('b')
+    assert table.calls[2:] == ['version']
+
+def test_last_snapshot_serves_while_supabase_is_down():
+    cache, table, clock, _ = make_cache()
+
+    table.down = True
+    clock.now += 61
+    assert cache.get('a')['project_number'] == '25-001'
+    assert cache.stats()['errors'] == 1
+
+    table.down = False
+    cache.invalidate()
+    assert cache.get('b')
+    assert table.calls[2:] == ['version']
+
+def test_local_writes_survive_reloads_until_the_database_has_them():
+    """A project queued in the outbox stays visible through delta and full loads"""
+    cache, table, clock, index = make_cache()
+    queued = {'id': 'q', 'name': '25-004-Neubau Huber', 'project_number': '25-004'}
+    cache.upsert(queued)
+
+    # Another worker adds a project: the delta must not count the queued row
+    table.rows['c'] = {'id': 'c', 'name': '25-003-Sanierung Hofer', 'project_number': '25-003',
+                       'updated_at': '2025-06-03T08:00:00+00:00'}
+    clock.now += 61
+    assert cache.get('q')['name'] == '25-004-Neubau Huber'
+    assert table.calls[2:] == ['version', 'since']
+
+    cache.refresh(force=True)
+    assert cache.get('q') and cache.get('c')
+    assert index.by_number('25-004')['id'] == 'q'
+
+    # The outbox delivered it - the next load confirms it and the cache stops carrying it
+    table.rows['q'] = dict(queued, updated_at='2025-06-04T08:00:00+00:00')
+    clock.now += 61
+    assert cache.get('q')['updated_at'] == '2025-06-04T08:00:00+00:00'
+    assert cache._local == {}
+    del table.rows['q']
+    cache.refresh(force=True)
+    assert cache.get('q') is None
+
+def test_write_during_a_reload_is_kept():
+    cache, table, clock, _ = make_cache()
+    load_all = table.load_all
+
+    def slow_load_all():
+        rows = load_all()
+        cache.upsert({'id': 'q', 'name': '25-004-Neubau Huber', 'project_number': '25-004'})
+        return rows
+
+    cache.load_all = slow_load_all
+    cache.refresh(force=True)
+    assert cache.get('q')['project_number'] == '25-004'
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming time entry export
+"""
+
+import csv
+import os
+import re
+import sys
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from time_export import export_time_entries, iter_time_entry_pages, parse_export_command
+
+ENTRIES = [
+    {'id': f"{i:08d}-0000-0000-0000-000000000000", 'entry_date': f"2025-06-{1 + i // 3:02d}",
+     'duration_hours': 1.5, 'activity_description': f"Planung {i}", 'created_by': 'Marcel (1)'}
+    for i in range(25)
+]
+
+class FakeQuery:
+    """Just enough of the PostgREST builder for keyset pages"""
+
+    def __init__(self, rows, requests):
+        self.rows = rows
+        self.requests = requests
+        self.after = None
+        self.page_size = None
+
+    def select(self, fields):
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    def gte(self, column, value):
+        return self
+
+    def lte(self, column, value):
+        return self
+
+    def order(self, column):
+        return self
+
+    def or_(self, filters):
+        match = re.match(r'entry_date\.gt\.([\d-]+),and\(entry_date\.eq\.([\d-]+),id\.gt\.([\w-]+)\)', filters)
+        self.after = (match.group(2), match.group(3))
+        return self
+
+    def limit(self, page_size):
+        self.page_size = page_size
+        return self
+
+    def execute(self):
+        self.requests.append(self.after)
+        rows = sorted(self.rows, key=lambda r: (r['entry_date'], r['id']))
+        if self.after:
+            rows = [r for r in rows if (r['entry_date'], r['id']) > self.after]
+        return SimpleNamespace(data=rows[:self.page_size])
+
+class FakeClient:
+    def __init__(self, rows):
+        self.rows = rows
+        self.requests = []
+
+    def table(self, name):
+        return FakeQuery(self.rows, self.requests)
+
+def test_export_command_is_recognized():
+    assert parse_export_command('Export 25-003 Juni') == ('25-003', 'Juni', 'csv')
+    assert parse_export_command('exportiere 25-3 letzten Monat xlsx') == ('25-3', 'letzten Monat', 'xlsx')
+    assert parse_export_command('/export EFH Müller letzten Monat xlsx') == ('EFH Müller', 'letzten Monat', 'xlsx')
+    assert parse_export_command('/export@mga_bot WP04') == ('WP04', None, 'csv')
+    assert parse_export_command('Exportplan für 25-003 prüfen') is None
+
+def test_export_sentences_are_left_to_the_ai():
+    """Without the command form only a project number makes a sentence an export"""
+    assert parse_export_command('Exportiere die Pläne als PDF für Frau Maier') is None
+    assert parse_export_command('Export EFH Müller letzten Monat') is None
+    assert parse_export_command('Exportiere 2025 Unterlagen für das Amt') is None
+
+def test_pages_continue_after_the_last_row():
+    """Every row once, each page keyed on the (entry_date, id) of the previous page's last row"""
+    client = FakeClient(list(reversed(ENTRIES)))
+    pages = list(iter_time_entry_pages(client, 'p1', date(2025, 6, 1), date(2025, 6, 30), page_size=10))
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert [row['id'] for page in pages for row in page] == [e['id'] for e in ENTRIES]
+    assert client.requests == [None, (ENTRIES[9]['entry_date'], ENTRIES[9]['id']),
+                               (ENTRIES[19]['entry_date'], ENTRIES[19]['id'])]
+
+def test_csv_export(tmp_path):
+    path = str(tmp_path / 'export.csv')
+    pages = iter_time_entry_pages(FakeClient(ENTRIES), 'p1', date(2025, 6, 1), date(2025, 6, 30), page_size=10)
+
+    assert export_time_entries(pages, path, 'csv', '25-003-EFH Müller') == (25, 37.5)
+    with open(path, encoding='utf-8-sig') as f:
+        rows = list(csv.reader(f, delimiter=';'))
+    assert rows[0] == ['Datum', 'Stunden', 'Tätigkeit', 'Erfasst von']
+    assert rows[1] == ['01.06.2025', '1,50', 'Planung 0', 'Marcel (1)']
+    assert rows[-1] == ['', '37,50', 'Summe', '']
+
+def test_xlsx_export(tmp_path):
+    import openpyxl
+
+    path = str(tmp_path / 'export.xlsx')
+
+    export_time_entries([ENTRIES[:2]], path, 'xlsx', '25-003-EFH Müller')
+    sheet = openpyxl.load_workbook(path).active
+    assert sheet.max_row == 4
+    assert sheet.cell(row=4, column=2).value == 3
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
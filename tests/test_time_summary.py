@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Tests for hour summary ranges, rendering and caching
+"""
+
+import os
+import sys
+from datetime import date
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from time_summary import SummaryCache, render_summary, resolve_time_range
+
+TODAY = date(2025, 7, 16)  # a Wednesday
+
+def test_time_ranges():
+    assert resolve_time_range('this_week', TODAY) == (date(2025, 7, 14), TODAY, 'Diese Woche')
+    assert resolve_time_range('letzte Woche', TODAY) == (date(2025, 7, 7), date(2025, 7, 13), 'Letzte Woche')
+    assert resolve_time_range('last_month', TODAY) == (date(2025, 6, 1), date(2025, 6, 30), 'Juni 2025')
+    assert resolve_time_range('Juni', TODAY)[:2] == (date(2025, 6, 1), date(2025, 6, 30))
+    assert resolve_time_range('Dezember', TODAY)[:2] == (date(2024, 12, 1), date(2024, 12, 31))
+    assert resolve_time_range('2025-07-01..2025-07-04', TODAY)[:2] == (date(2025, 7, 1), date(2025, 7, 4))
+    assert resolve_time_range(None, TODAY)[2] == 'Diese Woche'
+
+def test_render_summary():
+    text = render_summary(
+        'Juni 2025',
+        [{'project_name': '25-003-EFH Müller', 'hours': '12.5'}, {'project_name': '25-014-Halle', 'hours': 4}],
+        [{'week_start': '2025-06-02', 'hours': 10}, {'week_start': '2025-06-09', 'hours': '6.5'}]
+    )
+
+    assert '**Gesamt:** 16.5 h' in text
+    assert '• 25-003-EFH Müller: 12.5 h' in text
+    assert '• KW 23 (02.06.): 10 h' in text
+    assert 'Keine Zeiten erfasst' in render_summary('Heute', [], [])
+
+def test_cache_expires_and_is_invalidated_per_chat():
+    cache = SummaryCache(ttl_seconds=60)
+    cache.put(1, 'week', 'A')
+    cache.put(2, 'week', 'B')
+
+    assert cache.get(1, 'week') == 'A'
+    cache.invalidate(1)
+    assert cache.get(1, 'week') is None
+    assert cache.get(2, 'week') == 'B'
+
+    cache.ttl_seconds = -1
+    assert cache.get(2, 'week') is None
+    assert cache.stats() == {'entries': 0, 'hits': 2, 'misses': 2}
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tests for the write-behind journal and batch writer
+"""
+
+import os
+import sys
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from write_behind import WriteBehindWriter, is_permanent_error, row_id
+
+class FakeAPIError(Exception):
+    def __init__(self, code):
+        super().__init__(f"Error {code}")
+        self.code = code
+
+class FakeSupabase:
+    """Records batches, rejects rows with a negative duration"""
+
+    def __init__(self):
+        self.batches = []
+        self.down = False
+
+    def send(self, table, rows):
+        if self.down:
+            raise ConnectionError("Supabase unreachable")
+        if any(row.get('duration_hours', 0) < 0 for row in rows):
+            raise FakeAPIError('23514')
+        self.batches.append((table, rows))
+
+def entry(hours, **extra):
+    return {'project_id': 'p1', 'duration_hours': hours, 'activity_description': 'Planung', **extra}
+
+def test_errors_are_classified():
+    assert is_permanent_error(FakeAPIError('23505'))
+    assert is_permanent_error(FakeAPIError('PGRST204'))
+    assert not is_permanent_error(FakeAPIError('PGRST000'))
+    assert not is_permanent_error(ConnectionError())
+
+def test_rows_are_batched_by_table_and_columns(tmp_path):
+    """A week logged at once goes out as one request per table and column set"""
+    supabase = FakeSupabase()
+    writer = WriteBehindWriter(str(tmp_path / 'journal.sqlite3'), supabase.send)
+    ids = [writer.submit('time_entries', entry(hours)) for hours in (8, 7.5, 6)]
+    writer.submit('tasks', {'content': 'Statik anfragen'})
+    writer.submit('tasks', {'content': 'Einreichung', 'tags': ['TBO']})
+
+    assert writer.flush() == 5
+    assert sorted((table, len(rows)) for table, rows in supabase.batches) == [('tasks', 1), ('tasks', 1), ('time_entries', 3)]
+    time_entries = next(rows for table, rows in supabase.batches if table == 'time_entries')
+    assert [row['id'] for row in time_entries] == ids
+    assert writer.stats()['pending'] == 0
+
+def test_outage_keeps_rows_until_delivered(tmp_path):
+    """Nothing is lost while Supabase is down, the same IDs are resent later"""
+    supabase = FakeSupabase()
+    path = str(tmp_path / 'journal.sqlite3')
+    writer = WriteBehindWriter(path, supabase.send, base_delay=0)
+    row_id = writer.submit('time_entries', entry(2))
+
+    supabase.down = True
+    assert writer.flush() == 0
+    assert writer.stats()['pending'] == 1
+
+    # A restarted bot finds the journaled row
+    supabase.down = False
+    restarted = WriteBehindWriter(path, supabase.send)
+    assert restarted.flush() == 1
+    assert supabase.batches[0][1][0]['id'] == row_id
+
+def test_rejected_row_is_isolated_and_reported(tmp_path):
+    """One bad row does not block the rest of its batch"""
+    supabase = FakeSupabase()
+    reported = []
+    writer = WriteBehindWriter(str(tmp_path / 'journal.sqlite3'), supabase.send,
+                               on_failed=lambda table, row, context, error: reported.append((row['duration_hours'], context)))
+    writer.submit('time_entries', entry(3))
+    writer.submit('time_entries', entry(-1), {'chat_id': 42})
+    writer.submit('time_entries', entry(4))
+
+    assert writer.flush() == 2
+    assert reported == [(-1, {'chat_id': 42})]
+    assert writer.stats()['failed'] == 1
+    assert writer.failed()[0]['last_error'] == 'Error 23514'
+
+def test_delivered_rows_are_reported(tmp_path):
+    """Caches of the table can be dropped once the row is really in the database"""
+    supabase = FakeSupabase()
+    delivered = []
+    writer = WriteBehindWriter(str(tmp_path / 'journal.sqlite3'), supabase.send, base_delay=0,
+                               on_delivered=lambda table, row, context: delivered.append((table, context)))
+    writer.submit('time_entries', entry(2), {'chat_id': 42})
+    supabase.down = True
+    writer.flush()
+    assert delivered == []
+
+    supabase.down = False
+    assert writer.flush() == 1
+    assert delivered == [('time_entries', {'chat_id': 42})]
+
+def test_idempotency_key_journals_once(tmp_path):
+    """A replayed project workflow queues the same row, and only once"""
+    supabase = FakeSupabase()
+    writer = WriteBehindWriter(str(tmp_path / 'journal.sqlite3'), supabase.send, base_delay=0)
+    writer.submit('time_entries', entry(1))
+    supabase.down = True
+    writer.flush()
+    assert not writer.online
+
+    first = writer.submit('projects', {'name': '25-003-Hofer', 'drive_folder_id': 'f1'}, key='f1')
+    again = writer.submit('projects', {'name': '25-003-Hofer', 'drive_folder_id': 'f1'}, key='f1')
+    assert first == again == row_id('projects', 'f1')
+    assert writer.stats()['pending'] == 2
+
+    supabase.down = False
+    assert writer.flush() == 2
+    assert writer.online
+    assert [table for table, _ in supabase.batches] == ['time_entries', 'projects']
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-v"])